@@ -0,0 +1,134 @@
+"""
+Border of the grid computed from the connectivity list at once.
+
+Border edges are the sides of faces without an adjacent face. A border
+node of two border edges is regular, its neighbours along the border are
+the other ends of the edges whatever the orientation of the faces; each
+chain of regular nodes is then oriented as most of its faces, so a node
+has the previous and the next node along its boundary loop. The topology
+is found once, the corner flags and the directions along the border
+depend on the coordinates and are updated as the nodes move.
+"""
+from numpy import asarray, zeros, full, bincount, flatnonzero, argmax, argsort, concatenate, cumsum, int64
+from numpy.linalg import norm
+from algorithms.neighbourhood import face_adjacency
+
+# A border node is a corner if the angle between its border edges is less than arccos(-1 + CORNER_ALPHA).
+CORNER_ALPHA = 0.01
+
+
+class BoundaryAnalysis:
+    __doc__ = "Border edges, border nodes, boundary loops, corners and directions along the border of the grid."
+
+    def __init__(self, connectivity, n_nodes=None, adjacency=None):
+        """
+        Find the border edges and the neighbours of the border nodes along the border.
+        :param connectivity: (n_faces, 3) array of positions of faces' nodes.
+        :param n_nodes: number of nodes, the max position plus one if None.
+        :param adjacency: (n_faces, 3) array of `face_adjacency`, computed if None.
+        """
+        connectivity = asarray(connectivity, dtype=int64).reshape((-1, 3))
+        if n_nodes is None:
+            n_nodes = int(connectivity.max()) + 1 if len(connectivity) else 0
+        if adjacency is None:
+            adjacency = face_adjacency(connectivity)
+
+        sides = connectivity[:, [0, 1, 1, 2, 2, 0]].reshape((-1, 3, 2))
+        self.border_edges = sides[adjacency < 0]
+        self.border_nodes = zeros(n_nodes, dtype=bool)
+        self.border_nodes[self.border_edges.ravel()] = True
+
+        # Both ends of the border edges, unoriented, grouped by node.
+        ends = concatenate((self.border_edges, self.border_edges[:, ::-1]))
+        ends = ends[argsort(ends[:, 0], kind='stable')]
+        degree = bincount(ends[:, 0], minlength=n_nodes)
+        first = cumsum(degree) - degree
+        # Nodes of two border edges, the others are corners whatever the angle.
+        self.regular = degree == 2
+        regular = flatnonzero(self.regular)
+        self.previous = full(n_nodes, -1, dtype=int64)
+        self.next = full(n_nodes, -1, dtype=int64)
+        self.previous[regular] = ends[first[regular], 1]
+        self.next[regular] = ends[first[regular] + 1, 1]
+        self.orient()
+
+        self.corner = self.border_nodes & ~self.regular
+        self.directions = zeros((n_nodes, 2, 3))
+
+    @classmethod
+    def from_grid(cls, grid):
+        """Boundary of the grid with the corners and the directions of its current coordinates."""
+        boundary = cls(grid.return_connectivity_as_a_ndim_array(), len(grid.Nodes))
+        boundary.update(grid.return_coordinates_as_a_ndim_array())
+        return boundary
+
+    def walk(self, start, node):
+        """
+        Nodes from `start` through its neighbour `node` along the regular nodes up to an irregular node.
+        :return: tuple (list of nodes, whether the walk came back to `start`, which is not repeated).
+        """
+        nodes = [start]
+        while node != start:
+            nodes.append(node)
+            if not self.regular[node]:
+                return nodes, False
+            # The neighbour on the other side than the node it was reached from.
+            node = int(self.next[node] if self.previous[node] == nodes[-2] else self.previous[node])
+        return nodes, True
+
+    def orient(self):
+        """
+        Find the chains of the border and make the previous and the next nodes of their regular nodes
+        follow each other in the direction of most of the chain's border edges.
+        """
+        oriented = set(map(tuple, self.border_edges.tolist()))
+        visited = zeros(len(self.regular), dtype=bool)
+        self.chains = list()
+        for start in flatnonzero(self.regular).tolist():
+            if visited[start]:
+                continue
+            nodes, closed = self.walk(start, int(self.next[start]))
+            if not closed:
+                nodes = self.walk(start, int(self.previous[start]))[0][::-1] + nodes[1:]
+            pairs = list(zip(nodes, nodes[1:] + nodes[:1] if closed else nodes[1:]))
+            if sum((a, b) in oriented for a, b in pairs) < sum((b, a) in oriented for a, b in pairs):
+                nodes.reverse()
+            ring = nodes[-1:] + nodes + nodes[:1]
+            for i in range(1, len(nodes) + 1):
+                if self.regular[ring[i]]:
+                    self.previous[ring[i]], self.next[ring[i]] = ring[i - 1], ring[i + 1]
+            visited[nodes] = True
+            self.chains.append(nodes)
+        # Edges between irregular nodes are chains of their own.
+        self.chains += self.border_edges[~self.regular[self.border_edges].any(axis=1)].tolist()
+
+    def loops(self):
+        """
+        Boundary loops: lists of positions of nodes following the border.
+        A loop stops at an irregular node, so it is open there; the node ends all its loops.
+        """
+        return [list(nodes) for nodes in self.chains]
+
+    def update(self, coordinates, alpha=CORNER_ALPHA):
+        """
+        Compute the corner flags and the unit directions to the previous and the next
+        border nodes of the regular border nodes from the coordinates.
+        :param coordinates: (n_nodes, 3) array.
+        """
+        coordinates = asarray(coordinates, dtype=float)
+        nodes = flatnonzero(self.regular)
+        for side, neighbours in enumerate((self.previous, self.next)):
+            d = coordinates[neighbours[nodes]] - coordinates[nodes]
+            self.directions[nodes, side] = d / norm(d, axis=1).reshape((-1, 1))
+        self.corner = self.border_nodes & ~self.regular
+        self.corner[nodes] = (self.directions[nodes, 0] * self.directions[nodes, 1]).sum(axis=1) > -1 + alpha
+
+    def direction(self, node, shift):
+        """
+        Unit direction of the border edge of the node the shift points along the most,
+        zero for an irregular node.
+        :param node: position of the node.
+        :param shift: (3,) array.
+        """
+        directions = self.directions[node]
+        return directions[argmax(directions @ asarray(shift, dtype=float).reshape(3))]
@@ -0,0 +1,223 @@
+"""
+Bounding volume hierarchy over the centroids of faces.
+
+Unlike a KD-tree it does not have to be rebuilt when the nodes move
+(e.g. after smoothing): only the boxes of the leaves containing faces
+incident to moved nodes and of their ancestors are refitted. The tree
+answers nearest-centroid queries and can be passed as `index` to
+`face_centered_interpolation`.
+"""
+from numpy import array, arange, zeros, full, empty, inf, unique, minimum, maximum, where, sqrt, \
+    argsort, lexsort, bincount, concatenate, cumsum, repeat, any, flatnonzero, int64
+
+LEAF_SIZE = 8
+
+
+class FaceBVH:
+    __doc__ = "Refittable bounding volume hierarchy over the centroids of faces."
+
+    def __init__(self, coordinates, connectivity, leaf_size=LEAF_SIZE):
+        """
+        Build the hierarchy.
+        :param coordinates: (n_nodes, 3) array of coordinates of nodes.
+        :param connectivity: (n_faces, 3) array of positions of faces' nodes.
+        :param leaf_size: max number of faces in a leaf.
+        """
+        self.coordinates = array(coordinates, dtype=float)
+        self.connectivity = array(connectivity, dtype=int64)
+        self.leaf_size = leaf_size
+        self.centroids = self.coordinates[self.connectivity].mean(axis=1)
+        # Number of boxes refitted since the build.
+        self.refitted = 0
+
+        # CSR incidence: faces of node i are node_faces[node_faces_ptr[i]:node_faces_ptr[i + 1]].
+        nodes = self.connectivity.ravel()
+        self.node_faces = argsort(nodes, kind='stable') // 3
+        self.node_faces_ptr = concatenate(([0], cumsum(bincount(nodes, minlength=len(self.coordinates)))))
+
+        self.build()
+
+    @classmethod
+    def from_grid(cls, grid, leaf_size=LEAF_SIZE):
+        return cls(grid.return_coordinates_as_a_ndim_array(), grid.return_connectivity_as_a_ndim_array(), leaf_size)
+
+    def build(self):
+        """Split faces by the median along the longest side of the box until the leaves are small."""
+        self.order = arange(len(self.centroids))
+        left, right, parent, start, end, depth = [], [], [], [], [], []
+        stack = [(0, len(self.order), -1, 0)]
+        while stack:
+            s, e, p, d = stack.pop()
+            node = len(left)
+            left.append(-1)
+            right.append(-1)
+            parent.append(p)
+            start.append(s)
+            end.append(e)
+            depth.append(d)
+            if p != -1:
+                if left[p] == -1:
+                    left[p] = node
+                else:
+                    right[p] = node
+            if e - s <= self.leaf_size:
+                continue
+
+            points = self.centroids[self.order[s:e]]
+            axis = (points.max(axis=0) - points.min(axis=0)).argmax()
+            middle = (e - s) // 2
+            self.order[s:e] = self.order[s:e][points[:, axis].argpartition(middle)]
+            # The right child is pushed first, so the left one is created first.
+            stack.append((s + middle, e, node, d + 1))
+            stack.append((s, s + middle, node, d + 1))
+
+        self.left = array(left, dtype=int64)
+        self.right = array(right, dtype=int64)
+        self.parent = array(parent, dtype=int64)
+        self.depth = array(depth, dtype=int64)
+        start = array(start, dtype=int64)
+        end = array(end, dtype=int64)
+
+        # Leaves sorted by their range in `order`: the ranges cover it without gaps.
+        self.leaves = flatnonzero(self.left == -1)
+        self.leaves = self.leaves[argsort(start[self.leaves])]
+        sizes = end[self.leaves] - start[self.leaves]
+        self.leaf_of = empty(len(self.centroids), dtype=int64)
+        self.leaf_of[self.order] = repeat(self.leaves, sizes)
+
+        # Faces of each leaf, padded with -1.
+        self.leaf_row = full(len(self.left), -1, dtype=int64)
+        self.leaf_row[self.leaves] = arange(len(self.leaves))
+        self.leaf_faces = full((len(self.leaves), self.leaf_size), -1, dtype=int64)
+        rows = repeat(arange(len(self.leaves)), sizes)
+        columns = arange(len(self.order)) - repeat(start[self.leaves], sizes)
+        self.leaf_faces[rows, columns] = self.order
+
+        self.lo = empty((len(self.left), 3))
+        self.hi = empty((len(self.left), 3))
+        self.fit_leaves(self.leaves)
+        for d in range(self.depth.max() - 1, -1, -1):
+            self.fit_internal(flatnonzero((self.depth == d) & (self.left != -1)))
+
+    def fit_leaves(self, leaves):
+        """Recompute the boxes of the leaves from the centroids of their faces."""
+        faces = self.leaf_faces[self.leaf_row[leaves]]
+        points = self.centroids[faces]
+        padding = (faces == -1)[:, :, None]
+        self.lo[leaves] = where(padding, inf, points).min(axis=1)
+        self.hi[leaves] = where(padding, -inf, points).max(axis=1)
+
+    def fit_internal(self, nodes):
+        """Recompute the boxes of the internal nodes from the boxes of their children."""
+        self.lo[nodes] = minimum(self.lo[self.left[nodes]], self.lo[self.right[nodes]])
+        self.hi[nodes] = maximum(self.hi[self.left[nodes]], self.hi[self.right[nodes]])
+
+    def incident_faces(self, nodes):
+        """Positions of the faces incident to the nodes."""
+        starts = self.node_faces_ptr[nodes]
+        counts = self.node_faces_ptr[nodes + 1] - starts
+        positions = repeat(starts - cumsum(counts) + counts, counts) + arange(counts.sum())
+        return unique(self.node_faces[positions])
+
+    def refit(self, coordinates):
+        """
+        Update the hierarchy after the nodes have moved.
+
+        Moved nodes are found by comparison with the coordinates of the previous fit.
+        Boxes are refitted from the leaves of the faces incident to the moved nodes
+        upwards, while they change.
+
+        :param coordinates: (n_nodes, 3) array of new coordinates of nodes.
+        :return: number of refitted boxes.
+        """
+        coordinates = array(coordinates, dtype=float)
+        assert coordinates.shape == self.coordinates.shape, 'Wrong number of nodes'
+        moved = flatnonzero(any(coordinates != self.coordinates, axis=1))
+        self.coordinates = coordinates
+        if len(moved) == 0:
+            return 0
+
+        faces = self.incident_faces(moved)
+        self.centroids[faces] = coordinates[self.connectivity[faces]].mean(axis=1)
+
+        nodes = unique(self.leaf_of[faces])
+        lo, hi = self.lo[nodes].copy(), self.hi[nodes].copy()
+        self.fit_leaves(nodes)
+        refitted = len(nodes)
+        while len(nodes) > 0:
+            changed = any(self.lo[nodes] != lo, axis=1) | any(self.hi[nodes] != hi, axis=1)
+            nodes = unique(self.parent[nodes[changed]])
+            nodes = nodes[nodes != -1]
+            lo, hi = self.lo[nodes].copy(), self.hi[nodes].copy()
+            self.fit_internal(nodes)
+            refitted += len(nodes)
+
+        self.refitted += refitted
+        return refitted
+
+    def update_from_grid(self, grid):
+        """Refit the hierarchy to the current coordinates of the grid's nodes, e.g. after `Smoothing`."""
+        return self.refit(grid.return_coordinates_as_a_ndim_array())
+
+    def box_distance(self, points, nodes):
+        """Squared distances from the points to the boxes of the nodes."""
+        outside = maximum(maximum(self.lo[nodes] - points, points - self.hi[nodes]), 0)
+        return (outside ** 2).sum(axis=1)
+
+    def leaf_nearest(self, points, leaves):
+        """Squared distance to and position of the nearest centroid in the leaf for each point."""
+        faces = self.leaf_faces[self.leaf_row[leaves]]
+        distances = ((self.centroids[faces] - points[:, None, :]) ** 2).sum(axis=2)
+        distances[faces == -1] = inf
+        nearest = distances.argmin(axis=1)
+        rows = arange(len(leaves))
+        return distances[rows, nearest], faces[rows, nearest]
+
+    def query(self, points):
+        """
+        Find the nearest centroids of faces.
+
+        All points are processed together: each step handles
+        the pairs (point, node of the tree) of one level.
+
+        :param points: (n_points, 3) array.
+        :return: tuple (distances, positions of the faces) as `KDTree.query`.
+        """
+        points = array(points, dtype=float).reshape((-1, 3))
+        n = len(points)
+
+        # Initial candidate: descend into the closer child.
+        node = zeros(n, dtype=int64)
+        queries = flatnonzero(self.left[node] != -1)
+        while len(queries) > 0:
+            left, right = self.left[node[queries]], self.right[node[queries]]
+            closer = self.box_distance(points[queries], left) <= self.box_distance(points[queries], right)
+            node[queries] = where(closer, left, right)
+            queries = queries[self.left[node[queries]] != -1]
+        best_distances, best_faces = self.leaf_nearest(points, node)
+
+        # Branch and bound: visit only the boxes closer than the best candidate.
+        queries = arange(n)
+        nodes = zeros(n, dtype=int64)
+        while len(queries) > 0:
+            close = self.box_distance(points[queries], nodes) < best_distances[queries]
+            queries, nodes = queries[close], nodes[close]
+
+            leaf = self.left[nodes] == -1
+            leaf_queries = queries[leaf]
+            if len(leaf_queries) > 0:
+                distances, faces = self.leaf_nearest(points[leaf_queries], nodes[leaf])
+                # The closest candidate of each point.
+                order = lexsort((distances, leaf_queries))
+                leaf_queries, distances, faces = leaf_queries[order], distances[order], faces[order]
+                first = concatenate(([True], leaf_queries[1:] != leaf_queries[:-1]))
+                leaf_queries, distances, faces = leaf_queries[first], distances[first], faces[first]
+                better = distances < best_distances[leaf_queries]
+                best_distances[leaf_queries[better]] = distances[better]
+                best_faces[leaf_queries[better]] = faces[better]
+
+            queries, nodes = queries[~leaf], nodes[~leaf]
+            queries = concatenate((queries, queries))
+            nodes = concatenate((self.left[nodes], self.right[nodes]))
+
+        return sqrt(best_distances), best_faces
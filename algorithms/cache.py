@@ -0,0 +1,148 @@
+"""LRU cache of parsed source grids and their spatial indexes."""
+from collections import OrderedDict
+from os import stat
+from os.path import realpath
+from triangular_grid.grid import Grid
+from tecplot.io import read_tecplot
+from algorithms.registry import indexes
+
+# Rough footprint of the object model per element, bytes.
+# Measured on the objects of `triangular_grid` with CPython 3.
+NODE_BYTES = 700
+FACE_BYTES = 1300
+EDGE_BYTES = 450
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+class CacheEntry:
+    __doc__ = "Parsed grid together with the indexes built over it."
+
+    def __init__(self, filename, signature, grid):
+        self.filename = filename
+        self.signature = signature
+        self.grid = grid
+        self.indexes = dict()
+        self.nbytes = self.grid_nbytes(grid)
+
+    @staticmethod
+    def grid_nbytes(grid):
+        """Estimate the memory occupied by the grid."""
+        nbytes = len(grid.Nodes) * NODE_BYTES + len(grid.Faces) * FACE_BYTES + len(grid.Edges) * EDGE_BYTES
+        # Pass-through variables are kept as raw lines, or only as their positions in the file if read lazily.
+        for z in grid.Zones:
+            nbytes += sum(len(v) for v in getattr(z, 'variables', ()) if isinstance(v, str))
+        return nbytes
+
+    @staticmethod
+    def index_nbytes(index):
+        """
+        Estimate the memory occupied by the index: the data plus the permutation of points
+        of a KD-tree, the points, the simplices and their neighbours of a triangulation,
+        the KD-trees and the positions of faces of the parts of a constrained index.
+        """
+        if hasattr(index, 'trees'):
+            return index.labels.nbytes + sum(CacheEntry.index_nbytes(tree) + faces.nbytes
+                                             for tree, faces in index.trees.values())
+        if hasattr(index, 'simplices'):
+            return index.points.nbytes + index.simplices.nbytes + index.neighbors.nbytes
+        return index.data.nbytes + index.indices.nbytes
+
+
+class GridCache:
+    __doc__ = "LRU cache of source grids bounded by the estimated memory footprint."
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def signature(filename):
+        """File is considered changed when its size or modification time differs."""
+        s = stat(filename)
+        return s.st_size, s.st_mtime_ns
+
+    def get(self, filename):
+        """
+        Return the cache entry for the file, reading the grid if it is absent or stale.
+
+        Parameters
+        ----------
+            filename : string
+                tecplot file with the grid
+
+        Returns
+        -------
+            CacheEntry
+        """
+        key = realpath(filename)
+        signature = self.signature(key)
+
+        entry = self.entries.get(key)
+        if entry is not None and entry.signature == signature:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        if entry is not None:
+            self.pop(key)
+
+        self.misses += 1
+        grid = Grid()
+        # Pass-through variables of the source are never written, only their positions are kept.
+        read_tecplot(grid, key, lazy=True)
+        entry = CacheEntry(key, signature, grid)
+        self.entries[key] = entry
+        self.nbytes += entry.nbytes
+        self.evict()
+        return entry
+
+    def get_index(self, filename, method):
+        """
+        Return the grid and the index of the `method` built over it.
+
+        Parameters
+        ----------
+            filename : string
+                tecplot file with the source grid
+            method : string
+                name of the interpolation method
+
+        Returns
+        -------
+            tuple : (Grid, index)
+        """
+        entry = self.get(filename)
+        if method not in entry.indexes:
+            index = indexes[method](entry.grid)
+            entry.indexes[method] = index
+            nbytes = CacheEntry.index_nbytes(index)
+            entry.nbytes += nbytes
+            self.nbytes += nbytes
+            self.evict()
+        return entry.grid, entry.indexes[method]
+
+    def pop(self, key):
+        entry = self.entries.pop(key)
+        self.nbytes -= entry.nbytes
+        return entry
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits into `max_bytes`.
+
+        The most recently used entry (the one in use) is never evicted.
+        """
+        for key in list(self.entries.keys())[:-1]:
+            if self.nbytes <= self.max_bytes:
+                break
+            self.pop(key)
+
+    def stats(self):
+        return {'entries': list(self.entries.keys()),
+                'nbytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses}
@@ -0,0 +1,175 @@
+"""
+Nearest-face search restricted to matching parts of the grids.
+
+A target face takes values only from the source faces of the same
+zone (matched by the titles) or of the matching connected component,
+and only if they are closer than the max distance. It prevents picking
+values from a close but unrelated surface, e.g. across a thin gap.
+
+The source has a KD-tree per part, the targets are queried part by part.
+"""
+from numpy import array, full, inf, nan, flatnonzero, bincount, int64
+from triangular_grid.grid import INTERPOLATED_FIELDS
+from algorithms.metrics import zone_slices
+
+CONSTRAINTS = ('zone', 'component')
+
+
+class ConstrainedIndex:
+    __doc__ = "KD-trees over the centroids of the faces of each part of the grid."
+
+    def __init__(self, grid, labels, constraint=None):
+        """
+        Build a KD-tree for each part.
+        :param grid: source grid.
+        :param labels: (n_faces,) array of numbers of parts of the faces, faces labelled -1 are skipped.
+        :param constraint: 'zone' or 'component', the kind of the parts.
+        """
+        from scipy.spatial import KDTree
+        grid.compute_aux_nodes()
+        centroids = grid.return_aux_nodes_as_a_ndim_array()
+        self.labels = array(labels, dtype=int64)
+        self.constraint = constraint
+        self.n_faces = len(centroids)
+        self.trees = dict()
+        for label in set(self.labels.tolist()) - {-1}:
+            faces = flatnonzero(self.labels == label)
+            self.trees[label] = (KDTree(centroids[faces]), faces)
+
+    def query(self, points, labels, max_distance=inf):
+        """
+        Find the nearest centroids of the faces of the same part closer than `max_distance`.
+        :param points: (n, 3) array.
+        :param labels: (n,) array of numbers of parts of the points.
+        :return: tuple (distances, positions of the faces) as `KDTree.query`:
+                 inf and the number of faces if there is no such face.
+        """
+        points = array(points, dtype=float).reshape((-1, 3))
+        labels = array(labels, dtype=int64)
+        distances = full(len(points), inf)
+        ids = full(len(points), self.n_faces, dtype=int64)
+        for label, (tree, faces) in self.trees.items():
+            mine = flatnonzero(labels == label)
+            if len(mine) == 0:
+                continue
+            d, i = tree.query(points[mine], distance_upper_bound=max_distance)
+            found = i < len(faces)
+            distances[mine[found]] = d[found]
+            ids[mine[found]] = faces[i[found]]
+        return distances, ids
+
+    def nearest(self, points):
+        """Find the nearest centroids among the faces of all parts, as `KDTree.query`."""
+        points = array(points, dtype=float).reshape((-1, 3))
+        distances = full(len(points), inf)
+        ids = full(len(points), self.n_faces, dtype=int64)
+        for tree, faces in self.trees.values():
+            d, i = tree.query(points)
+            closer = d < distances
+            distances[closer] = d[closer]
+            ids[closer] = faces[i[closer]]
+        return distances, ids
+
+
+def zone_labels(grid, titles=None):
+    """
+    Number the faces' zones by their titles.
+    :param titles: list of titles, faces of zones with other titles are labelled -1.
+                   Titles of the grid's zones if None.
+    :return: tuple ((n_faces,) array of labels, list of titles).
+    """
+    slices = zone_slices(grid)
+    if titles is None:
+        titles = [title for title, _ in slices]
+    labels = full(len(grid.Faces), -1, dtype=int64)
+    for title, s in slices:
+        if title in titles:
+            labels[s] = titles.index(title)
+    return labels, titles
+
+
+def match_components(index, grid):
+    """
+    Label the faces of the grid by the components of the index's source grid.
+
+    Each component of the grid is matched to the source component containing
+    the nearest faces of the most of its faces.
+
+    :param index: `ConstrainedIndex` of the source labelled by components.
+    :return: (n_faces,) array of labels.
+    """
+    n_components, _, face_labels = grid.label_components()
+    n_source = index.labels.max() + 1
+
+    grid.compute_aux_nodes()
+    nearest = index.labels[index.nearest(grid.return_aux_nodes_as_a_ndim_array())[1]]
+    votes = bincount(face_labels * n_source + nearest, minlength=n_components * n_source)
+    return votes.reshape((n_components, n_source)).argmax(axis=1)[face_labels]
+
+
+def build_zone_index(grid):
+    """`ConstrainedIndex` of the grid's zones."""
+    labels, titles = zone_labels(grid)
+    index = ConstrainedIndex(grid, labels, 'zone')
+    index.titles = titles
+    return index
+
+
+def build_component_index(grid):
+    """`ConstrainedIndex` of the grid's connected components."""
+    return ConstrainedIndex(grid, grid.label_components()[2], 'component')
+
+
+def constrained_interpolation(old_grid, new_grid, index=None, constraint='zone', max_distance=inf,
+                              fields=INTERPOLATED_FIELDS):
+    """
+    Take the values of the nearest source face of the same zone or the matching component.
+
+    Faces without a source face of their part closer than `max_distance` get NaN.
+
+    Parameters
+    ----------
+        old_grid : Grid object
+            source grid
+        new_grid : Grid object
+            target grid
+        index : ConstrainedIndex
+            index of the source, built for the constraint if None
+        constraint : string
+            'zone' or 'component', ignored if the index is given
+        max_distance : float
+            max distance between the centroids of the target and the source faces
+        fields : list of strings
+            names of faces' fields
+
+    Returns
+    -------
+        (n_faces,) bool array
+            target faces which got values
+    """
+    assert constraint in CONSTRAINTS, 'Unknown constraint {}'.format(constraint)
+    if index is None:
+        index = build_zone_index(old_grid) if constraint == 'zone' else build_component_index(old_grid)
+    if index.constraint == 'zone':
+        labels = zone_labels(new_grid, index.titles)[0]
+    else:
+        labels = match_components(index, new_grid)
+
+    new_grid.compute_aux_nodes()
+    ids = index.query(new_grid.return_aux_nodes_as_a_ndim_array(), labels, max_distance)[1]
+    found = ids < index.n_faces
+    for name in fields:
+        values = full(len(new_grid.Faces), nan)
+        values[found] = old_grid.return_field_as_a_ndim_array(name)[ids[found]]
+        new_grid.set_field_from_a_ndim_array(name, values)
+    return found
+
+
+def zone_constrained_interpolation(old_grid, new_grid, index=None, max_distance=inf):
+    """`constrained_interpolation` within the zones of the same titles."""
+    return constrained_interpolation(old_grid, new_grid, index, 'zone', max_distance)
+
+
+def component_constrained_interpolation(old_grid, new_grid, index=None, max_distance=inf):
+    """`constrained_interpolation` within the matching connected components."""
+    return constrained_interpolation(old_grid, new_grid, index, 'component', max_distance)
@@ -0,0 +1,198 @@
+"""
+Spatial index split into shards served by worker processes.
+
+The points of the source (centroids of faces or nodes) are partitioned
+by recursive median bisection, each shard is indexed and queried by its
+own worker process. The coordinator keeps only the bounding boxes of
+the shards and the positions of their points: it routes each query to
+the shard whose box is the closest, then to the other shards whose boxes
+are closer than the distance found, and merges the results. Workers
+communicate through queues, so all of them can run on one machine.
+The coordinator waits for responses by `POLL_INTERVAL` and fails if a
+worker died or no response came for `timeout` seconds, so a crashed
+worker does not hang it; the index is a context manager stopping the
+workers whatever happens.
+"""
+import multiprocessing
+from queue import Empty
+from numpy import array, arange, full, inf, maximum, flatnonzero, int64
+
+DEFAULT_SHARDS = 4
+# Seconds between checks of the workers while waiting for a response.
+POLL_INTERVAL = 1.0
+# Seconds to wait for a worker to stop before it is terminated.
+JOIN_TIMEOUT = 5.0
+
+
+def partition(points, n_shards):
+    """
+    Split the points into shards of close points.
+
+    The biggest shard is split by the median along the longest side
+    of its box until there are `n_shards` of them.
+
+    :param points: (n_points, 3) array.
+    :param n_shards: number of shards.
+    :return: list of arrays of positions of points of each shard.
+    """
+    shards = [arange(len(points))]
+    while len(shards) < min(n_shards, len(points)):
+        shard = shards.pop(max(range(len(shards)), key=lambda i: len(shards[i])))
+        p = points[shard]
+        axis = (p.max(axis=0) - p.min(axis=0)).argmax()
+        middle = len(shard) // 2
+        order = p[:, axis].argpartition(middle)
+        shards += [shard[order[:middle]], shard[order[middle:]]]
+    return shards
+
+
+def shard_worker(points, requests, responses, shard):
+    """
+    Build the KD-tree of the shard and answer queries until None is received.
+
+    A request is (positions of the queries, (n, 3) array of points, (n,) array of upper bounds
+    of distances), the response is (shard, positions of the queries, distances, positions
+    of the nearest points in the shard); distance is inf and position is the number of points
+    of the shard if none is closer than the bound.
+    """
+    from scipy.spatial import KDTree
+    tree = KDTree(points)
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        queries, points_, bounds = request
+        distances, ids = tree.query(points_, distance_upper_bound=bounds.max())
+        far = distances >= bounds
+        distances[far], ids[far] = inf, len(points)
+        responses.put((shard, queries, distances, ids))
+
+
+class ShardedIndex:
+    __doc__ = "Nearest-point index partitioned into shards queried by worker processes."
+
+    def __init__(self, points, n_shards=DEFAULT_SHARDS, context=None, timeout=None):
+        """
+        Partition the points and start a worker for each shard.
+        :param points: (n_points, 3) array.
+        :param n_shards: number of shards (worker processes).
+        :param context: multiprocessing context, the default one if None.
+        :param timeout: max seconds to wait for a response, no limit while the workers are alive if None.
+        """
+        points = array(points, dtype=float)
+        context = context or multiprocessing.get_context()
+        self.shards = partition(points, n_shards)
+        self.lo = array([points[s].min(axis=0) for s in self.shards])
+        self.hi = array([points[s].max(axis=0) for s in self.shards])
+        self.n_points = len(points)
+        self.requests_sent = 0
+        self.timeout = timeout
+
+        self.responses = context.Queue()
+        self.requests = list()
+        self.workers = list()
+        for i, s in enumerate(self.shards):
+            requests = context.Queue()
+            worker = context.Process(target=shard_worker, args=(points[s], requests, self.responses, i), daemon=True)
+            worker.start()
+            self.requests.append(requests)
+            self.workers.append(worker)
+
+    @classmethod
+    def from_grid(cls, grid, method='cell_centered', n_shards=DEFAULT_SHARDS, timeout=None):
+        """Index of the grid's points the method searches: centroids of faces or nodes for 'with_relocation'."""
+        if method == 'with_relocation':
+            return cls(grid.return_coordinates_as_a_ndim_array(), n_shards, timeout=timeout)
+        grid.compute_aux_nodes()
+        return cls(grid.return_aux_nodes_as_a_ndim_array(), n_shards, timeout=timeout)
+
+    def box_distances(self, points):
+        """(n_points, n_shards) distances from the points to the boxes of the shards."""
+        points = points[:, None, :]
+        outside = maximum(maximum(self.lo[None, :, :] - points, points - self.hi[None, :, :]), 0)
+        return (outside ** 2).sum(axis=2) ** 0.5
+
+    def scatter(self, points, queries, shards, bounds):
+        """Send the queries to the shards, return the number of requests sent."""
+        sent = 0
+        for shard in range(len(self.shards)):
+            mine = flatnonzero(shards == shard)
+            if len(mine) == 0:
+                continue
+            self.requests[shard].put((queries[mine], points[queries[mine]], bounds[queries[mine]]))
+            sent += 1
+        self.requests_sent += sent
+        return sent
+
+    def receive(self):
+        """
+        Wait for the next response.
+        :raise RuntimeError: if a worker died or no response came for `timeout` seconds.
+        """
+        waited = 0.0
+        while True:
+            try:
+                return self.responses.get(timeout=POLL_INTERVAL)
+            except Empty:
+                waited += POLL_INTERVAL
+            dead = [i for i, worker in enumerate(self.workers) if not worker.is_alive()]
+            if dead:
+                raise RuntimeError('Workers of shards {} died'.format(dead))
+            if self.timeout is not None and waited >= self.timeout:
+                raise RuntimeError('No response of the workers for {} s'.format(waited))
+
+    def gather(self, sent, best_distances, best_ids):
+        """Receive the responses and keep the closest point for each query."""
+        for _ in range(sent):
+            shard, queries, distances, ids = self.receive()
+            found = ids < len(self.shards[shard])
+            queries, distances, ids = queries[found], distances[found], ids[found]
+            # Queries of one request are distinct, so the assignment has no conflicts.
+            better = distances < best_distances[queries]
+            best_distances[queries[better]] = distances[better]
+            best_ids[queries[better]] = self.shards[shard][ids[better]]
+
+    def query(self, points):
+        """
+        Find the nearest points.
+        :param points: (n, 3) array.
+        :return: tuple (distances, positions of the points) as `KDTree.query`.
+        """
+        points = array(points, dtype=float).reshape((-1, 3))
+        n = len(points)
+        best_distances = full(n, inf)
+        best_ids = full(n, self.n_points, dtype=int64)
+        boxes = self.box_distances(points)
+
+        # The closest box first: usually it contains the nearest point.
+        order = boxes.argsort(axis=1)
+        queries = arange(n)
+        self.gather(self.scatter(points, queries, order[:, 0], best_distances), best_distances, best_ids)
+
+        # Then every box closer than the distance found, visited in the order of the distance.
+        for k in range(1, len(self.shards)):
+            shards = order[:, k]
+            queries = flatnonzero(boxes[arange(n), shards] < best_distances)
+            if len(queries) == 0:
+                break
+            self.gather(self.scatter(points, queries, shards[queries], best_distances), best_distances, best_ids)
+
+        return best_distances, best_ids
+
+    def close(self):
+        """Stop the workers, those not stopping in `JOIN_TIMEOUT` seconds are terminated."""
+        for requests, worker in zip(self.requests, self.workers):
+            if worker.is_alive():
+                requests.put(None)
+        for worker in self.workers:
+            worker.join(JOIN_TIMEOUT)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        self.workers = list()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
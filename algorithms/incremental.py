@@ -0,0 +1,55 @@
+"""Re-interpolation of the target when only a part of the source field changes."""
+from numpy import asarray, unique
+from triangular_grid.grid import INTERPOLATED_FIELDS
+from algorithms.registry import operators
+
+
+class IncrementalInterpolation:
+    __doc__ = "Keeps the operator of the method and updates only the target faces depending on changed source faces."
+
+    def __init__(self, old_grid, new_grid, method='cell_centered', index=None, fields=INTERPOLATED_FIELDS):
+        """
+        Build the operator of the method for the pair of grids.
+        :param old_grid: source grid.
+        :param new_grid: target grid.
+        :param method: name of the interpolation method.
+        :param index: prebuilt index of the source grid for the method.
+        :param fields: names of faces' fields to transfer.
+        """
+        self.old_grid = old_grid
+        self.new_grid = new_grid
+        self.fields = fields
+        self.operator = operators[method](old_grid, new_grid, index).tocsr()
+        # Reverse map: column j lists target faces depending on source face j.
+        self.dependents = self.operator.tocsc()
+
+    def affected_faces(self, changed_faces):
+        """
+        Return sorted positions of target faces depending on the changed source faces.
+        :param changed_faces: positions of source faces in `old_grid.Faces`.
+        """
+        return unique(self.dependents[:, asarray(changed_faces, dtype=int)].indices)
+
+    def interpolate(self, faces=None):
+        """
+        Evaluate the target values of `faces` (all faces if None) from the current source values.
+
+        Only the source faces the target faces depend on are read.
+        """
+        operator = self.operator if faces is None else self.operator[faces]
+        sources = unique(operator.indices)
+        operator = operator[:, sources]
+        for name in self.fields:
+            values = self.old_grid.return_field_as_a_ndim_array(name, sources)
+            self.new_grid.set_field_from_a_ndim_array(name, operator @ values, faces)
+
+    def update(self, changed_faces):
+        """
+        Update the target after values of some source faces have changed.
+        :param changed_faces: positions of changed source faces in `old_grid.Faces`.
+        :return: positions of updated target faces in `new_grid.Faces`.
+        """
+        affected = self.affected_faces(changed_faces)
+        if len(affected) > 0:
+            self.interpolate(affected)
+        return affected
@@ -0,0 +1,77 @@
+"""
+Concurrent loading of the source and the target grids.
+
+Parsing the files and building the index of the source take most of the
+time of a run and do not depend on each other. The source is read and
+its index is built in a worker process while the main process reads the
+target and computes its centroids.
+
+The worker returns the source as `ArrayGrid` of the interpolated fields
+and the index (KD-tree or triangulation), both pickled to the main
+process. The source stays an `ArrayGrid`, interpolated by the methods of
+`algorithms.registry.array_methods`, so no object graph is built after
+the worker is joined; a method needing the graph builds it by `to_grid`.
+Tecplot files are read by the streaming `tecplot.tokenizer`.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from os.path import splitext
+from numpy import float64
+from triangular_grid.grid import INTERPOLATED_FIELDS
+
+# Methods whose index is built from the arrays of the source, the constrained ones need its zones.
+CONCURRENT_METHODS = ('cell_centered', 'with_relocation', 'linear', 'least_squares')
+
+
+def read_source(filename, method=None, snapshot=None, dtype=float64):
+    """
+    Read the source grid into arrays and build its index, run by the worker.
+    :param filename: tecplot file or HDF5 store of snapshots.
+    :param method: name of the method of the index, no index if None.
+    :param snapshot: number of the snapshot of the store, only the mesh if None.
+    :param dtype: float type of the values of the fields, e.g. float32.
+    :return: tuple (ArrayGrid, index or None).
+    """
+    if splitext(filename)[1] == '.h5':
+        from tecplot.snapshots import SnapshotStore
+        with SnapshotStore(filename) as store:
+            source = store.mesh(dtype) if snapshot is None else store.read_grid(snapshot, dtype=dtype)
+    else:
+        from tecplot.tokenizer import read_tecplot_arrays
+        source = read_tecplot_arrays(filename, INTERPOLATED_FIELDS, dtype=dtype)
+    if method is None:
+        return source, None
+    from algorithms.registry import indexes
+    return source, indexes[method](source)
+
+
+def load_grids(source, read_target, method=None, snapshot=None, context=None, dtype=float64):
+    """
+    Read the source and build its index in a worker process while the target is read.
+
+    Parameters
+    ----------
+        source : string
+            tecplot file or HDF5 store of snapshots of the source grid
+        read_target : callable
+            function without arguments returning the target grid, called in the main process
+        method : string
+            method of the index, one of `CONCURRENT_METHODS`, no index if None
+        snapshot : int
+            number of the snapshot of the store, only the mesh if None
+        context : multiprocessing context
+            context of the worker, the default one if None
+        dtype : numpy dtype
+            float type of the values of the source's fields, kept by its grid
+
+    Returns
+    -------
+        tuple (source ArrayGrid, index or None, target grid)
+    """
+    assert method is None or method in CONCURRENT_METHODS, 'Method {} needs the zones of the source'.format(method)
+    with ProcessPoolExecutor(max_workers=1, mp_context=context or multiprocessing.get_context()) as pool:
+        future = pool.submit(read_source, source, method, snapshot, dtype)
+        target = read_target()
+        target.compute_aux_nodes()
+        source, index = future.result()
+    return source, index, target
@@ -1,52 +1,194 @@
-from scipy.spatial import KDTree
-from scipy.interpolate import griddata
+from numpy import column_stack, isnan, where, cross, einsum, concatenate, zeros, errstate, clip, fmin, fmax, nan
+from numpy.linalg import norm, pinv
+from triangular_grid.grid import INTERPOLATED_FIELDS
+from triangular_grid.array_grid import ArrayGrid
+from algorithms.neighbourhood import face_adjacency
 
+# scipy is imported on first use: it dominates the start-up time of the CLI.
 
-def interpolate_(old_grid, new_grid):
-    old_nodes = old_grid.return_coordinates_as_a_ndim_array()
-    kdtree = KDTree(old_nodes)
 
-    for new_n in new_grid.Nodes:
-        i = kdtree.query(new_n.coordinates())[1]
-        neighbour = old_grid.Nodes[i]
+def build_node_index(grid):
+    """KD-tree over the nodes of the grid."""
+    from scipy.spatial import KDTree
+    return KDTree(grid.return_coordinates_as_a_ndim_array())
 
-        new_n.T = neighbour.T
-        new_n.Hw = neighbour.Hw
 
+def build_face_index(grid):
+    """KD-tree over the aux nodes (centroids) of the faces of the grid."""
+    from scipy.spatial import KDTree
+    grid.compute_aux_nodes()
+    return KDTree(grid.return_aux_nodes_as_a_ndim_array())
 
-def interpolate_with_relocation(old_grid, new_grid):
+
+def interpolate_(old_grid, new_grid, index=None, fields=INTERPOLATED_FIELDS):
+    """Each node of the new grid takes the values of the nearest node of the old grid."""
+    if index is None:
+        index = build_node_index(old_grid)
+
+    ids = index.query(new_grid.return_coordinates_as_a_ndim_array())[1]
+    for name in fields:
+        new_grid.set_node_field_from_a_ndim_array(name, old_grid.return_node_field_as_a_ndim_array(name)[ids])
+
+
+def interpolate_with_relocation(old_grid, new_grid, index=None, weights='uniform', fields=INTERPOLATED_FIELDS):
     """Interpolation with relocation of values in consideration from
        faces to nodes - interpolate using knn - from nodes to faces.
+
+       :param weights: 'uniform', 'area' or 'angle' weighting of the averages, see `algorithms.operators`.
     """
-    old_grid.relocate_values_from_faces_to_nodes()
-    interpolate_(old_grid, new_grid)
-    new_grid.relocate_values_from_nodes_to_faces()
+    old_grid.relocate_values_from_faces_to_nodes(fields, weights)
+    interpolate_(old_grid, new_grid, index, fields)
+    new_grid.relocate_values_from_nodes_to_faces(fields, weights)
 
 
-def face_centered_interpolation(old_grid, new_grid):
-    old_grid.compute_aux_nodes()
+def face_centered_interpolation(old_grid, new_grid, index=None):
+    if index is None:
+        index = build_face_index(old_grid)
     new_grid.compute_aux_nodes()
-    old_aux_nodes = old_grid.return_aux_nodes_as_a_ndim_array()
 
-    kdtree = KDTree(old_aux_nodes)
-    for f in new_grid.Faces:
-        i = kdtree.query(f.aux_node.coordinates())[1]
+    ids = index.query(new_grid.return_aux_nodes_as_a_ndim_array())[1]
+    for f, i in zip(new_grid.Faces, ids):
         f.T = old_grid.Faces[i].T
         f.Hw = old_grid.Faces[i].Hw
 
 
-def linear_interpolation(old_grid, new_grid):
-    old_grid.compute_aux_nodes()
+def array_face_centered_interpolation(old_grid, new_grid, index=None):
+    """`face_centered_interpolation` of `ArrayGrid`: values are copied in the precision of the new grid."""
+    if index is None:
+        index = build_face_index(old_grid)
+
+    ids = index.query(new_grid.return_aux_nodes_as_a_ndim_array())[1]
+    for name in INTERPOLATED_FIELDS:
+        new_grid.set_field_from_a_ndim_array(name, old_grid.return_field_as_a_ndim_array(name, ids))
+
+
+def build_triangulation(grid):
+    """Delaunay triangulation of the aux nodes (centroids) of the faces of the grid."""
+    from scipy.spatial import Delaunay
+    grid.compute_aux_nodes()
+    return Delaunay(grid.return_aux_nodes_as_a_ndim_array())
+
+
+def linear_interpolation(old_grid, new_grid, index=None, fallback=True):
+    """
+    Linear interpolation of the faces' values over the triangulation of the old grid's centroids.
+
+    Targets outside the convex hull of the old centroids get NaN. If `fallback`
+    is set, only these values are filled from the nearest old face, found
+    by one query for all of them.
+
+    :param index: triangulation made by `build_triangulation`, built if None.
+    """
+    from scipy.interpolate import LinearNDInterpolator
+    if index is None:
+        index = build_triangulation(old_grid)
     new_grid.compute_aux_nodes()
-    old_aux_nodes = old_grid.return_aux_nodes_as_a_ndim_array()
     new_aux_nodes = new_grid.return_aux_nodes_as_a_ndim_array()
-    values_T = old_grid.return_paramenter_as_ndarray(parameter='T')
-    values_Hw = old_grid.return_paramenter_as_ndarray(parameter='Hw')
-    res_T = griddata(old_aux_nodes, values_T, new_aux_nodes, method='linear')
-    res_Hw = griddata(old_aux_nodes, values_Hw, new_aux_nodes, method='linear')
-    new_grid.set_aux_nodes_parameters(res_T.T, 'T')
-    new_grid.set_aux_nodes_parameters(res_Hw.T, 'Hw')
 
+    # One interpolator for all fields: the simplices are located once.
+    values = column_stack([old_grid.return_field_as_a_ndim_array(name) for name in INTERPOLATED_FIELDS])
+    res = LinearNDInterpolator(index, values)(new_aux_nodes)
+
+    if fallback:
+        outside = isnan(res).any(axis=1)
+        if outside.any():
+            from scipy.spatial import KDTree
+            ids = KDTree(index.points).query(new_aux_nodes[outside])[1]
+            res[outside] = where(isnan(res[outside]), values[ids], res[outside])
+
+    for name, column in zip(INTERPOLATED_FIELDS, res.T):
+        new_grid.set_field_from_a_ndim_array(name, column)
+
+
+def face_gradients(coordinates, connectivity, values, adjacency=None):
+    """
+    Reconstruct gradients of the faces' values by least squares over the adjacent faces.
+
+    For each face the differences of values between the adjacent faces and the face
+    are fitted by the gradient times the differences of the centroids, weighted by
+    the inverse distances. The gradient is kept in the plane of the face by one more
+    equation: its projection on the normal is 0. The small systems of all faces are
+    solved at once by the stacked pseudo-inverse. Faces with NaN among the values of
+    the neighbours get zero gradient.
+
+    :param coordinates: (n_nodes, 3) array of coordinates of nodes.
+    :param connectivity: (n_faces, 3) array of positions of faces' nodes.
+    :param values: (n_faces, n_fields) array of values.
+    :param adjacency: (n_faces, 3) array made by `face_adjacency`, computed if None.
+    :return: (n_faces, n_fields, 3) array of gradients.
+    """
+    if adjacency is None:
+        adjacency = face_adjacency(connectivity)
+    p = coordinates[connectivity]
+    centroids = p.mean(axis=1)
+    normals = cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+    normals /= norm(normals, axis=1).reshape((-1, 1))
+
+    border = adjacency == -1
+    offsets = centroids[adjacency] - centroids[:, None, :]
+    with errstate(divide='ignore', invalid='ignore'):
+        weights = where(border, 0, 1 / norm(offsets, axis=2))
+    # (n_faces, 4, 3) systems: 3 adjacent faces and the normal.
+    systems = concatenate((offsets * weights[:, :, None], normals[:, None, :]), axis=1)
+    inverse = pinv(systems)
+
+    differences = (values[adjacency] - values[:, None, :]) * weights[:, :, None]
+    differences = where(border[:, :, None], 0, differences)
+    rhs = concatenate((differences, zeros((len(values), 1, values.shape[1]))), axis=1)
+    gradients = einsum('ijk,ikl->ilj', inverse, rhs)
+    return where(isnan(gradients), 0, gradients)
+
+
+def least_squares_interpolation(old_grid, new_grid, index=None, limit=True, fields=INTERPOLATED_FIELDS):
+    """
+    Second order interpolation: value of the nearest old face plus its gradient times the offset of the centroids.
+
+    Gradients are reconstructed by `face_gradients`. If `limit` is set, values are clipped
+    to the range of the values of the old face and its adjacent faces, so that no new
+    extrema appear.
+
+    :param index: KD-tree made by `build_face_index`, built if None.
+    """
+    if index is None:
+        index = build_face_index(old_grid)
+    coordinates = old_grid.return_coordinates_as_a_ndim_array()
+    connectivity = old_grid.return_connectivity_as_a_ndim_array()
+    adjacency = face_adjacency(connectivity)
+    values = column_stack([old_grid.return_field_as_a_ndim_array(name) for name in fields])
+    gradients = face_gradients(coordinates, connectivity, values, adjacency)
+
+    new_grid.compute_aux_nodes()
+    new_aux_nodes = new_grid.return_aux_nodes_as_a_ndim_array()
+    ids = index.query(new_aux_nodes)[1]
+    offsets = new_aux_nodes - coordinates[connectivity[ids]].mean(axis=1)
+    res = values[ids] + einsum('ijk,ik->ij', gradients[ids], offsets)
+
+    if limit:
+        faces = concatenate((ids[:, None], adjacency[ids]), axis=1)
+        neighbours = where((faces == -1)[:, :, None], nan, values[faces])
+        res = clip(res, fmin.reduce(neighbours, axis=1), fmax.reduce(neighbours, axis=1))
+
+    for name, column in zip(fields, res.T):
+        new_grid.set_field_from_a_ndim_array(name, column)
+
+
+def interpolate(old_grid, new_grid, method='cell_centered', index=None, **options):
+    """
+    Interpolate values from the old grid to the new one by the method.
+
+    If the grids are identical, values are copied without any search.
+    Methods of `ArrayGrid` are taken from `array_methods` if either grid is one.
+    Options are passed to the method, e.g. `max_distance` of the constrained ones.
+
+    :raise ValueError: if there is no such method, or no method of `ArrayGrid` of that name.
+    """
+    from algorithms.registry import methods, array_methods
+    if old_grid.is_identical_to(new_grid):
+        new_grid.relocate_values_from_isomorphic_grid(old_grid)
+        return
+    registry = array_methods if isinstance(old_grid, ArrayGrid) or isinstance(new_grid, ArrayGrid) else methods
+    if method not in registry:
+        raise ValueError('Method {} needs the grid of objects'.format(method) if method in methods
+                         else 'Wrong method {}'.format(method))
+    registry[method](old_grid, new_grid, index=index, **options)
 
-methods = {'cell_centered': face_centered_interpolation,
-           'with_relocation': interpolate_with_relocation}
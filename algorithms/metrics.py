@@ -0,0 +1,210 @@
+"""
+Conservation and error metrics of the interpolation.
+
+All faces of a grid are processed at once: integrals and area-weighted
+norms of each field over the whole grid and over each zone, and the
+number of missing (None) and NaN values. Fields are those the grids
+have: T, Hw and Hi of the faces and the pass-through variables of a grid
+read from tecplot file, the arrays of an `ArrayGrid` or a compact grid.
+
+The precision report compares a result computed in single precision
+with the double precision one.
+"""
+from numpy import array, equal, where, nan, isnan, fabs, sqrt, zeros, errstate, finfo, float64
+from triangular_grid.array_grid import ArrayGrid
+from algorithms.quality import face_areas
+from tecplot.io import face_fields
+
+# Fields kept in the attributes of the faces of a grid of objects, None if absent.
+FACE_ATTRIBUTES = ('T', 'Hw', 'Hi')
+
+NORMS = ('L1', 'L2', 'Linf')
+
+
+def field_names(grid):
+    """Return names of the faces' fields of the grid, see `tecplot.io.face_fields`."""
+    return list(face_fields(grid))
+
+
+def common_field_names(grid, other):
+    """Return names of the faces' fields of both grids in the order of the first one."""
+    names = set(field_names(other))
+    return [name for name in field_names(grid) if name in names]
+
+
+def field_values(grid, name, fields=None):
+    """
+    Return values of the faces' field and the mask of missing values.
+    :param fields: dict name -> (n_faces,) array of `tecplot.io.face_fields` of the grid, computed if None
+                   and the field is not an attribute of the faces.
+    :return: tuple ((n_faces,) float array with NaN instead of None, (n_faces,) bool array of None).
+    """
+    if isinstance(grid, ArrayGrid):
+        values = grid.return_field_as_a_ndim_array(name).astype(float64)
+        return values, zeros(len(values), dtype=bool)
+    if grid.face_store is not None:
+        values = grid.face_store[name]
+        return values, equal(values, None)
+    if name not in FACE_ATTRIBUTES:
+        # None of pass-through variables is parsed into NaN.
+        values = (face_fields(grid) if fields is None else fields)[name]
+        return values, zeros(len(values), dtype=bool)
+    raw = array([getattr(f, name) for f in grid.Faces], dtype=object)
+    missing = equal(raw, None)
+    return where(missing, nan, raw).astype(float), missing
+
+
+def zone_slices(grid):
+    """Return list of (zone title, slice of `Grid.Faces`) for each zone, one zone if faces aren't split."""
+    if isinstance(grid, ArrayGrid):
+        return [('ALL', slice(0, grid.n_faces))]
+    slices = list()
+    start = 0
+    for i, z in enumerate(grid.Zones):
+        title = z.name() or 'ZONE {}'.format(i + 1)
+        slices.append((title, slice(start, start + len(z.Faces))))
+        start += len(z.Faces)
+    if start != len(grid.Faces):
+        return [('ALL', slice(0, len(grid.Faces)))]
+    return slices
+
+
+def integrals(values, missing, area):
+    """Integral and area-weighted norms of the values over the faces, NaN and None values are skipped."""
+    defined = ~isnan(values)
+    v, s = values[defined], area[defined]
+    return {'area': area.sum(),
+            'integral': (v * s).sum(),
+            'L1': (fabs(v) * s).sum(),
+            'L2': sqrt((v ** 2 * s).sum()),
+            'Linf': fabs(v).max() if len(v) > 0 else nan,
+            'none': int(missing.sum()),
+            'nan': int((~defined).sum() - missing.sum())}
+
+
+def field_metrics(grid, fields=None):
+    """
+    Compute metrics of the fields of the grid.
+
+    Parameters
+    ----------
+        grid : Grid object or ArrayGrid
+            grid
+        fields : list of strings
+            names of faces' fields, all fields of the grid if None
+
+    Returns
+    -------
+        dict
+            name of the field -> {'total': metrics, 'zones': {title: metrics}},
+            metrics are the area, the integral, L1, L2, Linf norms and the numbers of None and NaN values.
+    """
+    area = face_areas(array(grid.return_coordinates_as_a_ndim_array(), dtype=float64),
+                      grid.return_connectivity_as_a_ndim_array())
+    slices = zone_slices(grid)
+    # Pass-through variables are parsed once for all of them.
+    values_of_file = None if fields is not None and set(fields) <= set(FACE_ATTRIBUTES) else face_fields(grid)
+    if fields is None:
+        fields = list(values_of_file)
+
+    metrics = dict()
+    for name in fields:
+        values, missing = field_values(grid, name, values_of_file)
+        metrics[name] = {'total': integrals(values, missing, area),
+                         'zones': {title: integrals(values[s], missing[s], area[s]) for title, s in slices}}
+    return metrics
+
+
+def difference(old, new):
+    """Differences of the integral and the norms: absolute and relative to the old values."""
+    res = dict()
+    for key in ('integral',) + NORMS:
+        res[key] = new[key] - old[key]
+        with errstate(divide='ignore', invalid='ignore'):
+            res[key + '_relative'] = res[key] / fabs(old[key])
+    return res
+
+
+def conservation_report(old_grid, new_grid, fields=None):
+    """
+    Compare metrics of the fields of the source and the interpolated grids.
+
+    Zones are matched by their titles. Fields are the given ones, or those of both grids if None.
+
+    Returns
+    -------
+        dict
+            'old', 'new': metrics of the grids made by `field_metrics`;
+            'difference': name of the field -> {'total': differences, 'zones': {title: differences}}.
+    """
+    if fields is None:
+        fields = common_field_names(old_grid, new_grid)
+    old, new = field_metrics(old_grid, fields), field_metrics(new_grid, fields)
+    report = {'old': old, 'new': new, 'difference': dict()}
+    for name in fields:
+        zones = {title: difference(old[name]['zones'][title], m)
+                 for title, m in new[name]['zones'].items() if title in old[name]['zones']}
+        report['difference'][name] = {'total': difference(old[name]['total'], new[name]['total']), 'zones': zones}
+    return report
+
+
+def print_conservation_report(report):
+    """Print the report made by `conservation_report`."""
+    for name, d in report['difference'].items():
+        old, new = report['old'][name]['total'], report['new'][name]['total']
+        print('{}: integral {} -> {} (difference {}, relative {})'.format(name, old['integral'], new['integral'],
+                                                                         d['total']['integral'],
+                                                                         d['total']['integral_relative']))
+        for norm in NORMS:
+            print('    {}: {} -> {} (relative {})'.format(norm, old[norm], new[norm], d['total'][norm + '_relative']))
+        print('    None: {} -> {}, NaN: {} -> {}'.format(old['none'], new['none'], old['nan'], new['nan']))
+        for title, z in d['zones'].items():
+            print('    zone {}: integral difference {}, relative {}'.format(title, z['integral'],
+                                                                           z['integral_relative']))
+
+
+def precision_report(reference, result, fields=None):
+    """
+    Compare the fields of the grid computed in reduced precision with the reference grid.
+
+    Parameters
+    ----------
+        reference : Grid or ArrayGrid
+            grid with the fields computed in double precision
+        result : Grid or ArrayGrid
+            same grid with the fields computed in the reduced precision, e.g. ArrayGrid of float32 fields
+        fields : list of strings
+            names of faces' fields, those of both grids if None
+
+    Returns
+    -------
+        dict
+            name of the field -> {'max_absolute', 'max_relative', 'L2_relative': area-weighted norm
+            of the difference relative to the norm of the reference, 'nan_mismatch': number of faces
+            with NaN in only one of the grids, 'epsilon': machine epsilon of the result's values}.
+    """
+    area = face_areas(array(reference.return_coordinates_as_a_ndim_array(), dtype=float64),
+                      reference.return_connectivity_as_a_ndim_array())
+    report = dict()
+    for name in common_field_names(reference, result) if fields is None else fields:
+        r, v = reference.return_field_as_a_ndim_array(name), result.return_field_as_a_ndim_array(name)
+        nan_mismatch, epsilon = int((isnan(r) != isnan(v)).sum()), float(finfo(v.dtype).eps)
+        r, v = r.astype(float64), v.astype(float64)
+        defined = ~isnan(r) & ~isnan(v)
+        d, r, s = fabs(v - r)[defined], r[defined], area[defined]
+        with errstate(divide='ignore', invalid='ignore'):
+            relative = where(r != 0, d / fabs(r), 0)
+            report[name] = {'max_absolute': d.max() if len(d) else 0.0,
+                            'max_relative': relative.max() if len(d) else 0.0,
+                            'L2_relative': sqrt((d ** 2 * s).sum() / (r ** 2 * s).sum()),
+                            'nan_mismatch': nan_mismatch,
+                            'epsilon': epsilon}
+    return report
+
+
+def print_precision_report(report):
+    """Print the report made by `precision_report`."""
+    for name, m in report.items():
+        print('{}: max absolute error {}, max relative error {}, L2 relative error {} (epsilon {}), '
+              'NaN mismatches {}'.format(name, m['max_absolute'], m['max_relative'], m['L2_relative'],
+                                         m['epsilon'], m['nan_mismatch']))
@@ -0,0 +1,127 @@
+"""Neighbourhoods of faces computed from the connectivity list at once."""
+from collections import deque
+from numpy import sort, unique, argsort, full, flatnonzero, int64, asarray, arange, array, zeros, concatenate, \
+    cumsum, bincount
+
+
+def face_adjacency(connectivity):
+    """
+    Faces sharing an edge with each face, as `Face.adjacent_faces`.
+
+    Sides of all faces are sorted, so that the sides of the same edge
+    are next to each other.
+
+    :param connectivity: (n_faces, 3) array of positions of faces' nodes.
+    :return: (n_faces, 3) array of positions of the faces adjacent by the sides (n1, n2), (n2, n3), (n3, n1),
+             -1 for the border sides.
+    """
+    sides = sort(connectivity[:, [0, 1, 1, 2, 2, 0]].reshape((-1, 2)), axis=1)
+    edges = unique(sides, axis=0, return_inverse=True)[1].ravel()
+    order = argsort(edges, kind='stable')
+    paired = flatnonzero(edges[order[1:]] == edges[order[:-1]])
+
+    adjacency = full(len(sides), -1, dtype=int64)
+    adjacency[order[paired]] = order[paired + 1] // 3
+    adjacency[order[paired + 1]] = order[paired] // 3
+    return adjacency.reshape((-1, 3))
+
+
+def compressed_rows(rows, columns, n_rows):
+    """
+    Compressed sparse rows of the pairs (row, column), as `csr_matrix.indptr` and `indices`.
+    Columns of each row keep their order in `columns`.
+    """
+    order = argsort(rows, kind='stable')
+    indptr = concatenate(([0], cumsum(bincount(rows, minlength=n_rows))))
+    return indptr, columns[order]
+
+
+class NeighbourhoodIndex:
+    __doc__ = "Face-face adjacency and node-face incidence as compressed rows, with cached rings of faces."
+
+    def __init__(self, connectivity, n_nodes=None):
+        """
+        Build the adjacency once, queries only take slices of it.
+        :param connectivity: (n_faces, 3) array of positions of faces' nodes.
+        :param n_nodes: number of nodes, the max position plus one if None.
+        """
+        connectivity = asarray(connectivity, dtype=int64).reshape((-1, 3))
+        self.n_faces = len(connectivity)
+        if n_nodes is None:
+            n_nodes = int(connectivity.max()) + 1 if self.n_faces else 0
+        self.n_nodes = n_nodes
+        self.adjacency = face_adjacency(connectivity)
+
+        faces = arange(self.n_faces, dtype=int64).repeat(3).reshape((-1, 3))
+        border = self.adjacency < 0
+        self.face_indptr, self.face_indices = compressed_rows(faces[~border], self.adjacency[~border], self.n_faces)
+        self.node_indptr, self.node_indices = compressed_rows(connectivity.ravel(), faces.ravel(), self.n_nodes)
+
+        # Reused by the searches, cleared after each of them.
+        self.visited = zeros(self.n_faces, dtype=bool)
+        self.nearest = dict()
+        self.rings = dict()
+
+    @classmethod
+    def from_grid(cls, grid):
+        return cls(grid.return_connectivity_as_a_ndim_array(), len(grid.Nodes))
+
+    def adjacent_faces(self, face):
+        """Positions of the faces sharing an edge with the face, as `Face.adjacent_faces`."""
+        return self.face_indices[self.face_indptr[face]: self.face_indptr[face + 1]]
+
+    def node_faces(self, node):
+        """Positions of the faces of the node, as `Node.faces`."""
+        return self.node_indices[self.node_indptr[node]: self.node_indptr[node + 1]]
+
+    def nearest_faces(self, node, n_faces=None):
+        """
+        At least `n_faces` faces around the node found by breadth-first search over the adjacency.
+
+        The search starts from the first `n_faces` faces of the node and adds all
+        the unvisited neighbours of a face at once, so it can find more faces.
+        The result is cached.
+
+        :param node: position of the node.
+        :param n_faces: number of faces, the number of faces of the node if None.
+        :return: array of positions of the faces.
+        """
+        start = self.node_faces(node)
+        n_faces = len(start) if n_faces is None else n_faces
+        key = (node, n_faces)
+        if key not in self.nearest:
+            found = list(start[:n_faces])
+            self.visited[found] = True
+            queue = deque(found)
+            while queue and len(found) < n_faces:
+                for f in self.adjacent_faces(queue.popleft()).tolist():
+                    if not self.visited[f]:
+                        self.visited[f] = True
+                        queue.append(f)
+                        found.append(f)
+            self.visited[found] = False
+            self.nearest[key] = array(found, dtype=int64)
+        return self.nearest[key]
+
+    def k_ring(self, node, k=1):
+        """
+        Faces within `k` steps over the adjacency from the faces of the node, cached.
+        :return: array of positions of the faces, the faces of the node first, then ring by ring.
+        """
+        key = (node, k)
+        if key not in self.rings:
+            found = self.node_faces(node).tolist()
+            self.visited[found] = True
+            ring = found
+            for _ in range(k):
+                next_ring = list()
+                for face in ring:
+                    for f in self.adjacent_faces(face).tolist():
+                        if not self.visited[f]:
+                            self.visited[f] = True
+                            next_ring.append(f)
+                found += next_ring
+                ring = next_ring
+            self.visited[found] = False
+            self.rings[key] = array(found, dtype=int64)
+        return self.rings[key]
@@ -0,0 +1,168 @@
+"""
+Interpolation methods as sparse linear operators.
+
+An operator W is a (n_target_faces, n_source_faces) matrix such that
+the values of the target are W @ values of the source. It is built once
+for a pair of grids and then applied to any field or any part of it.
+"""
+from numpy import arange, ones, einsum, column_stack, flatnonzero, concatenate, repeat, bincount
+from triangular_grid.grid import INTERPOLATED_FIELDS
+from algorithms.methods import build_face_index, build_node_index, build_triangulation
+from algorithms.quality import face_areas, corner_angles
+
+WEIGHTS = ('uniform', 'area', 'angle')
+
+
+def corner_weights(grid, weights='uniform'):
+    """
+    Weights of the faces' corners.
+    :param weights: 'uniform' (ones), 'area' (area of the face) or 'angle' (angle of the face at the node).
+    :return: tuple ((n_faces, 3) array of positions of the nodes, (n_faces, 3) array of weights).
+    """
+    assert weights in WEIGHTS, 'Unknown weights {}'.format(weights)
+    connectivity = grid.return_connectivity_as_a_ndim_array()
+    if weights == 'uniform':
+        return connectivity, ones(connectivity.shape)
+    coordinates = grid.return_coordinates_as_a_ndim_array()
+    if weights == 'area':
+        return connectivity, face_areas(coordinates, connectivity).repeat(3).reshape((-1, 3))
+    return connectivity, corner_angles(coordinates, connectivity)
+
+
+def normalized_rows(matrix):
+    """Divide the rows of the sparse matrix by their sums, empty rows stay empty."""
+    from scipy.sparse import csr_matrix, diags
+    sums = matrix.sum(axis=1).A.ravel()
+    sums[sums == 0] = 1
+    return csr_matrix(diags(1 / sums) @ matrix)
+
+
+def face_to_node_operator(grid, weights='uniform'):
+    """
+    (n_nodes, n_faces) operator averaging values of faces adjacent to each node.
+
+    With uniform weights same as the plain mean of `Grid.relocate_values_from_faces_to_nodes`,
+    area weights favour big faces, angle weights favour faces with a wide angle at the node.
+    """
+    from scipy.sparse import csr_matrix
+    connectivity, w = corner_weights(grid, weights)
+    faces = arange(len(grid.Faces)).repeat(3)
+    return normalized_rows(csr_matrix((w.ravel(), (connectivity.ravel(), faces)),
+                                      shape=(len(grid.Nodes), len(grid.Faces))))
+
+
+def node_to_face_operator(grid, weights='uniform'):
+    """
+    (n_faces, n_nodes) operator averaging values of the nodes of each face.
+
+    With uniform weights same as the plain mean of `Grid.relocate_values_from_nodes_to_faces`,
+    area weights favour nodes with a big area of the adjacent faces, angle weights
+    favour nodes with a wide angle of the face.
+    """
+    from scipy.sparse import csr_matrix
+    connectivity, w = corner_weights(grid, weights)
+    if weights == 'area':
+        # Area of the node: a third of the areas of its faces.
+        w = bincount(connectivity.ravel(), w.ravel() / 3, minlength=len(grid.Nodes))[connectivity]
+    faces = arange(len(grid.Faces)).repeat(3)
+    return normalized_rows(csr_matrix((w.ravel(), (faces, connectivity.ravel())),
+                                      shape=(len(grid.Faces), len(grid.Nodes))))
+
+
+class FaceNodeRelocation:
+    __doc__ = "Transfer of values between the faces and the nodes of the grid by the incidence operators."
+
+    def __init__(self, grid, weights='uniform'):
+        """
+        :param grid: grid.
+        :param weights: 'uniform', 'area' or 'angle'.
+        """
+        self.grid = grid
+        self.weights = weights
+        self._to_nodes = None
+        self._to_faces = None
+
+    @property
+    def to_nodes_operator(self):
+        """(n_nodes, n_faces) operator, built on first use."""
+        if self._to_nodes is None:
+            self._to_nodes = face_to_node_operator(self.grid, self.weights)
+        return self._to_nodes
+
+    @property
+    def to_faces_operator(self):
+        """(n_faces, n_nodes) operator, built on first use."""
+        if self._to_faces is None:
+            self._to_faces = node_to_face_operator(self.grid, self.weights)
+        return self._to_faces
+
+    def to_nodes(self, fields=INTERPOLATED_FIELDS):
+        """Set the nodes' fields to the averages of the faces' ones, all fields by one product."""
+        values = column_stack([self.grid.return_field_as_a_ndim_array(name) for name in fields])
+        for name, column in zip(fields, (self.to_nodes_operator @ values).T):
+            self.grid.set_node_field_from_a_ndim_array(name, column)
+
+    def to_faces(self, fields=INTERPOLATED_FIELDS):
+        """Set the faces' fields to the averages of the nodes' ones, all fields by one product."""
+        values = column_stack([self.grid.return_node_field_as_a_ndim_array(name) for name in fields])
+        for name, column in zip(fields, (self.to_faces_operator @ values).T):
+            self.grid.set_field_from_a_ndim_array(name, column)
+
+
+def face_centered_operator(old_grid, new_grid, index=None):
+    """Operator of `face_centered_interpolation`: each target face takes the value of the nearest source face."""
+    from scipy.sparse import csr_matrix
+    if index is None:
+        index = build_face_index(old_grid)
+    new_grid.compute_aux_nodes()
+
+    ids = index.query(new_grid.return_aux_nodes_as_a_ndim_array())[1]
+    return csr_matrix((ones(len(ids)), (arange(len(ids)), ids)),
+                      shape=(len(new_grid.Faces), len(old_grid.Faces)))
+
+
+def relocation_operator(old_grid, new_grid, index=None, weights='uniform'):
+    """Operator of `interpolate_with_relocation`: faces to nodes, nearest node, nodes to faces."""
+    from scipy.sparse import csr_matrix
+    if index is None:
+        index = build_node_index(old_grid)
+
+    ids = index.query(new_grid.return_coordinates_as_a_ndim_array())[1]
+    nearest = csr_matrix((ones(len(ids)), (arange(len(ids)), ids)),
+                         shape=(len(new_grid.Nodes), len(old_grid.Nodes)))
+    return node_to_face_operator(new_grid, weights) @ nearest @ face_to_node_operator(old_grid, weights)
+
+
+def linear_operator(old_grid, new_grid, index=None, fallback=True):
+    """
+    Operator of `linear_interpolation`: barycentric weights of the old centroids
+    at the vertices of the simplex containing each new centroid.
+
+    Rows of the targets outside the triangulation are empty, or select the nearest
+    old face if `fallback` is set.
+    """
+    from scipy.sparse import csr_matrix
+    if index is None:
+        index = build_triangulation(old_grid)
+    new_grid.compute_aux_nodes()
+    points = new_grid.return_aux_nodes_as_a_ndim_array()
+
+    simplices = index.find_simplex(points)
+    inside = flatnonzero(simplices >= 0)
+    transform = index.transform[simplices[inside]]
+    ndim = points.shape[1]
+    b = einsum('ijk,ik->ij', transform[:, :ndim], points[inside] - transform[:, ndim])
+    weights = column_stack((b, 1 - b.sum(axis=1)))
+
+    rows = repeat(inside, ndim + 1)
+    columns = index.simplices[simplices[inside]].ravel()
+    data = weights.ravel()
+
+    outside = flatnonzero(simplices < 0)
+    if fallback and len(outside) > 0:
+        from scipy.spatial import KDTree
+        ids = KDTree(index.points).query(points[outside])[1]
+        rows, columns, data = concatenate((rows, outside)), concatenate((columns, ids)), \
+            concatenate((data, ones(len(outside))))
+
+    return csr_matrix((data, (rows, columns)), shape=(len(new_grid.Faces), len(old_grid.Faces)))
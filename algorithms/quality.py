@@ -0,0 +1,124 @@
+"""
+Quality measures of all faces of the grid computed at once.
+
+References
+==========
+Daniel S.H.Lo Finite element mesh generation 2015 p.334 (alpha quality measure).
+"""
+from numpy import sqrt, cross, einsum, arctan2, degrees, log, exp, histogram, argsort, minimum, maximum, \
+    errstate, isfinite, inf, where, stack
+
+# Ranges of the histograms of the measures.
+HISTOGRAM_RANGES = {'alpha': (0, 1),
+                    'aspect_ratio': None,
+                    'min_angle': (0, 60),
+                    'max_angle': (60, 180),
+                    'area': None}
+
+
+def face_areas(coordinates, connectivity):
+    """Areas of the faces, (n_faces,) array."""
+    p = coordinates[connectivity]
+    c = cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+    return sqrt(einsum('ij,ij->i', c, c)) / 2
+
+
+def corner_angles(coordinates, connectivity):
+    """Angles of the faces at their nodes in radians, (n_faces, 3) array."""
+    p = coordinates[connectivity]
+    # Angle at a node between the outgoing side and the reversed incoming one.
+    angles = list()
+    for i in range(3):
+        outgoing, incoming = p[:, (i + 1) % 3] - p[:, i], p[:, i] - p[:, i - 1]
+        c = cross(outgoing, -incoming)
+        angles.append(arctan2(sqrt(einsum('ij,ij->i', c, c)), einsum('ij,ij->i', outgoing, -incoming)))
+    return stack(angles, axis=1)
+
+
+def face_quality(coordinates, connectivity):
+    """
+    Compute quality measures of the faces.
+
+    Parameters
+    ----------
+        coordinates : (n_nodes, 3) array
+            coordinates of nodes
+        connectivity : (n_faces, 3) array
+            positions of faces' nodes
+
+    Returns
+    -------
+        dict of (n_faces,) arrays
+            area, alpha (1 for the equilateral triangle, 0 for the degenerate one),
+            aspect_ratio (the longest side over the diameter of the inscribed circle times sqrt(3),
+            1 for the equilateral triangle), min_angle and max_angle in degrees.
+    """
+    p = coordinates[connectivity]
+    # Sides opposite to the nodes 2, 0 and 1.
+    sides = (p[:, 1] - p[:, 0], p[:, 2] - p[:, 1], p[:, 0] - p[:, 2])
+    lengths_2 = [einsum('ij,ij->i', s, s) for s in sides]
+    lengths = [sqrt(l) for l in lengths_2]
+
+    area = face_areas(coordinates, connectivity)
+    angles = degrees(corner_angles(coordinates, connectivity)).T
+
+    with errstate(divide='ignore', invalid='ignore'):
+        alpha = 4 * sqrt(3) * area / (lengths_2[0] + lengths_2[1] + lengths_2[2])
+        inscribed_radius = 2 * area / (lengths[0] + lengths[1] + lengths[2])
+        aspect_ratio = maximum(maximum(lengths[0], lengths[1]), lengths[2]) / (2 * sqrt(3) * inscribed_radius)
+
+    return {'area': area,
+            'alpha': where(isfinite(alpha), alpha, 0),
+            'aspect_ratio': where(isfinite(aspect_ratio), aspect_ratio, inf),
+            'min_angle': minimum(minimum(angles[0], angles[1]), angles[2]),
+            'max_angle': maximum(maximum(angles[0], angles[1]), angles[2])}
+
+
+def quality_report(grid, bins=10, worst=10):
+    """
+    Summarize quality of the grid's faces.
+
+    Can be called before and after smoothing to compare the grids.
+
+    Parameters
+    ----------
+        grid : Grid object
+            grid
+        bins : int
+            number of bins of the histograms
+        worst : int
+            number of the worst faces to report
+
+    Returns
+    -------
+        dict
+            for each measure: min, max, mean and histogram (counts, bin edges);
+            geometric mean of alpha computed as the exponent of the mean of logarithms;
+            positions of `worst` faces with the smallest alpha; number of degenerate faces.
+    """
+    quality = face_quality(grid.return_coordinates_as_a_ndim_array(), grid.return_connectivity_as_a_ndim_array())
+    alpha = quality['alpha']
+    degenerate = alpha <= 0
+
+    report = dict()
+    for name, values in quality.items():
+        finite = values[isfinite(values)]
+        report[name] = {'min': values.min(),
+                        'max': values.max(),
+                        'mean': finite.mean() if len(finite) > 0 else inf,
+                        'histogram': histogram(finite, bins=bins, range=HISTOGRAM_RANGES[name])}
+
+    # The product of all values underflows on big grids, the sum of logarithms does not.
+    report['alpha']['geometric_mean'] = 0.0 if degenerate.any() else exp(log(alpha).mean())
+    report['worst_faces'] = argsort(alpha, kind='stable')[:worst]
+    report['degenerate_faces'] = int(degenerate.sum())
+    return report
+
+
+def print_quality_report(report):
+    """Print the report made by `quality_report`."""
+    print('mean alpha: {}\nmin alpha: {}'.format(report['alpha']['geometric_mean'], report['alpha']['min']))
+    for name in ('aspect_ratio', 'min_angle', 'max_angle', 'area'):
+        print('{}: min {} max {} mean {}'.format(name, report[name]['min'], report[name]['max'], report[name]['mean']))
+    print('degenerate faces: {}'.format(report['degenerate_faces']))
+    print('worst faces: {}'.format(' '.join(str(i) for i in report['worst_faces'])))
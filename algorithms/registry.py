@@ -0,0 +1,63 @@
+"""Registry of interpolation methods.
+
+Methods are referenced by the module and the name of the function and are
+imported on first use, so that listing them (e.g. for the CLI) costs nothing.
+"""
+from importlib import import_module
+
+
+class LazyRegistry:
+    __doc__ = "Mapping of names to functions imported on first access."
+
+    def __init__(self, entries):
+        """
+        :param entries: dict name -> (module, function name).
+        """
+        self.entries = entries
+        self.loaded = dict()
+
+    def keys(self):
+        return self.entries.keys()
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, name):
+        if name not in self.loaded:
+            module, function = self.entries[name]
+            self.loaded[name] = getattr(import_module(module), function)
+        return self.loaded[name]
+
+
+methods = LazyRegistry({'cell_centered': ('algorithms.methods', 'face_centered_interpolation'),
+                        'with_relocation': ('algorithms.methods', 'interpolate_with_relocation'),
+                        'linear': ('algorithms.methods', 'linear_interpolation'),
+                        'least_squares': ('algorithms.methods', 'least_squares_interpolation'),
+                        'zone_constrained': ('algorithms.constrained', 'zone_constrained_interpolation'),
+                        'component_constrained': ('algorithms.constrained', 'component_constrained_interpolation')})
+
+# Methods of `ArrayGrid`: the ones working on the arrays of the grids only.
+array_methods = LazyRegistry({'cell_centered': ('algorithms.methods', 'array_face_centered_interpolation'),
+                              'linear': ('algorithms.methods', 'linear_interpolation'),
+                              'least_squares': ('algorithms.methods', 'least_squares_interpolation')})
+
+# Builders of the source grid's spatial index for each method.
+# The index depends only on the source grid, so it can be built once
+# and reused for any number of targets.
+indexes = LazyRegistry({'cell_centered': ('algorithms.methods', 'build_face_index'),
+                        'with_relocation': ('algorithms.methods', 'build_node_index'),
+                        'linear': ('algorithms.methods', 'build_triangulation'),
+                        'least_squares': ('algorithms.methods', 'build_face_index'),
+                        'zone_constrained': ('algorithms.constrained', 'build_zone_index'),
+                        'component_constrained': ('algorithms.constrained', 'build_component_index')})
+
+# Builders of the sparse (target faces, source faces) operator of each method.
+operators = LazyRegistry({'cell_centered': ('algorithms.operators', 'face_centered_operator'),
+                          'with_relocation': ('algorithms.operators', 'relocation_operator'),
+                          'linear': ('algorithms.operators', 'linear_operator')})
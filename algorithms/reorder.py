@@ -0,0 +1,164 @@
+"""
+Reordering of nodes and faces along a space-filling curve.
+
+Readers keep nodes and faces in the order of the file, which is often
+random in space. Sorting them along the Morton (Z-order) or the Hilbert
+curve puts close elements next to each other in `Grid.Nodes`,
+`Grid.Faces` and the arrays made from them, which improves the locality
+of index queries and of sparse operators.
+
+The permutations are kept on the zones, so that `write_tecplot` writes
+the elements in the original order.
+"""
+from numpy import arange, array, argsort, empty, floor, uint64, int64
+
+# Bits per coordinate: 3 coordinates of 21 bits fit into 64-bit codes.
+BITS = 21
+CURVES = ('morton', 'hilbert')
+
+
+def quantize(points, lo, hi, bits=BITS):
+    """Integer coordinates of the points in the cube [lo, lo + max(hi - lo)] divided into 2 ** bits cells per side."""
+    extent = (hi - lo).max()
+    if extent == 0:
+        extent = 1
+    q = floor((points - lo) / extent * (2 ** bits - 1))
+    return q.clip(0, 2 ** bits - 1).astype(uint64)
+
+
+def spread_bits(v):
+    """Insert two zero bits after each of the lower 21 bits: abc -> a00b00c."""
+    v = v & uint64(0x1fffff)
+    v = (v | v << uint64(32)) & uint64(0x1f00000000ffff)
+    v = (v | v << uint64(16)) & uint64(0x1f0000ff0000ff)
+    v = (v | v << uint64(8)) & uint64(0x100f00f00f00f00f)
+    v = (v | v << uint64(4)) & uint64(0x10c30c30c30c30c3)
+    v = (v | v << uint64(2)) & uint64(0x1249249249249249)
+    return v
+
+
+def interleave(x, y, z):
+    """Interleave bits of the coordinates, x gets the highest bit."""
+    return spread_bits(x) << uint64(2) | spread_bits(y) << uint64(1) | spread_bits(z)
+
+
+def morton_codes(q):
+    """Positions of the points on the Morton curve, q is (n, 3) array of integer coordinates."""
+    return interleave(q[:, 0], q[:, 1], q[:, 2])
+
+
+def hilbert_codes(q, bits=BITS):
+    """
+    Positions of the points on the Hilbert curve, q is (n, 3) array of integer coordinates.
+
+    J. Skilling, Programming the Hilbert curve, AIP Conf. Proc. 707, 381 (2004):
+    the coordinates are transformed into the transposed Hilbert index, which
+    is then interleaved as a Morton code. All points are transformed at once.
+    """
+    x = [q[:, i].copy() for i in range(3)]
+    m = uint64(1) << uint64(bits - 1)
+
+    # Inverse undo.
+    bit = m
+    while bit > 1:
+        mask = bit - uint64(1)
+        for i in range(3):
+            set_ = (x[i] & bit) != 0
+            t = (x[0] ^ x[i]) & mask
+            x[0] = x[0] ^ (set_ * mask) ^ (~set_ * t)
+            x[i] = x[i] ^ (~set_ * t)
+        bit >>= uint64(1)
+
+    # Gray encode.
+    for i in range(1, 3):
+        x[i] = x[i] ^ x[i - 1]
+    t = x[0] * uint64(0)
+    bit = m
+    while bit > 1:
+        t = t ^ (((x[2] & bit) != 0) * (bit - uint64(1)))
+        bit >>= uint64(1)
+    return interleave(x[0] ^ t, x[1] ^ t, x[2] ^ t)
+
+
+def curve_codes(points, lo, hi, curve='hilbert'):
+    """Positions of the points on the curve within the box (lo, hi)."""
+    assert curve in CURVES, 'Unknown curve {}'.format(curve)
+    q = quantize(points, lo, hi)
+    return morton_codes(q) if curve == 'morton' else hilbert_codes(q)
+
+
+def inverse_permutation(order):
+    """Position of each element in the permuted sequence."""
+    position = empty(len(order), dtype=int64)
+    position[order] = arange(len(order))
+    return position
+
+
+def reorder_zone(zone, lo, hi, curve):
+    """
+    Sort nodes and faces of the zone along the curve.
+
+    Compose the zone's `node_permutation` and `face_permutation`
+    (original positions of the elements) with the new order.
+
+    :return: tuple (node order, face order, (n_faces, 3) array of positions of faces' nodes in the new order).
+    """
+    positions = {n: i for i, n in enumerate(zone.Nodes)}
+    connectivity = array([positions[n] for f in zone.Faces for n in f.nodes], dtype=int64).reshape((-1, 3))
+    coordinates = array([(n.x, n.y, n.z) for n in zone.Nodes], dtype=float).reshape((-1, 3))
+
+    node_order = argsort(curve_codes(coordinates, lo, hi, curve), kind='stable')
+    face_order = argsort(curve_codes(coordinates[connectivity].mean(axis=1), lo, hi, curve), kind='stable')
+
+    zone.Nodes = [zone.Nodes[i] for i in node_order]
+    zone.Faces = [zone.Faces[i] for i in face_order]
+    zone.node_permutation = getattr(zone, 'node_permutation', arange(len(node_order)))[node_order]
+    zone.face_permutation = getattr(zone, 'face_permutation', arange(len(face_order)))[face_order]
+    return node_order, face_order, inverse_permutation(node_order)[connectivity[face_order]]
+
+
+def reorder_grid(grid, curve='hilbert'):
+    """
+    Sort nodes and faces of the grid along the space-filling curve.
+
+    Zones are sorted one by one, `Grid.Faces` stays the concatenation
+    of the zones' faces. Connectivity (`nodes_ids`) and `Id`s of the
+    elements are renumbered; values of grids of compact elements are
+    permuted in their stores.
+
+    Parameters
+    ----------
+        grid : Grid object
+            grid
+        curve : string
+            'morton' or 'hilbert'
+    """
+    coordinates = grid.return_coordinates_as_a_ndim_array()
+    lo, hi = coordinates.min(axis=0), coordinates.max(axis=0)
+    grid.Nodes = [grid.Nodes[i] for i in argsort(curve_codes(coordinates, lo, hi, curve), kind='stable')]
+
+    compact = grid.face_store is not None
+    faces = list()
+    # In reverse, so that a node shared by zones gets the Id of the first one, as when read.
+    for z in reversed(grid.Zones):
+        node_order, face_order, connectivity = reorder_zone(z, lo, hi, curve)
+        faces = z.Faces + faces
+        if compact:
+            continue
+        for i, n in enumerate(z.Nodes):
+            n.Id = i + 1
+        for i, (f, ids) in enumerate(zip(z.Faces, (connectivity + 1).tolist())):
+            f.Id = i
+            f.nodes_ids = ids
+    grid.Faces = faces
+
+    if compact:
+        # Single zone of all the elements: positions in the stores are the Ids.
+        for store, order in ((grid.node_store, node_order), (grid.face_store, face_order)):
+            for name in store.arrays:
+                store.arrays[name] = store.arrays[name][order]
+        grid.Nodes = grid.Zones[0].Nodes
+        for i, n in enumerate(grid.Nodes):
+            n.Id = i
+        for i, f in enumerate(grid.Faces):
+            f.Id = i
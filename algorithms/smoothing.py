@@ -1,11 +1,9 @@
 from geom.basics import *
-from scipy.linalg import eig, det
-from numpy import argmax, array, vstack, diag, dot, abs, cumprod, sum, zeros, full, isnan, arccos, argmin, exp
+from numpy import array, vstack, diag, dot, abs, cumprod, sum, zeros, isnan, arccos, argmin, exp, \
+    flatnonzero
 from geom.vector import Vector
-from tecplot import writer
 from triangular_grid.grid import Grid
 from copy import deepcopy
-from collections import deque
 
 DETERMINANT_ACCURACY = 10e-5
 EPSILON = 10e-5
@@ -20,9 +18,39 @@ class Smoothing:
         assert node_fixation_method in [None, 'no_move', 'along_edge']
         self.node_fixation_method = node_fixation_method
         self.fix_corner_nodes = fix_corner_nodes
+        self._neighbourhood = None
+        self._boundary = None
+        self._node_positions = None
         if self.node_fixation_method is not None:
             self.mark_all_fixed_nodes()
 
+    @property
+    def neighbourhood(self):
+        """`NeighbourhoodIndex` of the grid, built on first use: smoothing moves nodes but keeps the topology."""
+        if self._neighbourhood is None:
+            from algorithms.neighbourhood import NeighbourhoodIndex
+            self._neighbourhood = NeighbourhoodIndex.from_grid(self.grid)
+        return self._neighbourhood
+
+    @property
+    def boundary(self):
+        """`BoundaryAnalysis` of the grid, built on first use."""
+        if self._boundary is None:
+            from algorithms.boundary import BoundaryAnalysis
+            self._boundary = BoundaryAnalysis.from_grid(self.grid)
+        return self._boundary
+
+    def update_boundary(self):
+        """Recompute the corners and the directions along the border after the nodes moved."""
+        if self._boundary is not None:
+            self._boundary.update(self.grid.return_coordinates_as_a_ndim_array())
+
+    def node_position(self, node):
+        """Position of the node in `Grid.Nodes`, as used by the neighbourhood index."""
+        if self._node_positions is None:
+            self._node_positions = {n: i for i, n in enumerate(self.grid.Nodes)}
+        return self._node_positions[node]
+
     @staticmethod
     def name_of_iteration(i):
         iteration_name = str(i)
@@ -32,66 +60,19 @@ class Smoothing:
     def smoothing(self):
         raise NotImplementedError
 
-    @staticmethod
-    def is_node_fixed(n):
-        border_edges = [e for e in n.edges if e.border]
-        assert len(border_edges) == 2, print('Wrong number of border edges', len(border_edges))
-
-        alpha = 0.01
-        be1_v = border_edges[0]
-        be2_v = border_edges[1]
-        # make vectors directed in different sides.
-        # represent as (n1) --be1_v-- (n2) --be2_v-- (n3)
-        n1 = None
-        n2 = n
-        n3 = None
-        assert len(be1_v.nodes) == 2
-        assert len(be2_v.nodes) == 2
-        if be1_v.nodes[0] == n:
-            n1 = be1_v.nodes[1]
-        else:
-            n1 = be1_v.nodes[0]
-            assert be1_v.nodes[1] == n
-
-        if be2_v.nodes[0] == n:
-            n3 = be2_v.nodes[1]
-        else:
-            n3 = be2_v.nodes[0]
-            assert be2_v.nodes[1] == n
-
-        assert n1 is not n2
-        assert n2 is not n3
-        assert n3 is not n1
-
-        n1_v = Vector(n1.x, n1.y, n1.z)
-        n2_v = Vector(n2.x, n2.y, n2.z)
-        n3_v = Vector(n3.x, n3.y, n3.z)
-        be1 = Vector.subtract_vectors(n1_v, n2_v)
-        be2 = Vector.subtract_vectors(n3_v, n2_v)
-        be1.make_unit()
-        be2.make_unit()
-        dot_between_unit_edges = dot_product(be1, be2)
-        assert -1 <= dot_between_unit_edges <= 1
-        if dot_between_unit_edges > (-1 + alpha):
-            return True, border_edges
-
-        return False, border_edges
+    def is_node_fixed(self, n):
+        """Whether the border node is a corner: the angle between its border edges is not close to pi."""
+        return bool(self.boundary.corner[self.node_position(n)])
 
     def border_edge_to_project_on(self, n, shift_vector):
-        is_fixed, border_edges = self.is_node_fixed(n)
-
-        if self.fix_corner_nodes and is_fixed:
+        i = self.node_position(n)
+        if self.fix_corner_nodes and self.boundary.corner[i]:
             return Vector(0, 0, 0)
-
-        dot_products_between_edges_and_shift = [dot_product(edge_to_vector(e), shift_vector) for e in border_edges]
-        edge_to_project_on_number = argmax(dot_products_between_edges_and_shift)
-        assert edge_to_project_on_number == 0 or edge_to_project_on_number == 1
-        edge_to_project_on = edge_to_vector(border_edges[edge_to_project_on_number])
-        edge_to_project_on.make_unit()
-        assert isinstance(edge_to_project_on, Vector)
-        return edge_to_project_on
+        return Vector(*self.boundary.direction(i, shift_vector.coords_np_array()).tolist())
 
     def move_node(self, node, shift: Vector):
+        # Weights of the relocation between faces and nodes may depend on the coordinates.
+        self.grid.invalidate_relocations()
         if self.node_fixation_method == 'no_move':
             if node.fixed:
                 pass
@@ -109,18 +90,20 @@ class Smoothing:
             node.move(shift)
 
     def write_grid_and_print_info(self, iteration):
+        from tecplot.io import write_tecplot
         print('{}th iteration of {} smoothing'.format(iteration, self.__name__))
-        writer.write_tecplot(self.grid, '{}_smoothing_{}.dat'.format(self.__name__,
-                                                                         self.name_of_iteration(iteration)))
+        write_tecplot(self.grid, '{}_smoothing_{}.dat'.format(self.__name__,
+                                                              self.name_of_iteration(iteration)))
 
     def mark_all_fixed_nodes(self):
         for e in self.grid.Edges:
             if len(e.faces) == 1:
                 e.border = True
-                for n in e.nodes:
-                    if not n.fixed:
-                        n.fixed = True
-                        self.grid.number_of_border_nodes += 1
+        for i in flatnonzero(self.boundary.border_nodes).tolist():
+            n = self.grid.Nodes[i]
+            if not n.fixed:
+                n.fixed = True
+                self.grid.number_of_border_nodes += 1
 
     def apply_laplacians(self, laplacians):
         assert len(self.grid.Nodes) == len(laplacians)
@@ -137,6 +120,7 @@ class LaplacianSmoothing(Smoothing):
 
     def smoothing(self):
         for i in range(self.num_iterations):
+            self.update_boundary()
             for n in self.grid.Nodes:
                 neighbours = []
                 assert len(n.edges) > 1
@@ -171,6 +155,7 @@ class TaubinSmoothing(Smoothing):
 
     def smoothing(self):
         for i in range(self.num_iterations):
+            self.update_boundary()
             for n in self.grid.Nodes:
                 neighbours = []
                 assert len(n.edges) > 1
@@ -238,43 +223,17 @@ class NullSpaceSmoothing(Smoothing):
         return N
 
     def find_n_neighbours_faces_of_node(self, node, n_neighbours=None):
-        if n_neighbours is None:
-            n_neighbours = len(node.faces)
-
-        visited = full(len(self.grid.Faces), False)
-        # find n_neighbours with breadth-first search
-        neighbours = []
-        q = deque()
         assert len(node.faces) > 0
-
-        for neighbour in node.faces[:n_neighbours]:
-            neighbours.append(neighbour)
-            q.append(neighbour)
-            assert isinstance(neighbour.Id, int)
-            visited[neighbour.Id] = True
-
-        while len(q) > 0 and len(neighbours) < n_neighbours:
-            search_around_face = q.popleft()
-            visited[search_around_face.Id] = True
-            for adjacent_face in search_around_face.adjacent_faces():
-                if not visited[adjacent_face.Id]:
-                    q.append(adjacent_face)
-                    neighbours.append(adjacent_face)
-
-        # assert len(neighbours) == n_neighbours, 'unable to find n neighbours for local interpolation for border nodes'
-
-        return neighbours
+        # find n_neighbours with breadth-first search, cached by the neighbourhood index
+        positions = self.neighbourhood.nearest_faces(self.node_position(node), n_neighbours)
+        return [self.grid.Faces[i] for i in positions]
 
     def set_weight_for_face(self, node, face, centroid):
         if not node.fixed:
             return 1.0
-        is_fixed, border_edges = Smoothing.is_node_fixed(node)
-        assert len(border_edges) == 2
-        if not is_fixed:
+        if not self.is_node_fixed(node):
             # any of border edges
-            edge_to_compare_with = border_edges[0]
-            edge_to_compare_with = edge_to_vector(edge_to_compare_with)
-            edge_to_compare_with.make_unit()
+            edge_to_compare_with = Vector(*self.boundary.directions[self.node_position(node), 0].tolist())
             centroid_ = deepcopy(centroid)
             centroid_.make_unit()
             assert edge_to_compare_with.norm() - 1.0 < 10e-6
@@ -335,8 +294,10 @@ class NullSpaceSmoothing(Smoothing):
         return laplacian
 
     def smoothing(self):
+        from scipy.linalg import eig, det
         Smoothing.write_grid_and_print_info(self, 0)
         for i in range(1, self.num_iterations):
+            self.update_boundary()
             laplacians = []
             fazzians = []
             for n in self.grid.Nodes:
@@ -513,6 +474,7 @@ class FuzzyVectorMedian(Smoothing):
     def smoothing(self):
         """Performs smoothing using FVM."""
         for it in range(self.num_iterations):
+            self.update_boundary()
 
             for f in self.grid.Faces:
                 f.fuzzy_median = f.normal()
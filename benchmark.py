@@ -0,0 +1,153 @@
+"""
+Benchmark of the interpolation.
+
+Measures the start-up (import) time of the CLI with `python -X importtime`
+and checks it against the budget, then times the stages of the interpolation
+for each method. Exits with code 1 when a budget is exceeded.
+"""
+import argparse
+import subprocess
+import sys
+from os.path import dirname, join
+from tempfile import gettempdir
+from time import time
+
+ROOT = dirname(__file__)
+
+# Budget of the imports done by `interpolate.py` before any work starts, seconds.
+IMPORT_TIME_BUDGET = 0.25
+# Modules which should be imported only when an interpolation is actually made.
+LAZY_MODULES = ('scipy', 'matplotlib', 'h5py')
+
+
+def import_time(argv):
+    """
+    Run python with -X importtime and parse its report.
+
+    Parameters
+    ----------
+        argv : list of strings
+            arguments of the python interpreter
+
+    Returns
+    -------
+        tuple : (total time in seconds, list of (cumulative time in seconds, module))
+    """
+    completed = subprocess.run([sys.executable, '-X', 'importtime'] + argv, cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    total = 0
+    modules = list()
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or line.find('[us]') != -1:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        total += int(self_us)
+        modules.append((int(cumulative_us) / 10 ** 6, module.strip()))
+    return total / 10 ** 6, modules
+
+
+def benchmark_imports():
+    """Check the import time of the CLI. Returns True if it fits the budget."""
+    total, modules = import_time([join(ROOT, 'interpolate.py'), '--help'])
+    print('CLI import time: {:.3f} s (budget {:.3f} s)'.format(total, IMPORT_TIME_BUDGET))
+    for cumulative, module in sorted(modules, reverse=True)[:5]:
+        print('    {:.3f} s {}'.format(cumulative, module))
+
+    eager = [m for _, m in modules if m.split('.')[0] in LAZY_MODULES]
+    if eager:
+        print('Imported at start-up:', ', '.join(eager))
+
+    return total <= IMPORT_TIME_BUDGET and not eager
+
+
+def benchmark_methods(source, target, repeat):
+    """Time reading, index build, query and writing for each method."""
+    from triangular_grid.grid import Grid
+    from tecplot.io import read_tecplot, write_tecplot
+    from algorithms.registry import methods, indexes
+
+    for name in methods.keys():
+        times = {'read': 0, 'index': 0, 'interpolate': 0, 'write': 0}
+        for _ in range(repeat):
+            start = time()
+            old_grid, new_grid = Grid(), Grid()
+            read_tecplot(old_grid, source)
+            read_tecplot(new_grid, target)
+            times['read'] += time() - start
+
+            start = time()
+            index = indexes[name](old_grid) if name in indexes else None
+            times['index'] += time() - start
+
+            start = time()
+            methods[name](old_grid, new_grid, index=index)
+            times['interpolate'] += time() - start
+
+            start = time()
+            write_tecplot(new_grid, join(gettempdir(), 'bench_output.dat'))
+            times['write'] += time() - start
+
+        print('{}: '.format(name) + ', '.join('{} {:.4f} s'.format(k, v / repeat) for k, v in times.items()))
+
+
+# Methods of `algorithms.registry.array_methods` timed on generated surfaces. The linear one is left out:
+# the 3D triangulation of centroids of a surface is degenerate (plane) or very slow (cylinder).
+ARRAY_METHODS = ('cell_centered', 'least_squares')
+
+
+def benchmark_synthetic(n_faces, repeat, generator='plane'):
+    """
+    Time the index build and the interpolation between generated surfaces of about `n_faces` faces,
+    the target 1.3 times finer, and measure the error against the analytic fields.
+    Returns dict name of the method -> {field: max error}.
+    """
+    from numpy import fabs
+    from geom.structured import GENERATORS, analytic_fields
+    from algorithms.registry import array_methods, indexes
+
+    n = max(int((n_faces / 2) ** 0.5) + 1, 3)
+    start = time()
+    old_grid = GENERATORS[generator](n, n)
+    new_grid = GENERATORS[generator](int(1.3 * n), int(1.3 * n))
+    print('{}: {} -> {} faces generated in {:.4f} s'.format(generator, old_grid.n_faces, new_grid.n_faces,
+                                                           time() - start))
+    expected = analytic_fields(new_grid.return_aux_nodes_as_a_ndim_array())
+
+    max_errors = dict()
+    for name in ARRAY_METHODS:
+        times = {'index': 0, 'interpolate': 0}
+        for _ in range(repeat):
+            start = time()
+            index = indexes[name](old_grid)
+            times['index'] += time() - start
+
+            start = time()
+            array_methods[name](old_grid, new_grid, index=index)
+            times['interpolate'] += time() - start
+
+        errors = {field: fabs(new_grid.return_field_as_a_ndim_array(field) - values).max()
+                  for field, values in expected.items()}
+        print('{}: '.format(name) + ', '.join('{} {:.4f} s'.format(k, v / repeat) for k, v in times.items()) +
+              ', max error ' + ', '.join('{} {:.3e}'.format(k, v) for k, v in errors.items()))
+        max_errors[name] = errors
+    return max_errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--source', help='grid to interpolate from', default=join(ROOT, 'test', 'source.dat'))
+    parser.add_argument('--target', help='grid to interpolate to', default=join(ROOT, 'test', 'target.dat'))
+    parser.add_argument('-r', '--repeat', help='number of repetitions', type=int, default=3)
+    parser.add_argument('--synthetic', help='also interpolate between generated surfaces of about SYNTHETIC faces',
+                        type=int, default=0)
+    parser.add_argument('--surface', help='generated surface', default='plane',
+                        choices=('plane', 'disc', 'cylinder', 'half_cylinder'))
+    args = parser.parse_args()
+
+    imports_ok = benchmark_imports()
+    benchmark_methods(args.source, args.target, args.repeat)
+    if args.synthetic:
+        benchmark_synthetic(args.synthetic, args.repeat, args.surface)
+
+    if not imports_ok:
+        exit(1)
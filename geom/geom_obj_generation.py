@@ -1,8 +1,5 @@
 """This module implements basic geometrical routines."""
 
-from tecplot import writer
-from matplotlib.tri import Triangulation
-import matplotlib.pyplot as plt
 from numpy import linspace, meshgrid, sin, cos, pi, logspace, zeros, arccos, arcsin, sqrt, isnan
 from triangular_grid.edge import Edge
 from triangular_grid.grid import Grid
@@ -82,6 +79,7 @@ def create_half_cylinder(m=3, n=5, filename='half_cylinder', create_dat=True, pl
 
     u, zs = meshgrid(u, v)
 
+    from matplotlib.tri import Triangulation
     delaunuy = Triangulation(u.flatten(), zs.flatten())
     xs = sin(u)
     ys = cos(u)
@@ -96,6 +94,7 @@ def create_half_cylinder(m=3, n=5, filename='half_cylinder', create_dat=True, pl
     mgrid.init_adjacent_faces_list_for_border_nodes()
 
     if plot_pyplot:
+        import matplotlib.pyplot as plt
         fig = plt.figure()
         ax = fig.gca(projection='3d')
         ax.plot_trisurf(x, y, z, triangles=delaunuy.triangles)
@@ -104,7 +103,8 @@ def create_half_cylinder(m=3, n=5, filename='half_cylinder', create_dat=True, pl
     if create_dat:
         if not filename.endswith('.dat'):
             filename += '.dat'
-        writer.write_tecplot(mgrid, filename)
+        from tecplot.io import write_tecplot
+        write_tecplot(mgrid, filename)
 
     assert len(mgrid.Edges) < 3 * len(mgrid.Nodes) - 3, 'Wrong number of edges'
     assert len(mgrid.Faces) < 2 * len(mgrid.Nodes) - 2, 'Wrong number of faces'
@@ -144,6 +144,7 @@ def create_plane(n, m, filename='plane', create_dat=True, plot_pyplot=False, nod
 
     u, v = meshgrid(u, v)
 
+    from matplotlib.tri import Triangulation
     delaunuy = Triangulation(u.flatten(), v.flatten())
 
     z = zeros(u.shape)
@@ -158,6 +159,7 @@ def create_plane(n, m, filename='plane', create_dat=True, plot_pyplot=False, nod
     mgrid.init_adjacent_faces_list_for_border_nodes()
 
     if plot_pyplot:
+        import matplotlib.pyplot as plt
         fig = plt.figure()
         ax = fig.gca(projection='3d')
         ax.plot_trisurf(x, y, z, triangles=delaunuy.triangles)
@@ -166,7 +168,8 @@ def create_plane(n, m, filename='plane', create_dat=True, plot_pyplot=False, nod
     if create_dat:
         if not filename.endswith('.dat'):
             filename += '.dat'
-        writer.write_tecplot(mgrid, filename)
+        from tecplot.io import write_tecplot
+        write_tecplot(mgrid, filename)
 
     assert len(mgrid.Edges) < 3 * len(mgrid.Nodes) - 3, 'Wrong number of edges'
     assert len(mgrid.Faces) < 2 * len(mgrid.Nodes) - 2, 'Wrong number of faces'
@@ -214,6 +217,7 @@ def create_circle(n, m, filename='plane', create_dat=True, plot_pyplot=False, no
         coss.append(_u / hip)
         sins.append(_v / hip)
 
+    from matplotlib.tri import Triangulation
     delaunuy = Triangulation(coss, sins)
 
     z = zeros(u.shape)
@@ -228,6 +232,7 @@ def create_circle(n, m, filename='plane', create_dat=True, plot_pyplot=False, no
     mgrid.init_adjacent_faces_list_for_border_nodes()
 
     if plot_pyplot:
+        import matplotlib.pyplot as plt
         fig = plt.figure()
         ax = fig.gca(projection='3d')
         ax.plot_trisurf(x, y, z, triangles=delaunuy.triangles)
@@ -236,7 +241,8 @@ def create_circle(n, m, filename='plane', create_dat=True, plot_pyplot=False, no
     if create_dat:
         if not filename.endswith('.dat'):
             filename += '.dat'
-        writer.write_tecplot(mgrid, filename)
+        from tecplot.io import write_tecplot
+        write_tecplot(mgrid, filename)
 
     assert len(mgrid.Edges) < 3 * len(mgrid.Nodes) - 3, 'Wrong number of edges'
     assert len(mgrid.Faces) < 2 * len(mgrid.Nodes) - 2, 'Wrong number of faces'
@@ -253,6 +259,7 @@ def create_cylinder(m, n, filename='cylinder', plot_pyplot=False, create_dat=Tru
 
     u, v = meshgrid(u, v)
 
+    from matplotlib.tri import Triangulation
     delaunuy = Triangulation(u.flatten(), v.flatten())
 
     COORDS = zeros((m*n + n, 3))
@@ -284,6 +291,7 @@ def create_cylinder(m, n, filename='cylinder', plot_pyplot=False, create_dat=Tru
     mgrid.init_adjacent_faces_list_for_border_nodes()
 
     if plot_pyplot:
+        import matplotlib.pyplot as plt
         fig = plt.figure()
         ax = fig.gca(projection='3d')
         ax.plot_trisurf(x, y, z, triangles=delaunuy.triangles)
@@ -292,7 +300,8 @@ def create_cylinder(m, n, filename='cylinder', plot_pyplot=False, create_dat=Tru
     if create_dat:
         if not filename.endswith('.dat'):
             filename += '.dat'
-        writer.write_tecplot(mgrid, filename)
+        from tecplot.io import write_tecplot
+        write_tecplot(mgrid, filename)
 
     assert len(mgrid.Edges) < 3 * len(mgrid.Nodes) - 3, 'Wrong number of edges'
     assert len(mgrid.Faces) < 2 * len(mgrid.Nodes) - 2, 'Wrong number of faces'
@@ -0,0 +1,109 @@
+"""
+Structured triangulated surfaces built directly as arrays.
+
+Nodes of a surface are the images of a regular (u, v) grid, each cell of
+the grid is split into two triangles; a surface closed along u (cylinder)
+joins the last column of cells with the first one. Nothing is built node
+by node, so grids of tens of millions of faces take seconds, and the
+faces get analytic values of T and Hw for benchmarks and accuracy tests.
+"""
+from numpy import arange, linspace, logspace, meshgrid, column_stack, stack, zeros_like, sin, cos, exp, sqrt, pi, \
+    float64, int64
+from triangular_grid.array_grid import ArrayGrid
+
+
+def analytic_t(x, y, z):
+    """Smooth field of the order of 1 with several extrema over the unit square."""
+    return sin(pi * x) * cos(pi * y) + z
+
+
+def analytic_hw(x, y, z):
+    """Positive field decaying from the origin, of the order of ice thickness."""
+    return 1e-3 * exp(-(x ** 2 + y ** 2 + z ** 2))
+
+
+ANALYTIC_FIELDS = {'T': analytic_t, 'Hw': analytic_hw}
+
+
+def analytic_fields(points):
+    """
+    Values of the analytic fields at the points.
+    :param points: (n, 3) array, e.g. centroids of faces.
+    :return: dict name -> (n,) array.
+    """
+    return {name: f(points[:, 0], points[:, 1], points[:, 2]) for name, f in ANALYTIC_FIELDS.items()}
+
+
+def structured_connectivity(n, m, closed=False):
+    """
+    Triangles of the grid of n x m nodes numbered row by row (u is the fastest).
+    :param closed: join the last node of each row with the first one.
+    :return: (2 * cells, 3) array of positions of faces' nodes, counter-clockwise in (u, v).
+    """
+    columns = n if closed else n - 1
+    i, j = meshgrid(arange(columns, dtype=int64), arange(m - 1, dtype=int64))
+    k = (j * n + i).ravel()
+    right = (j * n + (i + 1) % n).ravel()
+    return stack((column_stack((k, right, right + n)), column_stack((k, right + n, k + n))), axis=1).reshape((-1, 3))
+
+
+def structured_grid(x, y, z, closed=False, fields=True, dtype=float64):
+    """
+    ArrayGrid of the surface given by the coordinates of the nodes of the (u, v) grid.
+    :param x, y, z: (m, n) arrays of coordinates.
+    :param fields: attach the analytic fields at the centroids of the faces.
+    :param dtype: float type of the fields, as `ArrayGrid`.
+    """
+    m, n = x.shape
+    grid = ArrayGrid(column_stack((x.ravel(), y.ravel(), z.ravel())), structured_connectivity(n, m, closed),
+                     dtype=dtype)
+    if fields:
+        for name, values in analytic_fields(grid.return_aux_nodes_as_a_ndim_array()).items():
+            grid.set_field_from_a_ndim_array(name, values)
+    return grid
+
+
+def structured_plane(n, m, nodes_distribution='uniform', fields=True, dtype=float64):
+    """
+    Unit square in the plane z = 0.
+    :param n: number of nodes along x.
+    :param m: number of nodes along y.
+    :param nodes_distribution: 'uniform' or 'logarithmic' along x, as `create_plane`.
+    """
+    u = linspace(0, 1, n) if nodes_distribution == 'uniform' else logspace(-2, 0, n, base=2.0)
+    x, y = meshgrid(u, linspace(0, 1, m))
+    return structured_grid(x, y, zeros_like(x), fields=fields, dtype=dtype)
+
+
+def structured_disc(n, m, fields=True, dtype=float64):
+    """
+    Unit disc in the plane z = 0: the square [-1, 1] x [-1, 1] of n x m nodes mapped onto the disc
+    by the elliptical mapping, so there is no degenerate centre.
+    """
+    u, v = meshgrid(linspace(-1, 1, n), linspace(-1, 1, m))
+    return structured_grid(u * sqrt(1 - v ** 2 / 2), v * sqrt(1 - u ** 2 / 2), zeros_like(u), fields=fields,
+                           dtype=dtype)
+
+
+def structured_cylinder(n, m, fields=True, dtype=float64):
+    """
+    Unit cylinder around z, 0 <= z <= 1, closed around the axis.
+    :param n: number of nodes around the axis.
+    :param m: number of nodes along z.
+    """
+    angle, z = meshgrid(arange(n) * (2 * pi / n), linspace(0, 1, m))
+    return structured_grid(cos(angle), sin(angle), z, closed=True, fields=fields, dtype=dtype)
+
+
+def structured_half_cylinder(n, m, fields=True, dtype=float64):
+    """
+    Half of the unit cylinder around y, 0 <= y <= 3, as `create_half_cylinder`.
+    :param n: number of nodes around the axis.
+    :param m: number of nodes along y.
+    """
+    angle, y = meshgrid(linspace(0, pi, n), linspace(0, 3, m))
+    return structured_grid(cos(angle), y, sin(angle), fields=fields, dtype=dtype)
+
+
+GENERATORS = {'plane': structured_plane, 'disc': structured_disc, 'cylinder': structured_cylinder,
+              'half_cylinder': structured_half_cylinder}
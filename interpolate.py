@@ -1,15 +1,17 @@
 import argparse
-from os.path import isfile
+from contextlib import nullcontext
+from os.path import isfile, splitext
 from triangular_grid import grid
+from triangular_grid.array_grid import ArrayGrid
 from tecplot.io import read_tecplot, write_tecplot
-from algorithms.methods import *
+from algorithms.registry import methods, array_methods
+from algorithms.methods import interpolate
+from algorithms.loading import load_grids, CONCURRENT_METHODS
 from time import time
+from numpy import float32, float64
 
-
-def choose_method(name):
-    if name not in methods.keys():
-        raise ValueError('Wrong parameter ')
-    return methods[name]
+EXTENSIONS = ('.dat', '.h5')
+PRECISIONS = {'double': float64, 'single': float32}
 
 
 def check_argument(name):
@@ -17,54 +19,161 @@ def check_argument(name):
         print('File {} does not exist'.format(name))
         exit(1)
     else:
-        if not old_grid[-4:] == '.dat':
-            print('File {} should be .dat file'.format(name))
+        if splitext(name)[1] not in EXTENSIONS:
+            print('File {} should be .dat or .h5 file'.format(name))
             exit(1)
 
 
-parser = argparse.ArgumentParser()
-parser.add_argument('source', help='old grid .dat file to interpolate from')
-parser.add_argument('target', help='new grid .dat file to interpolate to')
-parser.add_argument('-res', '--result_grid', help='interpolated grid. if not provided than the name of the '
-                                                  'result file is \"new_grid\" + \"_interpolated\"')
-parser.add_argument("-v", "--verbosity", action="count",
-                    help="increase output verbosity", default=0)
-parser.add_argument('-m', '--method', help='method of interpolation', choices=methods.keys(), default='cell_centered')
-args = parser.parse_args()
-
-old_grid = args.source
-new_grid = args.target
-result_grid = args.result_grid
-
-check_argument(old_grid)
-check_argument(new_grid)
-if result_grid:
-    if not result_grid[-4:] == '.dat':
-        print('File {} should be .dat file'.format(result_grid))
+def read_grid(name, snapshot=None, lazy=False, dtype=float64):
+    """
+    Read tecplot file or the snapshot of HDF5 store, only the mesh if the snapshot is None.
+    Fields of the store are kept in `dtype`, values of tecplot files are Python floats.
+    """
+    if splitext(name)[1] == '.h5':
+        from tecplot.snapshots import SnapshotStore
+        with SnapshotStore(name) as store:
+            return (store.mesh(dtype) if snapshot is None else store.read_grid(snapshot, dtype=dtype)).to_grid()
+    g = grid.Grid()
+    read_tecplot(g, name, lazy=lazy)
+    return g
+
+
+def write_grid(g, name, snapshot=None):
+    """
+    Write tecplot file or the snapshot of HDF5 store, appended if the snapshot is None.
+    :raise ValueError: if the store exists and has another mesh.
+    """
+    if splitext(name)[1] == '.h5':
+        from tecplot.io import face_fields
+        from tecplot.snapshots import SnapshotStore
+        exists = isfile(name)
+        with (SnapshotStore(name, 'a') if exists else SnapshotStore.from_grid(name, g)) as store:
+            if exists:
+                store.check_grid(g)
+            if snapshot is None:
+                store.append(face_fields(g))
+            else:
+                store.write(snapshot, face_fields(g))
+        return
+    write_tecplot(g, name)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('source', help='old grid .dat file or .h5 store of snapshots to interpolate from')
+    parser.add_argument('target', help='new grid .dat file or .h5 store (its mesh) to interpolate to')
+    parser.add_argument('-res', '--result_grid', help='interpolated grid. if not provided than the name of the '
+                                                      'result file is \"new_grid\" + \"_interpolated\"')
+    parser.add_argument("-v", "--verbosity", action="count",
+                        help="increase output verbosity", default=0)
+    parser.add_argument('-m', '--method', help='method of interpolation', choices=methods.keys(), default='cell_centered')
+    parser.add_argument('--report', help='print conservation and error metrics of the interpolation', action='store_true')
+    parser.add_argument('--shards', help='search the source in SHARDS worker processes, each indexing a part of it '
+                                         '(cell_centered and with_relocation methods)', type=int, default=0)
+    parser.add_argument('--reorder', help='sort nodes and faces of the grids along the space-filling curve before '
+                                          'the interpolation, the result is written in the original order',
+                        choices=('morton', 'hilbert'))
+    parser.add_argument('--max_distance', help='max distance to the source face (zone_constrained and '
+                                               'component_constrained methods)', type=float)
+    parser.add_argument('--lazy', help='do not decode pass-through variables, copy them from the target file to '
+                                       'the result', action='store_true')
+    parser.add_argument('--vtu', help='also write the interpolated grid to VTU file for ParaView')
+    parser.add_argument('--snapshot', help='number of the snapshot of the .h5 source', type=int, default=0)
+    parser.add_argument('--result_snapshot', help='number of the snapshot of the .h5 result to write, '
+                                                  'appended if not provided', type=int)
+    parser.add_argument('--concurrent', help='read the source and build its index in a worker process while the '
+                                             'target is read', action='store_true')
+    parser.add_argument('--precision', help='precision of the fields of grids read into arrays: .h5 stores and the '
+                                            'source read by --concurrent', choices=PRECISIONS, default='double')
+    args = parser.parse_args()
+
+    old_grid = args.source
+    new_grid = args.target
+    result_grid = args.result_grid
+
+    check_argument(old_grid)
+    check_argument(new_grid)
+    if not result_grid:
+        result_grid = splitext(new_grid)[0] + '_interpolated' + splitext(new_grid)[1]
+    if splitext(result_grid)[1] not in EXTENSIONS:
+        print('File {} should be .dat or .h5 file'.format(result_grid))
+        exit(1)
+    if splitext(result_grid)[1] == '.dat' and splitext(new_grid)[1] != '.dat':
+        print('Result {} can be .dat file only if the new grid is .dat file'.format(result_grid))
+        exit(1)
+    if args.shards and args.method not in ('cell_centered', 'with_relocation'):
+        print('Method {} can not be used with shards'.format(args.method))
         exit(1)
+    options = dict()
+    if args.max_distance is not None:
+        if not args.method.endswith('_constrained'):
+            print('Max distance can be used only with the constrained methods')
+            exit(1)
+        options['max_distance'] = args.max_distance
+    if args.concurrent and args.method not in CONCURRENT_METHODS:
+        print('Method {} can not be used with concurrent loading'.format(args.method))
+        exit(1)
+
+    start = time()
+    index = None
+    dtype = PRECISIONS[args.precision]
+    if args.concurrent:
+        # The source is kept as arrays unless the method needs its graph, which is then reordered.
+        needs_graph = args.method not in array_methods
+        # The index is of no use if the source is reordered or sharded afterwards.
+        grid1, index, grid2 = load_grids(old_grid, lambda: read_grid(new_grid, lazy=args.lazy, dtype=dtype),
+                                         None if args.shards or args.reorder and needs_graph else args.method,
+                                         args.snapshot, dtype=dtype)
+        if needs_graph:
+            grid1 = grid1.to_grid()
+        if args.verbosity > 0:
+            print('Grids read')
+    else:
+        grid1 = read_grid(old_grid, args.snapshot, args.lazy, dtype)
+
+        if args.verbosity > 0:
+            print('Old grid read')
 
-start = time()
-grid1 = grid.Grid()
-grid2 = grid.Grid()
-read_tecplot(grid1, old_grid)
+        grid2 = read_grid(new_grid, lazy=args.lazy, dtype=dtype)
 
-if args.verbosity > 0:
-    print('Old grid read')
+        if args.verbosity > 0:
+            print('New grid read')
 
-read_tecplot(grid2, new_grid)
+    if args.reorder:
+        from algorithms.reorder import reorder_grid
+        # The order of the source kept as arrays does not matter: it is only searched by the index.
+        if not isinstance(grid1, ArrayGrid):
+            reorder_grid(grid1, args.reorder)
+        reorder_grid(grid2, args.reorder)
+        if args.verbosity > 0:
+            print('Grids reordered')
+
+    if args.shards:
+        from algorithms.distributed import ShardedIndex
+    # Workers of the sharded index are stopped even if the interpolation fails.
+    with ShardedIndex.from_grid(grid1, args.method, args.shards) if args.shards else nullcontext(index) as index:
+        interpolate(grid1, grid2, args.method, index, **options)
+    if args.verbosity > 0:
+        print('Interpolation made')
+
+    if args.report:
+        from algorithms.metrics import conservation_report, print_conservation_report
+        print_conservation_report(conservation_report(grid1, grid2))
+
+    try:
+        write_grid(grid2, result_grid, args.result_snapshot)
+    except ValueError as e:
+        print(e)
+        exit(1)
 
-if args.verbosity > 0:
-    print('New grid read')
+    if args.vtu:
+        from tecplot.io import write_vtu
+        write_vtu(grid2, args.vtu)
 
-choose_method(args.method)(grid1, grid2)
-if args.verbosity > 0:
-    print('Interpolation made')
+    if args.verbosity > 0:
+        print('Result grid was written')
+        print('Total time:', time() - start)
 
-if args.result_grid:
-    write_tecplot(grid2, result_grid)
-else:
-    write_tecplot(grid2, new_grid[:-4] + '_interpolated.dat')
 
-if args.verbosity > 0:
-    print('Result grid was written')
-    print('Total time:', time() - start)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Local interpolation server.
+
+Keeps parsed source grids and their spatial indexes in memory, so a repeated job
+with the same source only reads the target, queries the index and writes the result.
+
+Jobs are posted as JSON to http://host:port/interpolate:
+
+    {"source": "old.dat", "target": "new.dat", "result": "new_interpolated.dat", "method": "cell_centered"}
+
+`result` and `method` are optional. GET /stats returns the state of the cache.
+A malformed request (body, files, method) gets 400, a job failed otherwise
+gets 500 and its traceback is logged to stderr; the server keeps serving.
+"""
+import argparse
+import json
+import traceback
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from os.path import isfile
+from time import time
+from triangular_grid import grid
+from tecplot.io import read_tecplot, write_tecplot
+from algorithms.registry import methods
+from algorithms.methods import interpolate
+from algorithms.cache import GridCache
+
+
+def validate_job(job):
+    """
+    Check the job and fill its optional keys.
+
+    Parameters
+    ----------
+        job : dict
+            source, target and optionally result and method
+
+    Returns
+    -------
+        dict : the job with the result and the method
+
+    Raises
+    ------
+    ValueError
+        when the job is malformed
+    """
+    if not isinstance(job, dict):
+        raise ValueError('The job should be a JSON object')
+    for key in ('source', 'target'):
+        if key not in job:
+            raise ValueError('No {} in the job'.format(key))
+        if not isinstance(job[key], str) or not isfile(job[key]):
+            raise ValueError('File {} does not exist'.format(job[key]))
+
+    method = job.get('method', 'cell_centered')
+    if method not in methods.keys():
+        raise ValueError('Wrong method {}'.format(method))
+
+    result = job.get('result') or job['target'][:-4] + '_interpolated.dat'
+    return dict(job, method=method, result=result)
+
+
+def run_job(cache, job):
+    """
+    Interpolate the target of the job using the cached source.
+
+    Parameters
+    ----------
+        cache : GridCache
+            cache of source grids
+        job : dict
+            job checked by `validate_job`
+
+    Returns
+    -------
+        dict : the result file and the time spent
+    """
+    method, result = job['method'], job['result']
+
+    start = time()
+    old_grid, index = cache.get_index(job['source'], method)
+    new_grid = grid.Grid()
+    read_tecplot(new_grid, job['target'])
+    interpolate(old_grid, new_grid, method, index)
+    write_tecplot(new_grid, result)
+
+    return {'result': result, 'time': time() - start}
+
+
+class InterpolationHandler(BaseHTTPRequestHandler):
+    cache = None
+
+    def send_json(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != '/stats':
+            self.send_json(404, {'error': 'Unknown path {}'.format(self.path)})
+            return
+        self.send_json(200, self.cache.stats())
+
+    def do_POST(self):
+        if self.path != '/interpolate':
+            self.send_json(404, {'error': 'Unknown path {}'.format(self.path)})
+            return
+        # Only the request is checked for 400, any error of the job itself is a failure of the server.
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            job = validate_job(json.loads(self.rfile.read(length)))
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        try:
+            self.send_json(200, run_job(self.cache, job))
+        except Exception as e:
+            self.log_error('Job failed: %s: %s', type(e).__name__, e)
+            traceback.print_exc()
+            self.send_json(500, {'error': '{}: {}'.format(type(e).__name__, e)})
+
+
+def serve(host, port, max_bytes):
+    InterpolationHandler.cache = GridCache(max_bytes)
+    # Jobs are served one by one: cached grids are shared and not thread safe.
+    HTTPServer((host, port), InterpolationHandler).serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', help='interface to listen on', default='127.0.0.1')
+    parser.add_argument('-p', '--port', help='port to listen on', type=int, default=8765)
+    parser.add_argument('--max_memory', help='memory budget of the cache, MB', type=int, default=2048)
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.max_memory * 1024 ** 2)
@@ -1,93 +1,228 @@
+import os
+import re
+from numpy import array, unique, frombuffer, dtype, column_stack, where, int64, concatenate, arange, full, \
+    asarray, ascontiguousarray, isnan
 from triangular_grid.node import Node
 from triangular_grid.face import Face
 from triangular_grid.edge import Edge
 from triangular_grid.grid import Grid
 from triangular_grid.zone import Zone
+from triangular_grid.array_grid import ArrayGrid
 
 NUMBER_OF_LINES_BETWEEN_ELEMENTS_COUNT_AND_VALUES = 4
 NUMBER_OF_COORDINATES = 3
 NUMBER_OF_LINES_BETWEEN_X_COORD_AND_ZONE_TITILE = 6
 NUMBER_OF_LINES_BETWEEN_X_COORD_AND_VARLOCATION = 1
+OBJ_VERTEX = re.compile(r'^v[ \t]+(\S+)[ \t]+(\S+)[ \t]+(\S+)', re.MULTILINE)
+OBJ_FACE = re.compile(r'^f[ \t]+(.*?)[ \t]*$', re.MULTILINE)
+OBJ_INDICES = re.compile(r'/\S*')
+# Line of a face with more than 3 nodes.
+OBJ_POLYGON = re.compile(r'^[ \t]*\S+[ \t]+\S+[ \t]+\S+[ \t]+\S', re.MULTILINE)
 
+STL_HEADER_SIZE = 84
+STL_TRIANGLE = dtype([('normal', '<f4', 3), ('vertices', '<f4', (3, 3)), ('attribute', '<u2')])
+STL_VERTEX = re.compile(r'vertex\s+(\S+)\s+(\S+)\s+(\S+)')
 
-def read_tecplot(grid, filename):
+PLY_TYPES = {'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1', 'short': 'i2', 'int16': 'i2',
+             'ushort': 'u2', 'uint16': 'u2', 'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+             'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8'}
+
+VTK_TRIANGLE = 5
+VTU_HEADER = dtype('<u8')
+
+# Bytes copied at once when `os.sendfile` is not available.
+COPY_CHUNK_SIZE = 1024 ** 2
+
+
+class PassThroughBlock:
+    __doc__ = "Line of a file kept as its position in the file, copied to the output without decoding."
+    __slots__ = ('filename', 'offset', 'length')
+
+    def __init__(self, filename, offset, length):
+        self.filename = filename
+        self.offset = offset
+        self.length = length
+
+    def read(self):
+        """Read the line from the file."""
+        with open(self.filename, 'rb') as f:
+            f.seek(self.offset)
+            return f.read(self.length).decode()
+
+
+def read_lines(filename, lazy=False):
+    """
+    Read lines of tecplot file.
+
+    In the lazy mode lines of the variables other than the coordinates,
+    T, Hw and Hi are not decoded and kept, only their positions in the file.
+
+    Parameters
+    ----------
+        filename : string
+            source file
+        lazy : bool
+            keep pass-through variables as `PassThroughBlock`
+
+    Returns
+    -------
+        list of strings and PassThroughBlock
+    """
+    if not lazy:
+        with open(filename, 'r') as file_with_grid:
+            return file_with_grid.readlines()
+
+    lines = list()
+    pass_through = set()
+    offset = 0
+    with open(filename, 'rb') as file_with_grid:
+        for i, line in enumerate(file_with_grid):
+            if i in pass_through:
+                lines.append(PassThroughBlock(filename, offset, len(line)))
+                offset += len(line)
+                continue
+            offset += len(line)
+            text = line.decode()
+            if text.endswith('\r\n'):
+                text = text[:-2] + '\n'
+            lines.append(text)
+
+            if i == 2:
+                index_of_hi, num_of_variables = parce_variables(text)
+                faces_variables = {index_of_hi - 2, index_of_hi - 1, index_of_hi}
+            elif text.find('ELEMENTS=') != -1:
+                start = i + NUMBER_OF_LINES_BETWEEN_ELEMENTS_COUNT_AND_VALUES
+                pass_through.update(start + v for v in range(NUMBER_OF_COORDINATES, num_of_variables)
+                                    if v not in faces_variables)
+    return lines
+
+
+def read_tecplot(grid, filename, lazy=False):
     """
     Read tecplot file.
 
+    The file must have the layout written by the solver: the header
+    keywords on their lines in a fixed order, each variable's block and
+    each face of the connectivity list on one line; the lines are kept to
+    write the result in the same layout. Files wrapping the blocks over
+    several lines are read into arrays by `tecplot.tokenizer.read_tecplot_arrays`.
+
     Parameters
     ----------
         grid : Grid object
             target grid
         filename : string
             source file
+        lazy : bool
+            keep only positions of the lines of pass-through variables,
+            the writer copies them from the file, which must not change meanwhile
+
+    Raises
+    ------
+    ValueError
+        when the blocks of a zone do not have the layout
     """
-    with open(filename, 'r') as file_with_grid:
+    lines = read_lines(filename, lazy)
+
+    grid.export_mode = lines[0]
+
+    grid.title = lines[1]
 
-        lines = file_with_grid.readlines()
+    grid.variables = lines[2]
 
-        grid.export_mode = lines[0]
+    index_of_hi, num_of_variables = parce_variables(lines[2])
 
-        grid.title = lines[1]
+    grid.position_of_hi = index_of_hi - NUMBER_OF_COORDINATES
 
-        grid.variables = lines[2]
+    faces_count = list()
+    where_data_starts = list()
 
-        index_of_hi, num_of_variables = parce_variables(lines[2])
+    # Find and remember all ELEMENTS words in the file.
+    # They design a start of zone.
+    for i, line in enumerate(lines):
+        if isinstance(line, PassThroughBlock):
+            continue
+        if line.find('ELEMENTS=') != -1:
+            faces_count.append(number_of_faces(line))
 
-        grid.position_of_hi = index_of_hi - NUMBER_OF_COORDINATES
+            # +3 is the correction to start from the line
+            # where the variables start.
+            where_data_starts.append(i + NUMBER_OF_LINES_BETWEEN_ELEMENTS_COUNT_AND_VALUES)
 
-        faces_count = list()
-        where_data_starts = list()
+    # List of lists of nodes for each zone.
+    nodes = list()
+    # List of lists of faces for each zone.
+    faces = list()
 
-        # Find and remember all ELEMENTS words in the file.
-        # They design a start of zone.
-        for i, line in enumerate(lines):
-            if line.find('ELEMENTS=') != -1:
-                faces_count.append(number_of_faces(line))
+    # Extract each zone from certain lines using indexes of lines
+    # obtained earlier.
+    for f, i in zip(faces_count, where_data_starts):
+        # Create a zone.
+        z = Zone()
+        grid.Zones.append(z)
 
-                # +3 is the correction to start from the line
-                # where the variables start.
-                where_data_starts.append(i + NUMBER_OF_LINES_BETWEEN_ELEMENTS_COUNT_AND_VALUES)
+        # Remember data that is of no need
+        z.variables = lines[i + NUMBER_OF_COORDINATES: i + num_of_variables]
 
-        # List of lists of nodes for each zone.
-        nodes = list()
-        # List of lists of faces for each zone.
-        faces = list()
+        # Varlocation is a line before i
+        z.varlocation = lines[i - NUMBER_OF_LINES_BETWEEN_X_COORD_AND_VARLOCATION]
 
-        # Extract each zone from certain lines using indexes of lines
-        # obtained earlier.
-        for f, i in zip(faces_count, where_data_starts):
-            # Create a zone.
-            z = Zone()
-            grid.Zones.append(z)
+        # Zone title is the ELEMENTS line minus 6
+        z.title = lines[i - NUMBER_OF_LINES_BETWEEN_X_COORD_AND_ZONE_TITILE]
 
-            # Remember data that is of no need
-            z.variables = lines[i + NUMBER_OF_COORDINATES: i + num_of_variables]
+        check_zone_layout(lines[i: i + f + num_of_variables], f, num_of_variables, index_of_hi, filename)
 
-            # Varlocation is a line before i
-            z.varlocation = lines[i - NUMBER_OF_LINES_BETWEEN_X_COORD_AND_VARLOCATION]
+        # Return nodes and faces for the zone
+        # by parcing the file.
+        parced_nodes, parced_faces = parce_nodes_and_faces(lines[i: i + f + num_of_variables],
+                                                           num_of_variables,
+                                                           index_of_hi)
+        nodes.append(parced_nodes)
+        faces.append(parced_faces)
 
-            # Zone title is the ELEMENTS line minus 6
-            z.title = lines[i - NUMBER_OF_LINES_BETWEEN_X_COORD_AND_ZONE_TITILE]
+        z.Nodes = parced_nodes
+        z.Faces = parced_faces
 
-            # Return nodes and faces for the zone
-            # by parcing the file.
-            parced_nodes, parced_faces = parce_nodes_and_faces(lines[i: i + f + num_of_variables],
-                                                               num_of_variables,
-                                                               index_of_hi)
-            nodes.append(parced_nodes)
-            faces.append(parced_faces)
 
-            z.Nodes = parced_nodes
-            z.Faces = parced_faces
 
+        assert len(parced_faces) == f
 
+    set_nodes(grid, nodes)
+    for f, n in zip(faces, nodes):
+        set_faces(grid, n, f)
+        grid.Faces += f
 
-            assert len(parced_faces) == f
 
-        set_nodes(grid, nodes)
-        for f, n in zip(faces, nodes):
-            set_faces(grid, n, f)
-            grid.Faces += f
+def check_zone_layout(lines, faces_count, number_of_variables, index_of_hi, filename):
+    """
+    Check that the blocks of the zone are one per line, as `read_tecplot` expects.
+
+    Parameters
+    ----------
+        lines : list of strings
+            lines of the values and the connectivity list of the zone
+        faces_count : int
+            number of faces of the zone
+        number_of_variables : int
+            number of variables
+        index_of_hi : int
+            position of Hi in the variables
+
+    Raises
+    ------
+    ValueError
+        when a block is wrapped over several lines
+    """
+    n_nodes = len(lines[0].split()) if lines else 0
+    coordinates = lines[:NUMBER_OF_COORDINATES]
+    faces_values = [lines[v] for v in (index_of_hi - 2, index_of_hi - 1, index_of_hi) if v < len(lines)]
+    connectivity = lines[number_of_variables:]
+    if len(lines) != faces_count + number_of_variables or \
+            any(len(line.split()) != n_nodes for line in coordinates) or \
+            any(len(line.split()) != faces_count for line in faces_values) or \
+            any(len(connectivity[k].split()) != 3 for k in (0, -1) if connectivity):
+        raise ValueError('Blocks of a zone of {} are wrapped over several lines, read the file by '
+                         'tecplot.tokenizer.read_tecplot_arrays'.format(filename))
 
 
 def parse_obj_node(line):
@@ -186,26 +321,234 @@ def read_obj(grid, filename):
             file to read from
     """
     assert filename[-4:] == '.obj', 'not an .obj format'
+    fill_grid(grid, read_obj_arrays(filename).to_grid())
 
-    j = 0
-    with open(filename, 'r') as file_with_grid:
-        lines = file_with_grid.readlines()
 
-        for line in lines:
-            print(j)
-            j += 1
-            if line[0] == '#':
-                continue
-            if line[0:2] == 'v ':
-                grid.Nodes.append(parse_obj_node(line))
-            if line[0:2] == 'f ':
-                grid.Faces.append(parse_obj_face(line))
+def fill_grid(grid, other):
+    """Move nodes, faces, edges, zones and stores of values of the other grid to the grid."""
+    grid.Nodes, grid.Faces, grid.Edges, grid.Zones = other.Nodes, other.Faces, other.Edges, other.Zones
+    grid.node_store, grid.face_store = other.node_store, other.face_store
 
-        z = Zone()
-        z.Nodes = grid.Nodes
-        z.Faces = grid.Faces
-        grid.Zones.append(z)
-        set_faces(grid, grid.Nodes, grid.Faces)
+
+def triangulate(polygons):
+    """
+    Split polygons into triangles by fans from their first nodes.
+
+    Parameters
+    ----------
+        polygons : list of lists of ints
+            nodes of each polygon
+
+    Returns
+    -------
+        (n_triangles, 3) array
+    """
+    triangles = [(p[0], p[i], p[i + 1]) for p in polygons for i in range(1, len(p) - 1)]
+    return array(triangles, dtype=int64).reshape((-1, 3))
+
+
+def read_obj_arrays(filename):
+    """
+    Read file in .OBJ data format into arrays.
+
+    Only vertices and faces are read, texture and normal indices of
+    the faces are skipped, polygons are split into triangles.
+
+    Parameters
+    ----------
+        filename: string
+            file to read from
+
+    Returns
+    -------
+        ArrayGrid
+    """
+    with open(filename, 'r') as f:
+        text = f.read()
+
+    coordinates = array(OBJ_VERTEX.findall(text), dtype=float).reshape((-1, 3))
+    # 'f 34500/34446/34500 34501/34447/34501 49681/49530/49681' -> 'f 34500 34501 49681'
+    faces = OBJ_INDICES.sub('', '\n'.join(OBJ_FACE.findall(text)))
+    if OBJ_POLYGON.search(faces) is None:
+        connectivity = array(faces.split(), dtype=int64).reshape((-1, 3))
+    else:
+        connectivity = triangulate([[int(i) for i in line.split()] for line in faces.splitlines()])
+
+    # Negative indices count from the end of the list of vertices.
+    connectivity = where(connectivity < 0, connectivity + len(coordinates), connectivity - 1)
+    return ArrayGrid(coordinates, connectivity)
+
+
+def merge_vertices(vertices):
+    """
+    Merge equal vertices of the triangles of STL file.
+
+    Parameters
+    ----------
+        vertices : (n_triangles * 3, 3) array
+            vertices of each triangle
+
+    Returns
+    -------
+        ArrayGrid
+    """
+    coordinates, connectivity = unique(vertices, axis=0, return_inverse=True)
+    return ArrayGrid(coordinates, connectivity.ravel())
+
+
+def read_stl(filename):
+    """
+    Read ASCII or binary STL file into arrays.
+
+    The file is binary if its size matches the number of triangles
+    in the header, as ASCII keyword 'solid' may start a binary header too.
+
+    Parameters
+    ----------
+        filename: string
+            file to read from
+
+    Returns
+    -------
+        ArrayGrid
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+
+    if len(data) >= STL_HEADER_SIZE:
+        n = int(frombuffer(data, dtype='<u4', count=1, offset=STL_HEADER_SIZE - 4)[0])
+        if len(data) == STL_HEADER_SIZE + n * STL_TRIANGLE.itemsize:
+            triangles = frombuffer(data, dtype=STL_TRIANGLE, count=n, offset=STL_HEADER_SIZE)
+            return merge_vertices(triangles['vertices'].reshape((-1, 3)).astype(float))
+
+    vertices = STL_VERTEX.findall(data.decode())
+    return merge_vertices(array(vertices, dtype=float).reshape((-1, 3)))
+
+
+def parse_ply_header(f):
+    """
+    Parse header of PLY file.
+
+    Parameters
+    ----------
+        f: file object
+            binary file, left at the start of the data
+
+    Returns
+    -------
+        tuple
+            (format, list of (element name, count, list of (property name, type, list count type or None)))
+    """
+    assert f.readline().strip() == b'ply', 'not a .ply format'
+    file_format = None
+    elements = list()
+    for line in f:
+        words = line.decode().split()
+        if not words or words[0] in ('comment', 'obj_info'):
+            continue
+        if words[0] == 'end_header':
+            break
+        if words[0] == 'format':
+            file_format = words[1]
+        elif words[0] == 'element':
+            elements.append((words[1], int(words[2]), list()))
+        elif words[0] == 'property':
+            if words[1] == 'list':
+                elements[-1][2].append((words[4], PLY_TYPES[words[3]], PLY_TYPES[words[2]]))
+            else:
+                elements[-1][2].append((words[2], PLY_TYPES[words[1]], None))
+    return file_format, elements
+
+
+def read_ply(filename):
+    """
+    Read ASCII or binary PLY file into arrays.
+
+    Coordinates are read from the vertex element, connectivity
+    from the first list property of the face element.
+    Other elements and properties are skipped.
+
+    Parameters
+    ----------
+        filename: string
+            file to read from
+
+    Returns
+    -------
+        ArrayGrid
+    """
+    with open(filename, 'rb') as f:
+        file_format, elements = parse_ply_header(f)
+        data = f.read()
+
+    if file_format == 'ascii':
+        return read_ply_ascii(data.decode().split('\n'), elements)
+
+    byte_order = '<' if file_format == 'binary_little_endian' else '>'
+    coordinates, connectivity = None, None
+    offset = 0
+    for name, count, properties in elements:
+        if all(list_type is None for _, _, list_type in properties):
+            record = dtype([(p, byte_order + t) for p, t, _ in properties])
+            values = frombuffer(data, dtype=record, count=count, offset=offset)
+            offset += count * record.itemsize
+            if name == 'vertex':
+                coordinates = column_stack([values['x'], values['y'], values['z']]).astype(float)
+            continue
+
+        # Triangles only: the records have the same size.
+        record = dtype([(p, byte_order + t) if list_type is None else (p, [('n', byte_order + list_type),
+                                                                          ('ids', byte_order + t, 3)])
+                        for p, t, list_type in properties])
+        polygons = None
+        if offset + count * record.itemsize <= len(data):
+            values = frombuffer(data, dtype=record, count=count, offset=offset)
+            first_list = [p for p, _, list_type in properties if list_type is not None][0]
+            if (values[first_list]['n'] == 3).all():
+                offset += count * record.itemsize
+                polygons = values[first_list]['ids']
+        if polygons is None:
+            polygons, offset = read_ply_binary_lists(data, offset, count, properties, byte_order)
+        if name == 'face':
+            connectivity = polygons
+
+    return ArrayGrid(coordinates, connectivity)
+
+
+def read_ply_binary_lists(data, offset, count, properties, byte_order):
+    """Read records with lists of nodes of polygons one by one, returns (triangles, offset after the records)."""
+    polygons = list()
+    for _ in range(count):
+        polygon = None
+        for _, t, list_type in properties:
+            if list_type is None:
+                offset += dtype(t).itemsize
+                continue
+            n = int(frombuffer(data, dtype=byte_order + list_type, count=1, offset=offset)[0])
+            offset += dtype(list_type).itemsize
+            ids = frombuffer(data, dtype=byte_order + t, count=n, offset=offset)
+            offset += n * dtype(t).itemsize
+            if polygon is None:
+                polygon = ids.tolist()
+        polygons.append(polygon)
+    return triangulate(polygons), offset
+
+
+def read_ply_ascii(lines, elements):
+    """Read data of ASCII PLY file, see `read_ply`."""
+    coordinates, connectivity = None, None
+    start = 0
+    for name, count, properties in elements:
+        rows = lines[start: start + count]
+        start += count
+        if name == 'vertex':
+            columns = [[p for p, _, _ in properties].index(c) for c in ('x', 'y', 'z')]
+            coordinates = array(' '.join(rows).split(), dtype=float).reshape((count, -1))[:, columns]
+        elif name == 'face':
+            polygons = [[int(i) for i in row.split()] for row in rows]
+            # The first property is the list of nodes: its count, then the nodes.
+            connectivity = triangulate([p[1: 1 + p[0]] for p in polygons])
+    return ArrayGrid(coordinates, connectivity)
 
 
 def set_faces(grid, nodes, faces):
@@ -488,6 +831,12 @@ def write_tecplot(grid, filename):
         filename: string
             file to write in
     """
+    # Pass-through lines are copied from the file being overwritten: read them first.
+    target = os.path.realpath(filename)
+    for z in grid.Zones:
+        z.variables = [v.read() if isinstance(v, PassThroughBlock) and os.path.realpath(v.filename) == target else v
+                       for v in getattr(z, 'variables', ())]
+
     write_tecplot_header(grid, filename)
     write_zones(grid, filename)
 
@@ -505,11 +854,43 @@ def write_zones(grid, filename):
             file to write in
     """
     for i, z in enumerate(grid.Zones):
+        z = file_order(z)
+
         write_zone_header(z, filename)
 
         write_variables(filename, z, grid.position_of_hi)
 
-        write_connectivity_list(z.Faces, filename)
+        write_connectivity_list(z.Faces, filename, getattr(z, 'node_permutation', None))
+
+
+def file_order(zone):
+    """
+    Return the zone with nodes and faces in the order they were read in.
+
+    Undoes `algorithms.reorder.reorder_grid` using the zone's permutations.
+
+    Parameters
+    ----------
+        zone : Zone
+            zone
+
+    Returns
+    -------
+        Zone
+            the zone itself if it was not reordered, otherwise its copy
+    """
+    if getattr(zone, 'node_permutation', None) is None:
+        return zone
+
+    z = Zone()
+    z.__dict__.update(zone.__dict__)
+    z.Nodes = [None] * len(zone.Nodes)
+    for n, i in zip(zone.Nodes, zone.node_permutation.tolist()):
+        z.Nodes[i] = n
+    z.Faces = [None] * len(zone.Faces)
+    for f, i in zip(zone.Faces, zone.face_permutation.tolist()):
+        z.Faces[i] = f
+    return z
 
 
 def write_tecplot_header(grid, filename):
@@ -569,6 +950,9 @@ def write_variables(filename, zone, position_of_hi):
             index of hi w.r.t. faces' variables
     """
     with open(filename, 'a+') as f:
+        # Pass-through lines adjacent in the source file, not copied yet.
+        block = None
+
         for node in zone.Nodes:
             f.write(str(node.x) + ' ')
         f.write('\n')
@@ -582,6 +966,18 @@ def write_variables(filename, zone, position_of_hi):
         f.write('\n')
 
         for i, vs in enumerate(zone.variables):
+            if isinstance(vs, PassThroughBlock):
+                if block is not None and block.filename == vs.filename and block.offset + block.length == vs.offset:
+                    block = PassThroughBlock(block.filename, block.offset, block.length + vs.length)
+                    continue
+                if block is not None:
+                    copy_block(block, f)
+                block = vs
+                continue
+            if block is not None:
+                copy_block(block, f)
+                block = None
+
             # todo T
             if i == position_of_hi - 2:
                 for face in zone.Faces:
@@ -601,8 +997,48 @@ def write_variables(filename, zone, position_of_hi):
                 continue
             f.write(vs)
 
+        if block is not None:
+            copy_block(block, f)
 
-def write_connectivity_list(faces, filename):
+
+def copy_block(block, f):
+    """
+    Copy the lines of the block from the source file to the output file.
+
+    Bytes go from file to file by `os.sendfile`, or by chunks
+    where it is not available.
+
+    Parameters
+    ----------
+        block : PassThroughBlock
+            lines of the source file
+
+        f : file object
+            output file
+    """
+    f.flush()
+    with open(block.filename, 'rb') as source:
+        offset, length = block.offset, block.length
+        try:
+            while length > 0:
+                sent = os.sendfile(f.fileno(), source.fileno(), offset, length)
+                if sent == 0:
+                    break
+                offset += sent
+                length -= sent
+        except (AttributeError, OSError):
+            source.seek(offset)
+            while length > 0:
+                chunk = source.read(min(length, COPY_CHUNK_SIZE))
+                if not chunk:
+                    break
+                f.buffer.write(chunk)
+                length -= len(chunk)
+            f.buffer.flush()
+    assert length == 0, 'File {} has changed since it was read'.format(block.filename)
+
+
+def write_connectivity_list(faces, filename, node_permutation=None):
     """
     Write tecplot connectivity list.
 
@@ -613,10 +1049,195 @@ def write_connectivity_list(faces, filename):
 
         filename : string
             output file
+
+        node_permutation : array of ints
+            original positions of the zone's nodes if they were reordered
     """
+    if node_permutation is not None:
+        node_permutation = node_permutation.tolist()
+
     with open(filename, 'a+') as f:
         # Connectivity list.
         for face in faces:
-            for id in face.nodes_ids:
+            ids = face.nodes_ids
+            if node_permutation is not None:
+                ids = [node_permutation[id - 1] + 1 for id in ids]
+            for id in ids:
                 f.write(str(id) + ' ')
             f.write('\n')
+
+
+def variable_names(line):
+    """
+    Names of the variables of tecplot file.
+
+    Parameters
+    ----------
+        line : string
+            VARIABLES line, e.g. 'VARIABLES="X", "Y", "Z", "T"'
+
+    Returns
+    -------
+        list of strings
+    """
+    return [v.strip().strip('"') for v in line[line.find('=') + 1:].split(',')]
+
+
+def face_fields(grid):
+    """
+    Values of all faces' fields of the grid.
+
+    Fields of a grid read from tecplot file are named as in the file,
+    T, Hw and Hi are taken from the faces, pass-through variables
+    are parsed from their lines. Values are in the order the faces
+    were read in, as `file_mesh`; fields never set (all NaN) of a grid
+    without the variables of a file are omitted.
+
+    Parameters
+    ----------
+        grid : Grid or ArrayGrid
+            grid
+
+    Returns
+    -------
+        dict
+            name -> (n_faces,) array
+    """
+    if isinstance(grid, ArrayGrid):
+        return dict(grid.fields)
+    order = file_face_order(grid)
+    if grid.face_store is not None:
+        # Fields never set are all NaN, they are not fields of the grid.
+        return {name: values if order is None else values[order]
+                for name, values in grid.face_store.arrays.items() if not isnan(values).all()}
+
+    names = variable_names(getattr(grid, 'variables', ''))[NUMBER_OF_COORDINATES:]
+    if not hasattr(grid, 'position_of_hi') or sum(len(z.Faces) for z in grid.Zones) != len(grid.Faces):
+        fields = {name: grid.return_field_as_a_ndim_array(name) for name in ('T', 'Hw', 'Hi')}
+        return {name: values if order is None else values[order]
+                for name, values in fields.items() if not isnan(values).all()}
+
+    hi = grid.position_of_hi
+    fields = dict()
+    for i, name in enumerate(names):
+        if i in (hi - 2, hi - 1, hi):
+            values = grid.return_field_as_a_ndim_array({hi - 2: 'T', hi - 1: 'Hw', hi: 'Hi'}[i])
+            fields[name] = values if order is None else values[order]
+            continue
+        # Pass-through values are in the order of the file.
+        values = list()
+        for z in grid.Zones:
+            line = z.variables[i]
+            line = line.read() if isinstance(line, PassThroughBlock) else line
+            values.append(array(line.replace('None', 'nan').split(), dtype=float))
+        fields[name] = concatenate(values) if values else array([])
+    return fields
+
+
+def is_reordered(grid):
+    """Whether `algorithms.reorder.reorder_grid` changed the order of the grid's elements."""
+    return any(getattr(z, 'node_permutation', None) is not None for z in getattr(grid, 'Zones', ()))
+
+
+def file_face_order(grid):
+    """
+    Positions in `grid.Faces` of the faces in the order they were read in.
+
+    Parameters
+    ----------
+        grid : Grid
+            grid
+
+    Returns
+    -------
+        (n_faces,) array, None if the grid was not reordered
+    """
+    if not is_reordered(grid):
+        return None
+    positions = {f: i for i, f in enumerate(grid.Faces)}
+    return array([positions[f] for z in grid.Zones for f in file_order(z).Faces], dtype=int64)
+
+
+def file_mesh(grid):
+    """
+    Coordinates and connectivity of the grid with nodes and faces in the order they were read in.
+
+    Undoes `algorithms.reorder.reorder_grid` as `file_order`, so the mesh matches `face_fields`.
+
+    Parameters
+    ----------
+        grid : Grid or ArrayGrid
+            grid
+
+    Returns
+    -------
+        tuple ((n_nodes, 3) array, (n_faces, 3) array)
+    """
+    if not is_reordered(grid):
+        return grid.return_coordinates_as_a_ndim_array(), grid.return_connectivity_as_a_ndim_array()
+    zones = [file_order(z) for z in grid.Zones]
+    # Nodes shared by zones keep the position of their first occurrence, as read.
+    positions = dict()
+    for z in zones:
+        for n in z.Nodes:
+            positions.setdefault(n, len(positions))
+    coordinates = array([(n.x, n.y, n.z) for n in positions], dtype=float).reshape((-1, 3))
+    connectivity = array([positions[n] for z in zones for f in z.Faces for n in f.nodes],
+                         dtype=int64).reshape((-1, 3))
+    return coordinates, connectivity
+
+
+def write_vtu(grid, filename, fields=None):
+    """
+    Write the grid to VTK XML unstructured grid file with raw binary appended data.
+
+    Arrays are written from their buffers: coordinates, connectivity, offsets
+    and types of the cells, then faces' fields as cell data. Each array is preceded
+    by its size in bytes (UInt64).
+
+    Parameters
+    ----------
+        grid : Grid or ArrayGrid
+            grid to write
+
+        filename : string
+            file to write in
+
+        fields : dict
+            name -> (n_faces,) array in the order the faces were read in, all fields of the grid
+            by `face_fields` if None
+    """
+    if fields is None:
+        fields = face_fields(grid)
+    coordinates, connectivity = file_mesh(grid)
+    n_faces = len(connectivity)
+
+    arrays = [('Points', 'Float64', coordinates.astype('<f8'), 3),
+              ('connectivity', 'Int64', connectivity.astype('<i8'), 1),
+              ('offsets', 'Int64', arange(3, 3 * n_faces + 1, 3, dtype='<i8'), 1),
+              ('types', 'UInt8', full(n_faces, VTK_TRIANGLE, dtype='u1'), 1)]
+    arrays += [(name, 'Float64', asarray(values).astype('<f8'), 1) for name, values in fields.items()]
+
+    headers = list()
+    offset = 0
+    for name, vtk_type, values, components in arrays:
+        headers.append('<DataArray type="{}" Name="{}" NumberOfComponents="{}" format="appended" '
+                       'offset="{}"/>'.format(vtk_type, name, components, offset))
+        offset += VTU_HEADER.itemsize + values.nbytes
+
+    with open(filename, 'wb') as f:
+        f.write('<?xml version="1.0"?>\n'
+                '<VTKFile type="UnstructuredGrid" version="1.0" byte_order="LittleEndian" header_type="UInt64">\n'
+                '<UnstructuredGrid>\n'
+                '<Piece NumberOfPoints="{}" NumberOfCells="{}">\n'
+                '<Points>\n{}\n</Points>\n'
+                '<Cells>\n{}\n</Cells>\n'
+                '<CellData>\n{}\n</CellData>\n'
+                '</Piece>\n'
+                '</UnstructuredGrid>\n'
+                '<AppendedData encoding="raw">\n_'.format(len(coordinates), n_faces, headers[0],
+                                                          '\n'.join(headers[1:4]), '\n'.join(headers[4:])).encode())
+        for _, _, values, _ in arrays:
+            f.write(array([values.nbytes], dtype=VTU_HEADER).tobytes())
+            f.write(ascontiguousarray(values).data)
+        f.write(b'\n</AppendedData>\n</VTKFile>\n')
@@ -0,0 +1,152 @@
+"""
+HDF5 store of snapshots of faces' fields on one mesh.
+
+The coordinates and the connectivity are written once, each field is
+a chunked compressed dataset (n_snapshots, n_faces) growing by rows,
+so a snapshot is read or written without touching the others.
+
+Layout of the file::
+
+    /mesh/coordinates    (n_nodes, 3) float64
+    /mesh/connectivity   (n_faces, 3) int64
+    /fields/<name>       (n_snapshots, n_faces) float64, NaN if the field is absent in the snapshot
+
+h5py is imported on first use.
+"""
+from numpy import asarray, array_equal, nan, float64
+from triangular_grid.array_grid import ArrayGrid
+
+# Max number of faces in a chunk of a field's dataset: one chunk is a part of one snapshot.
+CHUNK_FACES = 2 ** 16
+COMPRESSION = 'gzip'
+COMPRESSION_LEVEL = 4
+
+
+class SnapshotStore:
+    __doc__ = "Snapshots of faces' fields on one mesh in HDF5 file."
+
+    def __init__(self, filename, mode='r'):
+        """
+        Open the store.
+        :param filename: HDF5 file.
+        :param mode: 'r' to read, 'a' to read and write.
+        """
+        import h5py
+        self.filename = filename
+        self.file = h5py.File(filename, mode)
+
+    @classmethod
+    def create(cls, filename, coordinates, connectivity):
+        """
+        Create the store of the mesh, an existing file is overwritten.
+        :param coordinates: (n_nodes, 3) array of coordinates of nodes.
+        :param connectivity: (n_faces, 3) array of positions of faces' nodes.
+        """
+        import h5py
+        with h5py.File(filename, 'w') as f:
+            f.create_dataset('mesh/coordinates', data=asarray(coordinates, dtype='f8'))
+            f.create_dataset('mesh/connectivity', data=asarray(connectivity, dtype='i8'))
+            f.create_group('fields')
+        return cls(filename, 'a')
+
+    @classmethod
+    def from_grid(cls, filename, grid):
+        """Create the store of the grid's mesh, in the order it was read in as `face_fields`."""
+        from tecplot.io import file_mesh
+        return cls.create(filename, *file_mesh(grid))
+
+    def check_grid(self, grid):
+        """
+        Check that the grid has the mesh of the store, in the order it was read in as `face_fields`.
+        :raise ValueError: if the numbers of nodes or faces, the connectivity or the coordinates differ.
+        """
+        from tecplot.io import file_mesh
+        coordinates, connectivity = file_mesh(grid)
+        n_nodes = self.file['mesh/coordinates'].shape[0]
+        if len(coordinates) != n_nodes or len(connectivity) != self.n_faces:
+            raise ValueError('Grid of {} nodes and {} faces is not the mesh of {} nodes and {} faces of {}'.format(
+                len(coordinates), len(connectivity), n_nodes, self.n_faces, self.file.filename))
+        if not array_equal(connectivity, self.connectivity()):
+            raise ValueError('Connectivity of the grid differs from the mesh of {}'.format(self.file.filename))
+        if not array_equal(coordinates, self.coordinates()):
+            raise ValueError('Coordinates of the grid differ from the mesh of {}'.format(self.file.filename))
+
+    @property
+    def n_faces(self):
+        return self.file['mesh/connectivity'].shape[0]
+
+    @property
+    def names(self):
+        """Names of the fields."""
+        return list(self.file['fields'].keys())
+
+    def __len__(self):
+        """Number of snapshots."""
+        fields = self.file['fields']
+        return max((fields[name].shape[0] for name in fields), default=0)
+
+    def coordinates(self):
+        return self.file['mesh/coordinates'][()]
+
+    def connectivity(self):
+        return self.file['mesh/connectivity'][()]
+
+    def dataset(self, name, n_snapshots):
+        """Dataset of the field with at least `n_snapshots` rows, created if absent."""
+        fields = self.file['fields']
+        if name not in fields:
+            fields.create_dataset(name, shape=(n_snapshots, self.n_faces), maxshape=(None, self.n_faces),
+                                  dtype='f8', chunks=(1, min(self.n_faces, CHUNK_FACES)) if self.n_faces else None,
+                                  compression=COMPRESSION, compression_opts=COMPRESSION_LEVEL, fillvalue=nan)
+        elif fields[name].shape[0] < n_snapshots:
+            fields[name].resize(n_snapshots, axis=0)
+        return fields[name]
+
+    def write(self, index, fields):
+        """
+        Write the snapshot, only the rows of the snapshot are written.
+        :param index: number of the snapshot, the store grows if it is the last one or beyond.
+        :param fields: dict name -> (n_faces,) array.
+        """
+        n_snapshots = max(len(self), index + 1)
+        for name in self.names:
+            self.dataset(name, n_snapshots)
+        for name, values in fields.items():
+            values = asarray(values, dtype='f8')
+            assert values.shape == (self.n_faces,), 'Wrong number of values of {}'.format(name)
+            self.dataset(name, n_snapshots)[index] = values
+
+    def append(self, fields):
+        """Write the snapshot after the last one, return its index."""
+        index = len(self)
+        self.write(index, fields)
+        return index
+
+    def read(self, index, names=None):
+        """
+        Read the snapshot.
+        :param index: number of the snapshot.
+        :param names: names of the fields, all if None.
+        :return: dict name -> (n_faces,) array.
+        """
+        assert 0 <= index < len(self), 'No snapshot {} in {}'.format(index, self.filename)
+        fields = self.file['fields']
+        return {name: fields[name][index] for name in (self.names if names is None else names)}
+
+    def mesh(self, dtype=float64, coordinates_dtype=float64):
+        """Return ArrayGrid of the mesh without fields, of the given float types as `ArrayGrid`."""
+        return ArrayGrid(self.coordinates(), self.connectivity(), dtype=dtype, coordinates_dtype=coordinates_dtype)
+
+    def read_grid(self, index, names=None, dtype=float64, coordinates_dtype=float64):
+        """Return ArrayGrid of the mesh with the fields of the snapshot, of the given float types as `ArrayGrid`."""
+        return ArrayGrid(self.coordinates(), self.connectivity(), self.read(index, names), dtype=dtype,
+                         coordinates_dtype=coordinates_dtype)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
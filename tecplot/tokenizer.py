@@ -0,0 +1,231 @@
+"""
+Streaming reader of tecplot FE BLOCK files into arrays.
+
+`read_tecplot` relies on the layout written by the solver: a variable
+per physical line and a fixed number of header lines per zone. Tecplot
+wraps long blocks, orders the header keywords freely, and a one-line
+block of millions of values has to be decoded at once.
+
+`BlockTokenizer` reads the file in chunks and consumes the values of
+a block by their count (NODES for the nodal variables, ELEMENTS for the
+cell-centered ones and three per element for the connectivity) into
+preallocated arrays, whatever the lines are. Only the header is read
+line by line; its keywords are parsed in any order.
+"""
+import re
+from itertools import islice
+from numpy import array, empty, concatenate, unique, sort, int64, float64
+from triangular_grid.array_grid import ArrayGrid
+
+# Bytes read from the file at once.
+CHUNK_SIZE = 2 ** 20
+NUMBER_OF_COORDINATES = 3
+
+TOKEN = re.compile(rb'\S+')
+DATA_START = re.compile(rb'[-+.\d]')
+ZONE = re.compile(r'^\s*ZONE\b', re.MULTILINE | re.IGNORECASE)
+VARIABLES = re.compile(r'\bVARIABLES\s*=', re.IGNORECASE)
+VARIABLE = re.compile(r'"([^"]*)"')
+PARAMETER = re.compile(r'(\w+)\s*=\s*("[^"]*"|\([^)]*\)|[^\s,]+)')
+LOCATION = re.compile(r'\[([^\]]*)\]\s*=\s*(\w+)')
+
+
+class BlockTokenizer:
+    __doc__ = "Values and header lines of a tecplot file read by chunks of bytes."
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        """
+        :param f: file opened in binary mode.
+        :param chunk_size: bytes read at once.
+        """
+        self.file = f
+        self.chunk_size = chunk_size
+        self.buffer = b''
+        self.eof = False
+
+    def fill(self):
+        """Append the next chunk of the file to the buffer, return False at the end of the file."""
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer += chunk
+        return True
+
+    def at_data(self):
+        """Skip whitespace, return whether the next token starts a number (False at the end of the file)."""
+        while True:
+            self.buffer = self.buffer.lstrip()
+            if self.buffer or not self.fill():
+                break
+        return DATA_START.match(self.buffer) is not None
+
+    def read_line(self):
+        """Read the rest of the current line, '' at the end of the file."""
+        while self.buffer.find(b'\n') == -1 and self.fill():
+            pass
+        end = self.buffer.find(b'\n') + 1 or len(self.buffer)
+        line, self.buffer = self.buffer[:end], self.buffer[end:]
+        return line.decode()
+
+    def read_header(self):
+        """Read lines up to the values of the next block, comments are skipped."""
+        lines = list()
+        while not self.at_data() and self.buffer:
+            line = self.read_line()
+            if not line.startswith('#'):
+                lines.append(line)
+        return ''.join(lines)
+
+    def read(self, count, out=None, dtype=float):
+        """
+        Read `count` values separated by any whitespace, including line breaks.
+
+        Parameters
+        ----------
+            count : int
+                number of values
+            out : array
+                preallocated (count,) array to fill, the values are skipped without decoding if None
+            dtype : numpy dtype
+                type of the values if `out` is None
+
+        Returns
+        -------
+            `out`
+
+        Raises
+        ------
+        ValueError
+            when the file ends before `count` values
+        """
+        done = 0
+        tokens = None
+        while done < count:
+            # Read more only when the buffer is short or holds no complete token, so that it does not grow.
+            if len(self.buffer) < self.chunk_size or not tokens:
+                if not self.fill() and not self.buffer.strip():
+                    raise ValueError('Unexpected end of file: {} of {} values read'.format(done, count))
+            tokens = self.buffer.split()
+            partial = b''
+            # The last token may continue in the next chunk.
+            if not self.eof and tokens and not self.buffer[-1:].isspace():
+                partial = tokens.pop()
+            needed = count - done
+            if len(tokens) > needed:
+                end = next(islice(TOKEN.finditer(self.buffer), needed - 1, None)).end()
+                tokens, self.buffer = tokens[:needed], self.buffer[end:]
+            else:
+                self.buffer = partial
+            if out is not None:
+                out[done: done + len(tokens)] = decode(tokens, out.dtype)
+            done += len(tokens)
+        return out
+
+
+def decode(tokens, dtype):
+    """Array of the tokens, 'None' written for absent values becomes NaN."""
+    try:
+        return array(tokens, dtype=dtype)
+    except ValueError:
+        return array([b'nan' if t == b'None' else t for t in tokens], dtype=dtype)
+
+
+def zone_parameters(header):
+    """Keywords of the zone's header, e.g. {'T': 'WALL', 'NODES': '720', ...}, in upper case."""
+    return {key.upper(): value.strip('"') for key, value in PARAMETER.findall(header)}
+
+
+def cell_centered(varlocation, n_variables):
+    """Positions (from 0) of the cell-centered variables in VARLOCATION value, e.g. '([4-13]=CELLCENTERED)'."""
+    positions = set()
+    for ranges, location in LOCATION.findall(varlocation):
+        if location.upper() != 'CELLCENTERED':
+            continue
+        for r in ranges.split(','):
+            first, _, last = r.strip().partition('-')
+            positions.update(range(int(first) - 1, int(last or first)))
+    return {v for v in positions if v < n_variables}
+
+
+def merge_nodes(coordinates, connectivity):
+    """
+    Merge equal nodes of different zones as `read_tecplot` does.
+
+    Nodes keep the order of their first occurrence.
+
+    :return: tuple (coordinates, connectivity).
+    """
+    first, inverse = unique(coordinates, axis=0, return_index=True, return_inverse=True)[1:]
+    kept = sort(first)
+    position = empty(len(first), dtype=int64)
+    position[inverse.ravel()[kept]] = range(len(kept))
+    return coordinates[kept], position[inverse.ravel()][connectivity]
+
+
+def read_tecplot_arrays(filename, names=None, chunk_size=CHUNK_SIZE, dtype=float64, coordinates_dtype=float64):
+    """
+    Read FE BLOCK tecplot file into arrays by `BlockTokenizer`.
+
+    Zones are concatenated, equal nodes of different zones are merged.
+
+    Parameters
+    ----------
+        filename : string
+            source file
+        names : list of strings
+            cell-centered variables to keep, all if None
+        chunk_size : int
+            bytes read at once
+        dtype : numpy dtype
+            float type of the values of the fields, e.g. float32, values are decoded into it
+        coordinates_dtype : numpy dtype
+            float type of the coordinates
+
+    Returns
+    -------
+        ArrayGrid
+    """
+    coordinates, connectivity, fields = list(), list(), dict()
+    n_nodes = 0
+    with open(filename, 'rb') as f:
+        tokens = BlockTokenizer(f, chunk_size)
+        header = tokens.read_header()
+        zone = ZONE.search(header)
+        assert zone is not None, 'No zone in {}'.format(filename)
+        # Names may span several lines up to the first zone.
+        variables = VARIABLE.findall(header[VARIABLES.search(header).end(): zone.start()])
+        header = header[zone.start():]
+
+        while header:
+            parameters = zone_parameters(header)
+            assert parameters.get('DATAPACKING', parameters.get('F', 'BLOCK')) in ('BLOCK', 'FEBLOCK'), \
+                'Only BLOCK data packing is supported'
+            nodes = int(parameters.get('NODES', parameters.get('N')))
+            elements = int(parameters.get('ELEMENTS', parameters.get('E')))
+            located = cell_centered(parameters.get('VARLOCATION', ''), len(variables))
+
+            xyz = empty((NUMBER_OF_COORDINATES, nodes), dtype=coordinates_dtype)
+            for v, name in enumerate(variables):
+                if v < NUMBER_OF_COORDINATES:
+                    tokens.read(nodes, xyz[v])
+                elif v in located and (names is None or name in names):
+                    fields.setdefault(name, list()).append(tokens.read(elements, empty(elements, dtype=dtype)))
+                else:
+                    tokens.read(elements if v in located else nodes)
+            coordinates.append(xyz.T)
+            connectivity.append(tokens.read(3 * elements, empty(3 * elements, dtype=int64)).reshape((-1, 3))
+                                - 1 + n_nodes)
+            n_nodes += nodes
+            header = tokens.read_header()
+
+    if any(len(values) != len(connectivity) for values in fields.values()):
+        raise ValueError('Not all zones have the variables {}'.format(list(fields)))
+    n_zones = len(connectivity)
+    coordinates, connectivity = concatenate(coordinates), concatenate(connectivity)
+    if n_zones > 1:
+        coordinates, connectivity = merge_nodes(coordinates, connectivity)
+    return ArrayGrid(coordinates, connectivity, {name: concatenate(values) for name, values in fields.items()},
+                     dtype=dtype, coordinates_dtype=coordinates_dtype)
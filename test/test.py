@@ -1,11 +1,38 @@
 from algorithms.avl_tree import AVLTree
 from triangular_grid.node import Node
 from triangular_grid.grid import Grid
-from tecplot.reader import read_tecplot
+from tecplot.io import read_tecplot
 from triangular_grid.face import Face
 from geom.vector import Vector
 from geom.point import Point
 from geom.basics import *
+from algorithms.cache import GridCache
+from algorithms.incremental import IncrementalInterpolation
+from algorithms.methods import face_centered_interpolation, build_face_index, interpolate, linear_interpolation, \
+    face_gradients, least_squares_interpolation
+from algorithms.neighbourhood import face_adjacency, NeighbourhoodIndex
+from algorithms.boundary import BoundaryAnalysis
+from algorithms.operators import linear_operator, FaceNodeRelocation
+from algorithms.distributed import ShardedIndex
+from algorithms.reorder import reorder_grid
+from algorithms.constrained import constrained_interpolation
+from algorithms.loading import load_grids
+from tecplot.snapshots import SnapshotStore
+from tecplot.tokenizer import read_tecplot_arrays
+from geom.structured import GENERATORS, structured_plane, analytic_fields
+from tecplot.io import write_tecplot, PassThroughBlock, read_obj, read_stl, read_ply, write_vtu, face_fields
+from tempfile import gettempdir
+from algorithms.bvh import FaceBVH
+from triangular_grid.compact import build_compact_grid
+from triangular_grid.array_grid import ArrayGrid
+from algorithms.quality import quality_report
+from algorithms.metrics import conservation_report, precision_report
+from os.path import dirname, join
+from numpy import array, isnan, concatenate, full, frombuffer, flatnonzero, float32
+import re
+from benchmark import benchmark_synthetic, ARRAY_METHODS
+
+DATA_DIR = dirname(__file__)
 
 
 def test_comparing_of_nodes():
@@ -90,9 +117,9 @@ def test_isomorphism():
     grid = Grid()
     isomorphic_grid = Grid()
     non_isomorphic_grid = Grid()
-    read_tecplot(grid, '../wing_1.dat')
-    read_tecplot(isomorphic_grid, '../wing_1_tm.dat')
-    read_tecplot(non_isomorphic_grid, '../wing_10.dat')
+    read_tecplot(grid, join(DATA_DIR, 'source.dat'))
+    read_tecplot(isomorphic_grid, join(DATA_DIR, 'target.dat'))
+    read_tecplot(non_isomorphic_grid, join(DATA_DIR, 'source2.dat'))
 
     assert grid.is_isomprphic_to(isomorphic_grid), 'Grids are not isomorphic'
     assert not grid.is_isomprphic_to(non_isomorphic_grid), 'Grids are isomorphic, but shouldn\'t be'
@@ -212,6 +239,562 @@ def test_alpha_quality_measure():
     assert 1 - f.alpha_quality_measure() < 10e-6, print(f.alpha_quality_measure())
 
 
+def test_grid_cache():
+    cache = GridCache()
+    source = join(DATA_DIR, 'source.dat')
+    grid, index = cache.get_index(source, 'cell_centered')
+    assert cache.get_index(source, 'cell_centered') == (grid, index), 'Cached grid was not reused'
+    assert cache.hits == 1 and cache.misses == 1, 'Wrong cache statistics'
+
+    # Budget fits only one grid: the least recently used one is evicted.
+    cache.max_bytes = cache.nbytes
+    cache.get(join(DATA_DIR, 'target.dat'))
+    assert len(cache.entries) == 1, 'Entry was not evicted'
+    assert cache.get(source).grid is not grid, 'Evicted grid was returned'
+
+
+def test_incremental_interpolation():
+    old_grid, new_grid = Grid(), Grid()
+    read_tecplot(old_grid, join(DATA_DIR, 'source.dat'))
+    read_tecplot(new_grid, join(DATA_DIR, 'target.dat'))
+    incremental = IncrementalInterpolation(old_grid, new_grid)
+    incremental.interpolate()
+
+    changed = [3, 100, 500]
+    for i in changed:
+        old_grid.Faces[i].T += 1000
+    affected = incremental.update(changed)
+    assert 0 < len(affected) < len(new_grid.Faces), 'Wrong number of affected faces'
+
+    expected = Grid()
+    read_tecplot(expected, join(DATA_DIR, 'target.dat'))
+    face_centered_interpolation(old_grid, expected)
+    assert [f.T for f in new_grid.Faces] == [f.T for f in expected.Faces], 'Wrong incremental update'
+
+
+def test_bvh_refit():
+    grid = Grid()
+    read_tecplot(grid, join(DATA_DIR, 'source.dat'))
+    bvh = FaceBVH.from_grid(grid)
+    for n in grid.Nodes[:20]:
+        n.move(Vector(0.001, -0.002, 0.0005))
+    assert 0 < bvh.update_from_grid(grid) < len(bvh.left), 'Wrong number of refitted boxes'
+
+    points = grid.return_coordinates_as_a_ndim_array()
+    kdtree = build_face_index(grid)
+    assert abs(bvh.query(points)[0] - kdtree.query(points)[0]).max() < 10e-12, 'Wrong nearest centroids after refit'
+
+
+def test_compact_grid():
+    grid = Grid()
+    read_tecplot(grid, join(DATA_DIR, 'target.dat'))
+    compact = build_compact_grid(grid.return_coordinates_as_a_ndim_array(),
+                                 grid.return_connectivity_as_a_ndim_array(),
+                                 {'T': grid.return_field_as_a_ndim_array('T')})
+    assert len(compact.Edges) == len(grid.Edges), 'Wrong number of edges'
+    for f, cf in zip(grid.Faces, compact.Faces):
+        assert cf.nodes_ids == f.nodes_ids, 'Wrong connectivity'
+        assert {a.Id for a in cf.adjacent_faces()} == {a.Id for a in f.adjacent_faces()}, 'Wrong adjacency'
+        assert cf.T == f.T, 'Wrong field value'
+    assert not hasattr(compact.Faces[0], '__dict__'), 'Compact face has __dict__'
+
+    compact.Faces[1].Hw = 2.5
+    assert compact.return_field_as_a_ndim_array('Hw', [1])[0] == 2.5, 'Field is not stored in the shared array'
+
+
+def test_components():
+    grid = Grid()
+    x = [0, 1, 0, 5, 6, 5, 1]
+    y = [0, 0, 1, 5, 5, 6, 1]
+    grid.set_nodes_and_faces(x, y, [0] * 7, array([[0, 1, 2], [3, 4, 5], [1, 6, 2]]))
+    n_components, node_labels, face_labels = grid.label_components()
+    assert n_components == 2, 'Wrong number of components'
+    assert list(face_labels) == [node_labels[0], node_labels[3], node_labels[0]], 'Wrong labels of faces'
+    assert node_labels[0] != node_labels[3], 'Wrong labels of nodes'
+
+
+def test_quality_report():
+    grid = Grid()
+    read_tecplot(grid, join(DATA_DIR, 'source.dat'))
+    report = quality_report(grid, worst=3)
+    alphas = [f.alpha_quality_measure() for f in grid.Faces]
+    assert abs(report['alpha']['min'] - min(alphas)) < 10e-12, 'Wrong min alpha'
+    assert 0 < report['alpha']['geometric_mean'] < 1, 'Geometric mean of alpha underflows'
+    assert alphas[report['worst_faces'][0]] == min(alphas), 'Wrong worst face'
+    assert sum(report['max_angle']['histogram'][0]) == len(grid.Faces), 'Wrong histogram'
+
+
+def test_conservation_report():
+    old_grid, new_grid = Grid(), Grid()
+    read_tecplot(old_grid, join(DATA_DIR, 'source.dat'))
+    read_tecplot(new_grid, join(DATA_DIR, 'target.dat'))
+    face_centered_interpolation(old_grid, new_grid)
+    new_grid.Faces[0].T = None
+    report = conservation_report(old_grid, new_grid)
+
+    old_t = sum(f.T * f.area() for f in old_grid.Faces)
+    assert abs(report['old']['T']['total']['integral'] - old_t) < 10e-12, 'Wrong integral'
+    assert report['new']['T']['total']['none'] == 1, 'Wrong number of None values'
+    assert report['new']['T']['total']['nan'] == 0, 'Wrong number of NaN values'
+    assert 'WALL_2000' in report['difference']['Hw']['zones'], 'Zones are not matched'
+    assert 'HTC' in report['difference'], 'Fields are not taken from the grids'
+
+    arrays = read_tecplot_arrays(join(DATA_DIR, 'source.dat'))
+    report = conservation_report(arrays, old_grid)
+    assert sorted(report['difference']) == sorted(arrays.fields), 'Wrong fields of ArrayGrid'
+    assert abs(report['new']['T']['total']['integral'] - old_t) < 10e-12, 'Wrong integral of ArrayGrid'
+    assert all(d['total']['integral'] == 0 for d in report['difference'].values()), 'Same grids differ'
+
+
+def test_identical_grids():
+    grid, identical_grid, moved_grid = Grid(), Grid(), Grid()
+    read_tecplot(grid, join(DATA_DIR, 'source2.dat'))
+    read_tecplot(identical_grid, join(DATA_DIR, 'target2.dat'))
+    read_tecplot(moved_grid, join(DATA_DIR, 'source2.dat'))
+    moved_grid.Nodes[0].x += 10e-6
+    assert grid.is_identical_to(identical_grid), 'Grids are not identical'
+    assert not grid.is_identical_to(moved_grid), 'Grids are identical, but shouldn\'t be'
+
+    for f in grid.Faces:
+        f.T += 1
+    interpolate(grid, identical_grid)
+    assert [f.T for f in grid.Faces] == [f.T for f in identical_grid.Faces], 'Values are not copied'
+
+    arrays = read_tecplot_arrays(join(DATA_DIR, 'target2.dat'))
+    assert arrays.is_identical_to(grid) and grid.is_identical_to(arrays), 'Grids are not identical'
+    interpolate(grid, arrays)
+    assert (arrays.return_field_as_a_ndim_array('T') == grid.return_field_as_a_ndim_array('T')).all(), \
+        'Values are not copied'
+    assert not arrays.is_identical_to(read_tecplot_arrays(join(DATA_DIR, 'source.dat'))), 'Different grids'
+
+
+def test_linear_fallback():
+    old_grid, new_grid, no_fallback = Grid(), Grid(), Grid()
+    read_tecplot(old_grid, join(DATA_DIR, 'source.dat'))
+    read_tecplot(new_grid, join(DATA_DIR, 'target.dat'))
+    read_tecplot(no_fallback, join(DATA_DIR, 'target.dat'))
+    linear_interpolation(old_grid, no_fallback, fallback=False)
+    outside = isnan(no_fallback.return_field_as_a_ndim_array('T'))
+    assert outside.any(), 'All targets are inside the triangulation'
+
+    linear_interpolation(old_grid, new_grid)
+    T = new_grid.return_field_as_a_ndim_array('T')
+    assert not isnan(T).any(), 'NaN values are not filled'
+    assert (T[~outside] == no_fallback.return_field_as_a_ndim_array('T')[~outside]).all(), 'Wrong linear values'
+
+    operator = linear_operator(old_grid, new_grid)
+    assert abs(operator @ old_grid.return_field_as_a_ndim_array('T') - T).max() < 10e-9, 'Wrong linear operator'
+
+
+def test_sharded_index():
+    grid = Grid()
+    read_tecplot(grid, join(DATA_DIR, 'source.dat'))
+    kdtree = build_face_index(grid)
+    points = array([[x, y, z] for x in (-1, 0, 0.3) for y in (-0.5, 0.2) for z in (0, 0.1, 2)])
+    points = array(list(points) + list(grid.return_coordinates_as_a_ndim_array()))
+    with ShardedIndex.from_grid(grid, n_shards=4) as index:
+        assert len(index.workers) == 4, 'Wrong number of workers'
+        distances, ids = index.query(points)
+    expected_distances, expected_ids = kdtree.query(points)
+    assert abs(distances - expected_distances).max() < 10e-12, 'Wrong nearest distances'
+    assert (kdtree.data[ids] == kdtree.data[expected_ids]).all(), 'Wrong nearest centroids'
+
+    # A dead worker fails the query instead of hanging it.
+    with ShardedIndex.from_grid(grid, n_shards=2) as index:
+        index.workers[1].terminate()
+        try:
+            index.query(points)
+            assert False, 'Query of a dead worker should fail'
+        except RuntimeError:
+            pass
+    assert index.workers == list(), 'Workers are not stopped'
+
+
+def test_reorder():
+    grid, reordered = Grid(), Grid()
+    read_tecplot(grid, join(DATA_DIR, 'target.dat'))
+    read_tecplot(reordered, join(DATA_DIR, 'target.dat'))
+    reorder_grid(reordered, 'morton')
+    reorder_grid(reordered, 'hilbert')
+    assert reordered.Nodes != grid.Nodes, 'Nodes are not reordered'
+    for f in reordered.Faces:
+        assert [reordered.Zones[0].Nodes[i - 1] for i in f.nodes_ids] == f.nodes, 'Wrong connectivity'
+
+    write_tecplot(grid, join(gettempdir(), 'original.dat'))
+    write_tecplot(reordered, join(gettempdir(), 'reordered.dat'))
+    with open(join(gettempdir(), 'original.dat')) as original, open(join(gettempdir(), 'reordered.dat')) as restored:
+        assert original.read() == restored.read(), 'Original order is not restored'
+
+
+def test_constrained_interpolation():
+    grid = Grid()
+    read_tecplot(grid, join(DATA_DIR, 'source2.dat'))
+    coordinates = grid.return_coordinates_as_a_ndim_array()
+    connectivity = grid.return_connectivity_as_a_ndim_array()
+    n = len(connectivity)
+
+    # Two parallel surfaces with a thin gap, the source has T = 1 on the first one and T = 2 on the second.
+    gap = array([0, 0, 0.01])
+    bent = coordinates.copy()
+    bent[:40] += 0.9 * gap
+    old_grid = build_compact_grid(concatenate((coordinates, coordinates + gap)),
+                                  concatenate((connectivity, connectivity + len(coordinates))),
+                                  {'T': concatenate((full(n, 1.0), full(n, 2.0))), 'Hw': full(2 * n, 0.0)})
+    new_grids = [build_compact_grid(concatenate((bent, coordinates + gap)),
+                                    concatenate((connectivity, connectivity + len(coordinates)))) for _ in range(3)]
+
+    face_centered_interpolation(old_grid, new_grids[0])
+    assert (new_grids[0].face_store['T'][:n] == 2).any(), 'Values are not taken across the gap'
+
+    found = constrained_interpolation(old_grid, new_grids[1], constraint='component')
+    assert found.all(), 'Not all faces got values'
+    assert (new_grids[1].face_store['T'] == concatenate((full(n, 1.0), full(n, 2.0)))).all(), 'Wrong component'
+
+    found = constrained_interpolation(old_grid, new_grids[2], constraint='zone', max_distance=0.001)
+    assert 0 < found.sum() < len(found), 'Max distance is not applied'
+    assert isnan(new_grids[2].face_store['T'][~found]).all(), 'Faces without source faces should get NaN'
+
+
+def test_face_node_relocation():
+    grid = Grid()
+    read_tecplot(grid, join(DATA_DIR, 'source.dat'))
+    grid.relocate_values_from_faces_to_nodes(fields=('T', 'Hw', 'Hi'))
+    for n in grid.Nodes[:50]:
+        assert abs(n.T - sum(f.T for f in n.faces) / len(n.faces)) < 10e-12, 'Wrong mean of faces'
+        assert abs(n.Hi - sum(f.Hi for f in n.faces) / len(n.faces)) < 10e-12, 'Wrong mean of faces'
+
+    grid.relocate_values_from_nodes_to_faces()
+    for f in grid.Faces[:50]:
+        assert abs(f.T - sum(n.T for n in f.nodes) / 3) < 10e-12, 'Wrong mean of nodes'
+
+    for weights in ('area', 'angle'):
+        relocation = FaceNodeRelocation(grid, weights)
+        for operator in (relocation.to_nodes_operator, relocation.to_faces_operator):
+            assert abs(operator.sum(axis=1) - 1).max() < 10e-12, 'Weights are not normalized'
+        for f in grid.Faces:
+            f.T = 5.0
+        relocation.to_nodes()
+        relocation.to_faces()
+        assert abs(grid.return_field_as_a_ndim_array('T') - 5).max() < 10e-12, 'Constant is not preserved'
+
+    # The operators are built once per weights and rebuilt after the topology changes.
+    relocation = grid.relocation()
+    assert grid.relocation() is relocation and grid.relocation('area') is not relocation, 'Operator is not cached'
+    reorder_grid(grid, 'morton')
+    assert grid.relocation() is not relocation, 'Operator of the old order is kept'
+    grid.relocate_values_from_faces_to_nodes()
+    for n in grid.Nodes[:50]:
+        assert abs(n.T - sum(f.T for f in n.faces) / len(n.faces)) < 10e-12, 'Wrong mean of reordered faces'
+
+
+def plane_grid(n, shift=0.0):
+    """Triangulated square n x n in the plane z = 0."""
+    coordinates = array([[i + shift, j, 0] for j in range(n) for i in range(n)], dtype=float)
+    connectivity = list()
+    for j in range(n - 1):
+        for i in range(n - 1):
+            k = j * n + i
+            connectivity += [[k, k + 1, k + n + 1], [k, k + n + 1, k + n]]
+    return coordinates, array(connectivity)
+
+
+def test_least_squares():
+    gradient = array([1.0, -2.0, 0.0])
+    coordinates, connectivity = plane_grid(6)
+    centroids = coordinates[connectivity].mean(axis=1)
+    adjacency = face_adjacency(connectivity)
+    assert (adjacency == -1).sum() == 4 * 5, 'Wrong number of border sides'
+
+    gradients = face_gradients(coordinates, connectivity, (centroids @ gradient).reshape((-1, 1)), adjacency)
+    inner = (adjacency != -1).sum(axis=1) >= 2
+    assert abs(gradients[inner, 0] - gradient).max() < 10e-12, 'Wrong gradient'
+
+    old_grid = build_compact_grid(coordinates, connectivity, {'T': centroids @ gradient, 'Hw': centroids @ gradient})
+    new_coordinates, new_connectivity = plane_grid(6, shift=0.1)
+    new_centroids = new_coordinates[new_connectivity].mean(axis=1)
+    new_grid = build_compact_grid(new_coordinates, new_connectivity)
+
+    least_squares_interpolation(old_grid, new_grid, limit=False)
+    exact = abs(new_grid.face_store['T'] - new_centroids @ gradient) < 10e-12
+    assert exact.sum() > len(exact) / 2, 'Linear field is not reproduced'
+
+    least_squares_interpolation(old_grid, new_grid)
+    T = centroids @ gradient
+    assert T.min() <= new_grid.face_store['T'].min() and new_grid.face_store['T'].max() <= T.max(), 'Values are not limited'
+
+
+def test_lazy_reading():
+    grid, lazy_grid = Grid(), Grid()
+    read_tecplot(grid, join(DATA_DIR, 'target.dat'))
+    read_tecplot(lazy_grid, join(DATA_DIR, 'target.dat'), lazy=True)
+    blocks = [v for v in lazy_grid.Zones[0].variables if isinstance(v, PassThroughBlock)]
+    assert len(blocks) == len(grid.Zones[0].variables) - 3, 'Wrong number of pass-through lines'
+    assert blocks[0].read() == grid.Zones[0].variables[3], 'Wrong position of the line'
+    assert [f.T for f in lazy_grid.Faces] == [f.T for f in grid.Faces], 'Wrong values'
+
+    write_tecplot(grid, join(gettempdir(), 'eager.dat'))
+    write_tecplot(lazy_grid, join(gettempdir(), 'lazy.dat'))
+    with open(join(gettempdir(), 'eager.dat')) as eager, open(join(gettempdir(), 'lazy.dat')) as lazy:
+        assert eager.read() == lazy.read(), 'Pass-through lines are not copied'
+
+
+def test_mesh_readers():
+    coordinates = array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0], [0.5, 0.5, 1]])
+    connectivity = array([[0, 1, 2], [0, 2, 3], [0, 1, 4]])
+
+    # The quad is split into 2 triangles.
+    with open(join(gettempdir(), 'mesh.obj'), 'w') as f:
+        f.write('# mesh\nv 0 0 0\nv 1 0 0\nv 1 1 0\nv 0 1 0\nv 0.5 0.5 1\nvn 0 0 1\n'
+                'f 1//1 2//1 3//1 4//1\nf 1 2 -1\n')
+    grid = Grid()
+    read_obj(grid, join(gettempdir(), 'mesh.obj'))
+    assert (grid.return_connectivity_as_a_ndim_array() == connectivity).all(), 'Wrong OBJ connectivity'
+    assert len(grid.Edges) == 7, 'Wrong number of edges'
+
+    with open(join(gettempdir(), 'mesh.stl'), 'wb') as f:
+        f.write(b'solid binary'.ljust(80) + array([len(connectivity)], dtype='<u4').tobytes())
+        for triangle in connectivity:
+            f.write(array([0, 0, 1], dtype='<f4').tobytes() + coordinates[triangle].astype('<f4').tobytes() + b'\0\0')
+    mesh = read_stl(join(gettempdir(), 'mesh.stl'))
+    assert mesh.n_nodes == 5, 'Vertices are not merged'
+    assert (mesh.coordinates[mesh.connectivity] == coordinates[connectivity]).all(), 'Wrong STL triangles'
+
+    with open(join(gettempdir(), 'mesh.ply'), 'w') as f:
+        f.write('ply\nformat ascii 1.0\nelement vertex 5\nproperty float x\nproperty float y\nproperty float z\n'
+                'element face 2\nproperty list uchar int vertex_indices\nend_header\n')
+        f.write(''.join('{} {} {}\n'.format(*p) for p in coordinates) + '4 0 1 2 3\n3 0 1 4\n')
+    mesh = read_ply(join(gettempdir(), 'mesh.ply'))
+    assert (mesh.coordinates == coordinates).all() and (mesh.connectivity == connectivity).all(), 'Wrong PLY mesh'
+    assert len(mesh.to_grid().Faces) == 3, 'Wrong grid'
+
+
+def test_vtu():
+    grid = Grid()
+    read_tecplot(grid, join(DATA_DIR, 'target.dat'))
+    write_vtu(grid, join(gettempdir(), 'target.vtu'))
+    with open(join(gettempdir(), 'target.vtu'), 'rb') as f:
+        data = f.read()
+
+    start = data.index(b'<AppendedData encoding="raw">\n_') + len(b'<AppendedData encoding="raw">\n_')
+    arrays = dict()
+    for vtk_type, name, offset in re.findall(rb'type="(\w+)" Name="(\w+)" NumberOfComponents="\d" format="appended" '
+                                             rb'offset="(\d+)"', data):
+        offset = start + int(offset)
+        nbytes = int(frombuffer(data, dtype='<u8', count=1, offset=offset)[0])
+        dtype = {b'Float64': '<f8', b'Int64': '<i8', b'UInt8': 'u1'}[vtk_type]
+        arrays[name.decode()] = frombuffer(data[offset + 8: offset + 8 + nbytes], dtype=dtype)
+
+    assert (arrays['Points'].reshape((-1, 3)) == grid.return_coordinates_as_a_ndim_array()).all(), 'Wrong points'
+    assert (arrays['connectivity'].reshape((-1, 3)) == grid.return_connectivity_as_a_ndim_array()).all(), \
+        'Wrong connectivity'
+    assert (arrays['offsets'][-1] == 3 * len(grid.Faces)) and (arrays['types'] == 5).all(), 'Wrong cells'
+    assert (arrays['T'] == grid.return_field_as_a_ndim_array('T')).all(), 'Wrong T'
+    assert len(arrays) == 4 + 8, 'Not all fields are written'
+
+
+def test_snapshot_store():
+    grid = Grid()
+    read_tecplot(grid, join(DATA_DIR, 'source.dat'))
+    filename = join(gettempdir(), 'snapshots.h5')
+    T = grid.return_field_as_a_ndim_array('T')
+
+    with SnapshotStore.from_grid(filename, grid) as store:
+        for i in range(3):
+            assert store.append({'T': T + i}) == i, 'Wrong index of the snapshot'
+        store.write(4, {'T': T - 1, 'Hw': T})
+        assert len(store) == 5, 'Wrong number of snapshots'
+
+    with SnapshotStore(filename) as store:
+        assert (store.read(2)['T'] == T + 2).all(), 'Wrong snapshot'
+        assert isnan(store.read(3)['T']).all() and isnan(store.read(0)['Hw']).all(), 'Absent values should be NaN'
+        snapshot = store.read_grid(4)
+    assert (snapshot.connectivity == grid.return_connectivity_as_a_ndim_array()).all(), 'Wrong mesh'
+    assert (snapshot.to_grid().return_field_as_a_ndim_array('Hw') == T).all(), 'Wrong grid of the snapshot'
+
+
+def test_concurrent_loading():
+    def read_target():
+        grid = Grid()
+        read_tecplot(grid, join(DATA_DIR, 'target.dat'))
+        return grid
+
+    old_grid, index, new_grid = load_grids(join(DATA_DIR, 'source.dat'), read_target, 'cell_centered')
+    assert isinstance(old_grid, ArrayGrid), 'Object graph of the source is built'
+    interpolate(old_grid, new_grid, 'cell_centered', index)
+
+    expected = read_target()
+    source = Grid()
+    read_tecplot(source, join(DATA_DIR, 'source.dat'))
+    face_centered_interpolation(source, expected)
+    for name in ('T', 'Hw'):
+        assert (new_grid.return_field_as_a_ndim_array(name) == expected.return_field_as_a_ndim_array(name)).all(), \
+            'Concurrent loading changed the result'
+
+
+def test_tecplot_tokenizer():
+    grid = Grid()
+    read_tecplot(grid, join(DATA_DIR, 'source.dat'))
+    with open(join(DATA_DIR, 'source.dat')) as f:
+        lines = f.readlines()
+
+    # Wrap the blocks by 7 values a line and put the zone's keywords in another order.
+    wrapped = lines[:3] + [lines[3]] + lines[8:3:-1]
+    for line in lines[9:22]:
+        values = line.split()
+        wrapped += [' '.join(values[i: i + 7]) + '\n' for i in range(0, len(values), 7)]
+    wrapped += lines[22:]
+    filename = join(gettempdir(), 'wrapped.dat')
+    with open(filename, 'w') as f:
+        f.writelines(wrapped)
+
+    arrays = read_tecplot_arrays(filename, ['T', 'Hw'], chunk_size=100)
+    assert sorted(arrays.fields) == ['Hw', 'T'], 'Wrong fields'
+    assert (arrays.coordinates == grid.return_coordinates_as_a_ndim_array()).all(), 'Wrong coordinates'
+    assert (arrays.connectivity == grid.return_connectivity_as_a_ndim_array()).all(), 'Wrong connectivity'
+    assert (arrays.fields['Hw'] == grid.return_field_as_a_ndim_array('Hw')).all(), 'Wrong values'
+
+    # The reader of the object grid refuses wrapped blocks instead of misreading them.
+    wrapped = lines[:9]
+    for line in lines[9:22]:
+        values = line.split()
+        wrapped += [' '.join(values[i: i + 7]) + '\n' for i in range(0, len(values), 7)]
+    with open(filename, 'w') as f:
+        f.writelines(wrapped + lines[22:])
+    try:
+        read_tecplot(Grid(), filename)
+        assert False, 'Wrapped blocks should not be read by read_tecplot'
+    except ValueError:
+        pass
+
+
+def test_neighbourhood_index():
+    grid = Grid()
+    read_tecplot(grid, join(DATA_DIR, 'source.dat'))
+    index = NeighbourhoodIndex.from_grid(grid)
+    positions = {f: i for i, f in enumerate(grid.Faces)}
+
+    for i, f in enumerate(grid.Faces):
+        assert sorted(index.adjacent_faces(i)) == sorted(positions[a] for a in f.adjacent_faces()), 'Wrong adjacency'
+    for i, n in enumerate(grid.Nodes):
+        assert sorted(index.node_faces(i)) == sorted(positions[f] for f in n.faces), 'Wrong faces of the node'
+
+    ring = index.k_ring(0, 1)
+    expected = set(index.node_faces(0))
+    expected.update(a for f in index.node_faces(0) for a in index.adjacent_faces(f))
+    assert len(ring) == len(expected) and set(ring) == expected, 'Wrong ring'
+    nearest = index.nearest_faces(0, 6)
+    assert len(nearest) >= 6 and len(set(nearest)) == len(nearest), 'Wrong nearest faces'
+    assert index.nearest_faces(0, 6) is nearest and not index.visited.any(), 'Search is not cached or not cleared'
+
+
+def test_boundary_analysis():
+    coordinates, connectivity = plane_grid(5)
+    boundary = BoundaryAnalysis(connectivity)
+    boundary.update(coordinates)
+    assert len(boundary.border_edges) == 16 and boundary.border_nodes.sum() == 16, 'Wrong border'
+    assert not boundary.border_nodes[[6, 12, 18]].any(), 'Inner nodes on the border'
+
+    loops = boundary.loops()
+    assert len(loops) == 1 and sorted(loops[0]) == sorted(flatnonzero(boundary.border_nodes)), 'Wrong loop'
+    assert sorted(flatnonzero(boundary.corner)) == [0, 4, 20, 24], 'Wrong corners'
+
+    # Along the bottom side a shift is projected on the side, towards where it points.
+    assert (boundary.direction(2, array([0.5, 1.0, 0.0])) == [1, 0, 0]).all(), 'Wrong direction'
+    assert (boundary.direction(2, array([-0.5, 1.0, 0.0])) == [-1, 0, 0]).all(), 'Wrong direction'
+
+    # A flipped face does not change the border.
+    flipped = connectivity.copy()
+    flipped[2] = flipped[2, ::-1]
+    other = BoundaryAnalysis(flipped)
+    other.update(coordinates)
+    assert sorted(flatnonzero(other.corner)) == [0, 4, 20, 24], 'Corners depend on the orientation of faces'
+    assert (other.directions == boundary.directions).all(), 'Directions depend on the orientation of faces'
+
+
+def test_single_precision():
+    old_grid = read_tecplot_arrays(join(DATA_DIR, 'source.dat'), ['T', 'Hw'])
+    new_grid = read_tecplot_arrays(join(DATA_DIR, 'target.dat'), ['T', 'Hw'])
+    single = new_grid.astype(float32)
+    assert single.nbytes < new_grid.nbytes, 'Fields are not stored in single precision'
+
+    least_squares_interpolation(old_grid, new_grid)
+    least_squares_interpolation(read_tecplot_arrays(join(DATA_DIR, 'source.dat'), ['T', 'Hw'], dtype=float32), single)
+    assert single.return_field_as_a_ndim_array('T').dtype == float32, 'Wrong precision of the result'
+    assert single.to_grid().return_field_as_a_ndim_array('T').dtype == float32, 'Grid lost the precision'
+
+    report = precision_report(new_grid, single)
+    for name in ('T', 'Hw'):
+        assert report[name]['nan_mismatch'] == 0, 'NaN in one of the results'
+        assert report[name]['L2_relative'] < 100 * report[name]['epsilon'], 'Single precision is not accurate'
+
+
+def test_structured_generators():
+    for name, generator in GENERATORS.items():
+        grid = generator(9, 6)
+        assert grid.connectivity.max() == grid.n_nodes - 1, 'Unused nodes of {}'.format(name)
+        closed = name == 'cylinder'
+        assert grid.n_faces == 2 * (9 if closed else 8) * 5, 'Wrong number of faces of {}'.format(name)
+        assert len(BoundaryAnalysis(grid.connectivity).loops()) == (2 if closed else 1), 'Wrong border of ' + name
+
+    old_grid, new_grid = structured_plane(30, 30), structured_plane(41, 37, fields=False)
+    expected = analytic_fields(new_grid.return_aux_nodes_as_a_ndim_array())['T']
+    interpolate(old_grid, new_grid)
+    nearest_error = abs(new_grid.return_field_as_a_ndim_array('T') - expected).max()
+    least_squares_interpolation(old_grid, new_grid)
+    assert abs(new_grid.return_field_as_a_ndim_array('T') - expected).max() < nearest_error, \
+        'Second order interpolation is not more accurate'
+
+
+def test_reordered_snapshot():
+    def read_target():
+        grid = Grid()
+        read_tecplot(grid, join(DATA_DIR, 'target.dat'))
+        return grid
+
+    source = Grid()
+    read_tecplot(source, join(DATA_DIR, 'source.dat'))
+    filename = join(gettempdir(), 'reordered.h5')
+    SnapshotStore.from_grid(filename, read_target()).close()
+    with SnapshotStore(filename) as store:
+        mesh = store.mesh()
+
+    # The target read from tecplot file and the compact one of the mesh of the store.
+    for read in (read_target, mesh.to_grid):
+        snapshots = list()
+        for order in (None, 'hilbert'):
+            target = read()
+            if order is not None:
+                reorder_grid(target, order)
+            interpolate(source, target)
+            with SnapshotStore.from_grid(filename, target) as store:
+                store.append(face_fields(target))
+            with SnapshotStore(filename) as store:
+                snapshots.append(store.read_grid(0))
+        original, restored = snapshots
+        assert (original.connectivity == restored.connectivity).all() and \
+               (original.coordinates == restored.coordinates).all(), 'Original order of the mesh is not restored'
+        assert sorted(original.fields) == sorted(restored.fields), 'Wrong fields'
+        for name, values in original.fields.items():
+            assert ((values == restored.fields[name]) | isnan(values)).all(), 'Original order is not restored'
+    assert 'Hi' not in restored.fields, 'Fields never set should not be written'
+
+    # A snapshot of another mesh is not appended to the store.
+    with SnapshotStore(filename, 'a') as store:
+        try:
+            store.check_grid(source)
+            assert False, 'Mesh of another grid should not be accepted'
+        except ValueError:
+            pass
+        store.check_grid(read_target())
+
+
+def test_synthetic_benchmark():
+    for surface in ('plane', 'cylinder'):
+        errors = benchmark_synthetic(3000, 1, surface)
+        assert sorted(errors) == sorted(ARRAY_METHODS), 'Not all methods are benchmarked'
+        assert errors['least_squares']['T'] < errors['cell_centered']['T'], 'Wrong errors of ' + surface
+
+
 def test_all():
     test_comparing_of_nodes()
     test_avl()
@@ -224,6 +807,32 @@ def test_all():
     test_cross()
     test_area()
     test_alpha_quality_measure()
+    test_grid_cache()
+    test_incremental_interpolation()
+    test_bvh_refit()
+    test_compact_grid()
+    test_components()
+    test_quality_report()
+    test_conservation_report()
+    test_identical_grids()
+    test_linear_fallback()
+    test_sharded_index()
+    test_reorder()
+    test_reordered_snapshot()
+    test_constrained_interpolation()
+    test_face_node_relocation()
+    test_least_squares()
+    test_lazy_reading()
+    test_mesh_readers()
+    test_vtu()
+    test_snapshot_store()
+    test_concurrent_loading()
+    test_tecplot_tokenizer()
+    test_neighbourhood_index()
+    test_boundary_analysis()
+    test_single_precision()
+    test_structured_generators()
+    test_synthetic_benchmark()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,129 @@
+"""
+Triangular grid kept as arrays.
+
+Readers of big meshes fill the arrays directly. `ArrayGrid` has the
+accessors of `Grid` used by the array-based algorithms, so it can be
+passed instead of the grid, and the object graph is built by `to_grid`
+only when it is needed.
+
+Fields, and optionally coordinates, can be kept in single precision to
+halve the memory of big grids. Centroids are always computed in double
+precision, so that the spatial indexes are queried with float64 points.
+"""
+from numpy import asarray, full, nan, array_equal, int64, float64
+from .grid import INTERPOLATED_FIELDS
+
+
+class ArrayGrid:
+    __doc__ = "Grid as the coordinates of nodes, the connectivity of faces and the values of fields."
+
+    def __init__(self, coordinates, connectivity, fields=None, node_fields=None, dtype=float64,
+                 coordinates_dtype=float64):
+        """
+        :param coordinates: (n_nodes, 3) array of coordinates of nodes.
+        :param connectivity: (n_faces, 3) array of positions of faces' nodes.
+        :param fields: dict name -> (n_faces,) array of values of faces' fields.
+        :param node_fields: dict name -> (n_nodes,) array of values of nodes' fields.
+        :param dtype: float type of the values of the fields, e.g. float32.
+        :param coordinates_dtype: float type of the coordinates.
+        """
+        self.dtype = dtype
+        self.coordinates = asarray(coordinates, dtype=coordinates_dtype).reshape((-1, 3))
+        self.connectivity = asarray(connectivity, dtype=int64).reshape((-1, 3))
+        self.fields = {name: asarray(values, dtype=dtype) for name, values in (fields or dict()).items()}
+        self.node_fields = {name: asarray(values, dtype=dtype) for name, values in (node_fields or dict()).items()}
+
+    @property
+    def n_nodes(self):
+        return len(self.coordinates)
+
+    @property
+    def n_faces(self):
+        return len(self.connectivity)
+
+    @property
+    def nbytes(self):
+        """Memory of the arrays in bytes."""
+        return self.coordinates.nbytes + self.connectivity.nbytes + \
+            sum(values.nbytes for values in list(self.fields.values()) + list(self.node_fields.values()))
+
+    def astype(self, dtype, coordinates_dtype=float64):
+        """Return the grid with the fields and the coordinates of the given float types."""
+        return ArrayGrid(self.coordinates, self.connectivity, self.fields, self.node_fields, dtype, coordinates_dtype)
+
+    def return_coordinates_as_a_ndim_array(self):
+        """Return (n_nodes, 3) array of coordinates of nodes."""
+        return self.coordinates
+
+    def return_connectivity_as_a_ndim_array(self):
+        """Return (n_faces, 3) array of positions of faces' nodes."""
+        return self.connectivity
+
+    def compute_aux_nodes(self):
+        """Centroids are computed by `return_aux_nodes_as_a_ndim_array`."""
+
+    def return_aux_nodes_as_a_ndim_array(self):
+        """Return (n_faces, 3) float64 array of centroids of faces."""
+        return self.coordinates[self.connectivity].mean(axis=1, dtype=float64)
+
+    def return_field_as_a_ndim_array(self, name, ids=None):
+        """
+        Return values of the faces' field, NaN if the field is not set.
+        :param name: name of the field, e.g. 'T'.
+        :param ids: positions of faces, all faces if None.
+        """
+        values = self.fields.get(name)
+        if values is None:
+            values = full(self.n_faces, nan, dtype=self.dtype)
+        return values.copy() if ids is None else values[ids]
+
+    def set_field_from_a_ndim_array(self, name, values, ids=None):
+        """
+        Set values of the faces' field.
+        :param name: name of the field, e.g. 'T'.
+        :param values: array of values.
+        :param ids: positions of faces, all faces if None.
+        """
+        if name not in self.fields:
+            self.fields[name] = full(self.n_faces, nan, dtype=self.dtype)
+        self.fields[name][slice(None) if ids is None else ids] = values
+
+    def return_node_field_as_a_ndim_array(self, name):
+        """Return values of the nodes' field, NaN if the field is not set."""
+        values = self.node_fields.get(name)
+        return full(self.n_nodes, nan, dtype=self.dtype) if values is None else values.copy()
+
+    def set_node_field_from_a_ndim_array(self, name, values):
+        """Set values of the nodes' field."""
+        if name not in self.node_fields:
+            self.node_fields[name] = full(self.n_nodes, nan, dtype=self.dtype)
+        self.node_fields[name][:] = values
+
+    def is_identical_to(self, grid):
+        """
+        Check whether the grid has the same nodes and faces as another grid in the same order, as `Grid`.
+        :param grid: ArrayGrid or Grid.
+        """
+        if self.n_nodes != grid.n_nodes or self.n_faces != grid.n_faces:
+            return False
+        return array_equal(self.connectivity, grid.return_connectivity_as_a_ndim_array()) \
+            and array_equal(self.coordinates, grid.return_coordinates_as_a_ndim_array())
+
+    def relocate_values_from_isomorphic_grid(self, grid, fields=INTERPOLATED_FIELDS):
+        """Copy values of faces' fields from the grid (ArrayGrid or Grid) with the same order of faces."""
+        assert self.n_faces == grid.n_faces, 'Wrong number of faces'
+        for name in fields:
+            self.set_field_from_a_ndim_array(name, grid.return_field_as_a_ndim_array(name))
+
+    def to_grid(self):
+        """
+        Build the grid of compact nodes, faces and edges with the values of the fields.
+        The stores of the fields keep their float type, coordinates of the nodes are Python floats.
+        """
+        from .compact import build_compact_grid, FACE_FIELDS, NODE_FIELDS
+        grid = build_compact_grid(self.coordinates, self.connectivity,
+                                  {name: v for name, v in self.fields.items() if name in FACE_FIELDS}, self.dtype)
+        for name, values in self.node_fields.items():
+            if name in NODE_FIELDS:
+                grid.node_store[name][:] = values
+        return grid
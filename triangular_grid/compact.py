@@ -0,0 +1,193 @@
+"""
+Compact variants of triangular_grid's node, face and edge.
+
+The objects have no `__dict__`, values of fields are kept in arrays
+shared by all the objects of the grid and indexed by `Id`, and the aux
+node of a face is created only when it is asked for. They are drop-in
+replacements of `Node`, `Face` and `Edge` for smoothing and topology
+queries on big grids.
+"""
+import gc
+from numpy import full, nan, unique, sort, array, argsort, bincount, concatenate, cumsum, float64
+from .node import Node
+from .face import Face
+from .grid import Grid
+
+NODE_FIELDS = ('T', 'Hw')
+FACE_FIELDS = ('T', 'Hw', 'Hi', 'HTC', 'Beta', 'TauX', 'TauY', 'TauZ')
+
+
+class FieldStore:
+    __doc__ = "Values of fields of nodes or faces: an array per field indexed by `Id`."
+
+    def __init__(self, size, names, dtype=float64):
+        """
+        :param size: number of objects.
+        :param names: names of the fields.
+        :param dtype: float type of the values, e.g. float32.
+        """
+        self.arrays = {name: full(size, nan, dtype=dtype) for name in names}
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+
+def stored_field(name):
+    """Property reading and writing the field in the object's store. Absent values are NaN."""
+    def get(self):
+        return self.store.arrays[name][self.Id].item()
+
+    def set(self, value):
+        self.store.arrays[name][self.Id] = value
+
+    return property(get, set)
+
+
+class CompactNode:
+    __doc__ = "Node without __dict__, its fields are kept in the store."
+    __slots__ = ('x', 'y', 'z', 'Id', 'store', 'faces', 'edges', 'fixed', 'component')
+
+    def __init__(self, x, y, z, Id, store):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.Id = Id
+        self.store = store
+        self.faces = ()
+        self.edges = ()
+        self.fixed = False
+        self.component = None
+
+    coordinates = Node.coordinates
+    as_point = Node.as_point
+    move = Node.move
+
+
+for field in NODE_FIELDS:
+    setattr(CompactNode, field, stored_field(field))
+
+
+class CompactFace:
+    __doc__ = "Face without __dict__, its fields are kept in the store and the aux node is created on demand."
+    __slots__ = ('Id', 'store', 'nodes', 'edges', '_aux_node', 'vector_median', 'fuzzy_median')
+
+    def __init__(self, Id, store):
+        self.Id = Id
+        self.store = store
+        self.nodes = ()
+        self.edges = ()
+        self._aux_node = None
+        self.vector_median = None
+        self.fuzzy_median = None
+
+    @property
+    def nodes_ids(self):
+        """Ids of the nodes as in the connectivity list of the file (starting with 1)."""
+        return [n.Id + 1 for n in self.nodes]
+
+    @property
+    def aux_node(self):
+        if self._aux_node is None:
+            self._aux_node = Node()
+        return self._aux_node
+
+    normal = Face.normal
+    area = Face.area
+    centroid = Face.centroid
+    adjacent_faces = Face.adjacent_faces
+    alpha_quality_measure = Face.alpha_quality_measure
+
+
+for field in FACE_FIELDS:
+    setattr(CompactFace, field, stored_field(field))
+
+
+class CompactEdge:
+    __doc__ = "Edge without __dict__."
+    __slots__ = ('Id', 'nodes', 'faces', 'border')
+
+    def __init__(self, Id):
+        self.Id = Id
+        self.nodes = ()
+        self.faces = ()
+        self.border = False
+
+
+def group(members, keys, n_groups):
+    """
+    Group the objects by keys.
+    :param members: list of objects.
+    :param keys: array of group numbers of the objects.
+    :param n_groups: number of groups.
+    :return: list of tuples of objects of each group.
+    """
+    order = argsort(keys, kind='stable').tolist()
+    bounds = concatenate(([0], cumsum(bincount(keys, minlength=n_groups)))).tolist()
+    members = [members[i] for i in order]
+    return [tuple(members[s:e]) for s, e in zip(bounds[:-1], bounds[1:])]
+
+
+def build_compact_grid(coordinates, connectivity, fields=None, dtype=float64):
+    """
+    Create the grid of compact objects from arrays.
+
+    Edges are found by sorting the sides of all faces at once,
+    not by searching among the edges of the nodes. Incidence is kept
+    in tuples, the topology of the grid is not supposed to change.
+
+    :param coordinates: (n_nodes, 3) array of coordinates of nodes.
+    :param connectivity: (n_faces, 3) array of positions of faces' nodes.
+    :param fields: dict name -> (n_faces,) array of values of faces' fields.
+    :param dtype: float type of the values of the fields in the stores, e.g. float32.
+    :return: Grid (obj) with `node_store` and `face_store`.
+    """
+    # The cyclic garbage collector would rescan the growing graph again and again.
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _build_compact_grid(array(coordinates, dtype=float), array(connectivity, dtype=int), fields, dtype)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _build_compact_grid(coordinates, connectivity, fields, dtype):
+    n_nodes, n_faces = len(coordinates), len(connectivity)
+
+    grid = Grid()
+    grid.node_store = FieldStore(n_nodes, NODE_FIELDS, dtype)
+    grid.face_store = FieldStore(n_faces, FACE_FIELDS, dtype)
+    if fields is not None:
+        for name, values in fields.items():
+            grid.face_store[name][:] = values
+
+    nodes = [CompactNode(x, y, z, i, grid.node_store) for i, (x, y, z) in enumerate(coordinates.tolist())]
+    faces = [CompactFace(i, grid.face_store) for i in range(n_faces)]
+
+    # Sides (n1, n2), (n2, n3), (n3, n1) of each face.
+    sides = connectivity[:, [0, 1, 1, 2, 2, 0]].reshape((-1, 2))
+    edge_nodes, edge_of_side = unique(sort(sides, axis=1), axis=0, return_inverse=True)
+    edge_of_side = edge_of_side.ravel()
+    edges = [CompactEdge(i) for i in range(len(edge_nodes))]
+
+    for f, ids, sides_ in zip(faces, connectivity.tolist(), edge_of_side.reshape((-1, 3)).tolist()):
+        f.nodes = (nodes[ids[0]], nodes[ids[1]], nodes[ids[2]])
+        f.edges = (edges[sides_[0]], edges[sides_[1]], edges[sides_[2]])
+
+    # Each face repeated for its 3 sides (and its 3 corners), each edge for its 2 ends.
+    face_of_side = [f for f in faces for _ in range(3)]
+    edge_of_end = [e for e in edges for _ in range(2)]
+
+    for e, (n1, n2), faces_ in zip(edges, edge_nodes.tolist(), group(face_of_side, edge_of_side, len(edges))):
+        assert len(faces_) <= 2, 'There are more than 2 faces incident to the edge'
+        e.nodes = (nodes[n1], nodes[n2])
+        e.faces = faces_
+
+    for n, faces_, edges_ in zip(nodes, group(face_of_side, connectivity.ravel(), n_nodes),
+                                 group(edge_of_end, edge_nodes.ravel(), n_nodes)):
+        n.faces = faces_
+        n.edges = edges_
+
+    grid.Nodes, grid.Faces, grid.Edges = nodes, faces, edges
+    grid.init_zone()
+    return grid
@@ -2,8 +2,12 @@
 from .node import Node
 from .face import Face
 from .zone import Zone
-from numpy import array, inf, zeros
+from numpy import array, zeros, ones, unique, sort, bincount, array_equal
 from algorithms.avl_tree import AVLTree
+from algorithms.quality import quality_report
+
+# Face values transferred from the source grid to the target grid.
+INTERPOLATED_FIELDS = ('T', 'Hw')
 
 
 class Grid:
@@ -19,6 +23,20 @@ class Grid:
         self.Zones = list()
         self.avl = AVLTree()
         self.number_of_border_nodes = 0
+        # Shared arrays of fields of a grid of compact nodes and faces, see `triangular_grid.compact`.
+        self.node_store = None
+        self.face_store = None
+        # Operators of relocation between faces and nodes by their weights, see `relocation`.
+        self.relocations = dict()
+        self.relocations_topology = None
+
+    @property
+    def n_nodes(self):
+        return len(self.Nodes)
+
+    @property
+    def n_faces(self):
+        return len(self.Faces)
 
     def init_zone(self):
         """
@@ -107,24 +125,46 @@ class Grid:
 
         self.init_zone()
 
-    def relocate_values_from_faces_to_nodes(self):
-        """First use the simplest algrithm.
-        The value in the node is a mean of values in the adjacent faces."""
-        for n in self.Nodes:
-            n_faces = len(n.faces)
-            t = 0
-            hw = 0
-            for f in n.faces:
-                t += f.T
-                hw += f.Hw
-            n.T = t / n_faces
-            n.Hw = hw / n_faces
-
-    def relocate_values_from_nodes_to_faces(self):
-        """Set values in faces as mean of the neighbour nodes."""
-        for f in self.Faces:
-            f.T = (f.nodes[0].T + f.nodes[1].T + f.nodes[2].T) / 3.0
-            f.Hw = (f.nodes[0].Hw + f.nodes[1].Hw + f.nodes[2].Hw) / 3.0
+    def relocation(self, weights='uniform'):
+        """
+        Return `FaceNodeRelocation` of the weights, built once and kept until the topology changes.
+
+        The topology is considered changed when the lists of nodes or faces are replaced
+        (e.g. by `algorithms.reorder.reorder_grid`) or their lengths change. Nodes moved
+        in place do not change it: call `invalidate_relocations` then, the 'area' and 'angle'
+        weights depend on the coordinates.
+        :param weights: 'uniform', 'area' or 'angle', see `algorithms.operators`.
+        """
+        from algorithms.operators import FaceNodeRelocation
+        topology = self.relocations_topology
+        if topology is None or topology[0] is not self.Nodes or topology[1] is not self.Faces or \
+                topology[2:] != (len(self.Nodes), len(self.Faces)):
+            self.invalidate_relocations()
+            self.relocations_topology = (self.Nodes, self.Faces, len(self.Nodes), len(self.Faces))
+        if weights not in self.relocations:
+            self.relocations[weights] = FaceNodeRelocation(self, weights)
+        return self.relocations[weights]
+
+    def invalidate_relocations(self):
+        """Drop the operators of relocation, e.g. after the nodes moved."""
+        self.relocations = dict()
+        self.relocations_topology = None
+
+    def relocate_values_from_faces_to_nodes(self, fields=INTERPOLATED_FIELDS, weights='uniform'):
+        """
+        The value in the node is a mean of values in the adjacent faces.
+        :param fields: names of the fields.
+        :param weights: 'uniform', 'area' or 'angle' weighting of the faces, see `algorithms.operators`.
+        """
+        self.relocation(weights).to_nodes(fields)
+
+    def relocate_values_from_nodes_to_faces(self, fields=INTERPOLATED_FIELDS, weights='uniform'):
+        """
+        Set values in faces as mean of the neighbour nodes.
+        :param fields: names of the fields.
+        :param weights: 'uniform', 'area' or 'angle' weighting of the nodes, see `algorithms.operators`.
+        """
+        self.relocation(weights).to_faces(fields)
 
     def values_from_nodes_to_array(self) -> array:
         """Return nodes' values as an array."""
@@ -156,11 +196,86 @@ class Grid:
 
         return array([x, y, z]).T
 
+    def return_connectivity_as_a_ndim_array(self) -> array:
+        """Return (n_faces, 3) array of positions of faces' nodes in `Grid.Nodes`."""
+        positions = {n: i for i, n in enumerate(self.Nodes)}
+        connectivity = [positions[n] for f in self.Faces for n in f.nodes]
+        return array(connectivity, dtype=int).reshape((len(self.Faces), 3))
+
+    def return_field_as_a_ndim_array(self, name, ids=None) -> array:
+        """
+        Return values of the faces' field as a float array, None becomes NaN.
+        :param name: name of the field, e.g. 'T'.
+        :param ids: positions of faces in `Grid.Faces`, all faces if None.
+        """
+        if self.face_store is not None:
+            values = self.face_store[name]
+            return values.copy() if ids is None else values[ids]
+        faces = self.Faces if ids is None else [self.Faces[i] for i in ids]
+        return array([getattr(f, name) for f in faces], dtype=float)
+
+    def set_field_from_a_ndim_array(self, name, values, ids=None):
+        """
+        Set values of the faces' field.
+        :param name: name of the field, e.g. 'T'.
+        :param values: array of values.
+        :param ids: positions of faces in `Grid.Faces`, all faces if None.
+        """
+        if self.face_store is not None:
+            self.face_store[name][slice(None) if ids is None else ids] = values
+            return
+        faces = self.Faces if ids is None else [self.Faces[i] for i in ids]
+        assert len(faces) == len(values), 'Wrong number of values'
+        for f, v in zip(faces, values.tolist()):
+            setattr(f, name, v)
+
+    def return_node_field_as_a_ndim_array(self, name) -> array:
+        """
+        Return values of the nodes' field as a float array, None becomes NaN.
+        :param name: name of the field, e.g. 'T'.
+        """
+        if self.node_store is not None:
+            return self.node_store[name].copy()
+        return array([getattr(n, name, None) for n in self.Nodes], dtype=float)
+
+    def set_node_field_from_a_ndim_array(self, name, values):
+        """
+        Set values of the nodes' field.
+        :param name: name of the field, e.g. 'T'.
+        :param values: (n_nodes,) array of values.
+        """
+        if self.node_store is not None:
+            self.node_store[name][:] = values
+            return
+        assert len(self.Nodes) == len(values), 'Wrong number of values'
+        for n, v in zip(self.Nodes, values.tolist()):
+            setattr(n, name, v)
+
     def make_avl(self):
         """Compose an avl tree that contains references to nodes and allows to logn search."""
         for n in self.Nodes:
             self.avl.insert(n)
 
+    def node_degrees(self) -> array:
+        """Return (n_nodes,) array of numbers of nodes connected to each node by the sides of faces."""
+        sides = self.return_connectivity_as_a_ndim_array()[:, [0, 1, 1, 2, 2, 0]].reshape((-1, 2))
+        edges = unique(sort(sides, axis=1), axis=0)
+        return bincount(edges.ravel(), minlength=len(self.Nodes))
+
+    def is_identical_to(self, grid) -> bool:
+        """
+        Check whether the grid has the same nodes and faces as another grid in the same order.
+
+        Then values can be copied face by face without any search.
+
+        :param grid: Grid (obj) or ArrayGrid
+        :return: bool
+        """
+        if self.n_nodes != grid.n_nodes or self.n_faces != grid.n_faces:
+            return False
+        return array_equal(self.return_connectivity_as_a_ndim_array(), grid.return_connectivity_as_a_ndim_array()) \
+            and array_equal(self.return_coordinates_as_a_ndim_array(), grid.return_coordinates_as_a_ndim_array())
+
     def is_isomprphic_to(self, grid) -> bool:
         """
         Check whether the triangular_grid is isomorphic to another triangular_grid.
@@ -171,30 +286,22 @@ class Grid:
 
         It means that the result is not hundred percent correct, but this heuristics are useful and easy.
 
-        :param grid: Grid (obj)
+        :param grid: Grid (obj) or ArrayGrid
         :return: bool
         """
-        if len(self.Nodes) == len(grid.Nodes):
-            degrees_old = []
-            degrees_new = []
-
-            for n in self.Nodes:
-                degrees_old.append(len(n.edges))
-            for n in grid.Nodes:
-                degrees_new.append(len(n.edges))
-
-            sorted(degrees_new)
-            sorted(degrees_old)
-
-            if degrees_new == degrees_old:
-                return True
-
-        return False
-
-    def relocate_values_from_isomorphic_grid(self, grid):
-        for i in range(len(self.Faces)):
-            self.Faces[i].T = grid.Faces[i].T
-            self.Faces[i].Hw = grid.Faces[i].Hw
+        if self.n_nodes != grid.n_nodes or self.n_faces != grid.n_faces:
+            return False
+        return array_equal(sort(self.node_degrees()), sort(grid.node_degrees()))
+
+    def relocate_values_from_isomorphic_grid(self, grid, fields=INTERPOLATED_FIELDS):
+        """Copy values of faces' fields from the grid (Grid or ArrayGrid) with the same order of faces."""
+        assert self.n_faces == grid.n_faces, 'Wrong number of faces'
+        for name in fields:
+            if self.face_store is not None or not isinstance(grid, Grid):
+                self.set_field_from_a_ndim_array(name, grid.return_field_as_a_ndim_array(name))
+                continue
+            for f, other in zip(self.Faces, grid.Faces):
+                setattr(f, name, getattr(other, name))
 
     def compute_aux_nodes(self):
         """Calculate the points which are the point of medians' intersection."""
@@ -222,46 +329,51 @@ class Grid:
                 f.Hw = interpolated_parameters[0, i]
 
     def depth_first_traversal(self, node, component):
-        if node.component is None:
+        """Mark all nodes reachable from the node with the component. Uses an explicit stack."""
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.component is not None:
+                continue
             node.component = component
-        else:
-            return
 
-        neighbours = []
-        for e in node.edges:
-            assert len(e.nodes) == 2
-            if e.nodes[0] == node:
-                neighbours.append(e.nodes[1])
-            else:
-                neighbours.append(e.nodes[0])
+            for e in node.edges:
+                assert len(e.nodes) == 2
+                if e.nodes[0] == node:
+                    stack.append(e.nodes[1])
+                else:
+                    stack.append(e.nodes[0])
 
-        for neigh in neighbours:
-            self.depth_first_traversal(neigh, component)
+    def label_components(self):
+        """
+        Label connected components of the grid.
+
+        Faces sharing a node belong to the same component.
+
+        :return: tuple (number of components, (n_nodes,) array of labels of nodes, (n_faces,) array of labels of faces).
+                 Labels start with 0.
+        """
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import connected_components
+        connectivity = self.return_connectivity_as_a_ndim_array()
+        sides = connectivity[:, [0, 1, 1, 2, 2, 0]].reshape((-1, 2))
+        adjacency = csr_matrix((ones(len(sides)), (sides[:, 0], sides[:, 1])), shape=(len(self.Nodes), len(self.Nodes)))
+        n_components, node_labels = connected_components(adjacency, directed=False)
+        return n_components, node_labels, node_labels[connectivity[:, 0]]
 
     def get_number_of_components(self):
+        """Count connected components and set `Node.component` (starting with 1)."""
         assert len(self.Nodes) > 0
-        for i in range(1, 1000):
-            start_node = None
-            for n in self.Nodes:
-                if n.component is None:
-                    start_node = n
-                    break
-
-            if start_node is None:
-                return i - 1
-            self.depth_first_traversal(start_node, i)
+        n_components, node_labels, _ = self.label_components()
+        for n, label in zip(self.Nodes, node_labels.tolist()):
+            n.component = label + 1
+        return n_components
 
     def mean_alpha_quality_measure(self):
+        """Print the geometric mean and the minimum of the alpha quality measure of faces."""
         assert len(self.Faces) > 0
-        mean_alpha_quality_measure = 1
-        min_alpha_quality_measure = inf
-        for f in self.Faces:
-            aqm = f.alpha_quality_measure()
-            mean_alpha_quality_measure *= aqm
-            if aqm < min_alpha_quality_measure:
-                min_alpha_quality_measure = aqm
-        print('mean alpha: {}\nmin alpha: {}'.format(mean_alpha_quality_measure ** (1 / len(self.Faces)),
-                                                     min_alpha_quality_measure))
+        report = quality_report(self)
+        print('mean alpha: {}\nmin alpha: {}'.format(report['alpha']['geometric_mean'], report['alpha']['min']))
 
     def init_adjacent_faces_list_for_border_nodes(self):
         self.adj_list_for_border_nodes = zeros((len(self.Nodes), len(self.Faces)))
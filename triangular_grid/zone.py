@@ -7,3 +7,13 @@ class Zone:
     def __init__(self):
         self.Nodes = None
         self.Faces = None
+
+    def name(self):
+        """Zone title without the keyword and quotes: 'ZONE T="WALL_2000"' -> 'WALL_2000'. None if not set."""
+        title = getattr(self, 'title', None)
+        if title is None:
+            return None
+        title = title.strip()
+        if title.startswith('ZONE T='):
+            title = title[len('ZONE T='):]
+        return title.strip('"')